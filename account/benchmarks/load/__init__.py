@@ -0,0 +1,15 @@
+"""
+End-to-end load test for the auth endpoints.
+
+Boots the app in-process against the configured Postgres and Redis,
+with the email provider replaced by a local stub, and drives a mix of
+login, signup-and-verify and password-reset journeys.
+
+    python -m benchmarks.load --duration 30 --concurrency 20 \
+        --mix login=6,signup=2,reset=2 --baseline benchmarks/load/baseline.json
+
+The JSON report holds throughput, latency percentiles per route and a
+per-dependency breakdown taken from the /metrics deltas. With a
+baseline, the command exits non-zero when a route regresses past the
+threshold. `--save-baseline` records the current run as the baseline.
+"""
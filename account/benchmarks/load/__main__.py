@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+from benchmarks.load import report
+from benchmarks.load.harness import Harness, running_app
+from benchmarks.load.scenarios import (
+    SCENARIOS,
+    JourneyFailed,
+    Recorder,
+    parse_mix,
+)
+from benchmarks.stats import summarize
+
+
+async def scrape(harness: Harness, url: str) -> str:
+    """Fetch the metrics page, failing loudly rather than diffing errors."""
+    res = await harness.client.get(url)
+    res.raise_for_status()
+    return res.text
+
+
+async def drive(
+    harness: Harness,
+    weights: Dict[str, float],
+    duration: float,
+    concurrency: int,
+    recorder: Recorder,
+) -> Dict:
+    """Run journeys from `concurrency` virtual users until time is up."""
+    names, shares = list(weights), list(weights.values())
+    journeys: Dict[str, list] = {name: [] for name in names}
+    failures: Dict[str, int] = {name: 0 for name in names}
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user() -> None:
+        while time.perf_counter() < deadline:
+            name = random.choices(names, weights=shares)[0]
+            started = time.perf_counter()
+            try:
+                await SCENARIOS[name](harness, recorder)
+            except (JourneyFailed, KeyError):
+                failures[name] += 1
+                continue
+            journeys[name].append(time.perf_counter() - started)
+
+    await asyncio.gather(*(virtual_user() for _ in range(concurrency)))
+    return {
+        name: {**summarize(samples, duration), "failed": failures[name]}
+        for name, samples in journeys.items()
+    }
+
+
+async def run(args) -> Dict:
+    random.seed(args.seed)
+    weights = parse_mix(args.mix)
+    recorder = Recorder()
+
+    async with running_app(
+        email_latency=args.email_latency,
+        seed_users=args.seed_users,
+        worker=not args.no_worker,
+        rate_limits=args.rate_limits,
+    ) as harness:
+        if args.warmup:
+            await drive(
+                harness, weights, args.warmup, args.concurrency, Recorder()
+            )
+
+        # Registered by get_application(), like every other route.
+        metrics_url = harness.app.url_path_for("metrics")
+        before = await scrape(harness, metrics_url)
+        started = time.perf_counter()
+        scenarios = await drive(
+            harness, weights, args.duration, args.concurrency, recorder
+        )
+        elapsed = time.perf_counter() - started
+        after = await scrape(harness, metrics_url)
+        emails_sent = harness.provider.sent
+
+    routes = {}
+    for route, samples in recorder.samples.items():
+        routes[route] = {
+            **summarize(samples, elapsed),
+            "errors": recorder.errors[route],
+            "error_rate": round(recorder.errors[route] / len(samples), 4),
+        }
+    total = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        "config": {
+            key: getattr(args, key)
+            for key in (
+                "duration",
+                "concurrency",
+                "mix",
+                "seed",
+                "seed_users",
+                "email_latency",
+            )
+        },
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "rps": round(total / elapsed, 3),
+        "errors": sum(recorder.errors.values()),
+        "emails_sent": emails_sent,
+        "routes": dict(sorted(routes.items())),
+        "scenarios": scenarios,
+        "phases": report.phase_breakdown(before, after, elapsed),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the auth API.")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mix", default="login=6,signup=2,reset=2")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--seed-users", type=int, default=100)
+    parser.add_argument("--email-latency", type=float, default=0.05)
+    parser.add_argument(
+        "--no-worker",
+        action="store_true",
+        help="Leave queued emails in the outbox instead of sending them.",
+    )
+    parser.add_argument(
+        "--rate-limits",
+        action="store_true",
+        help="Keep the per-route rate limits switched on.",
+    )
+    parser.add_argument("--output", help="Also write the report here.")
+    parser.add_argument("--baseline", help="Baseline report to compare.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="Allowed regression as a fraction of the baseline.",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Write this run to --baseline instead of comparing.",
+    )
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output)
+
+    if not args.baseline:
+        return
+    baseline_path = Path(args.baseline)
+    if args.save_baseline or not baseline_path.exists():
+        baseline_path.write_text(output)
+        print(f"Saved baseline to {baseline_path}", file=sys.stderr)
+        return
+
+    regressions = report.compare(
+        result, json.loads(baseline_path.read_text()), args.threshold
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
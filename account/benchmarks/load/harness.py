@@ -0,0 +1,158 @@
+"""
+In-process app with a stub email provider and recorded OTPs.
+"""
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+import httpx
+from asgi_lifespan import LifespanManager
+
+from library.security.hash import hash_service
+from library.security.otp import otp_manager
+from library.security.ratelimit import rate_limiter
+from library.utils.email import email_transport
+from models.user import Users
+from server import get_application
+from services.outbox import OutboxWorker
+
+PASSWORD = "passWord23&"
+
+
+class StubEmailProvider:
+    """Accept every email after a fixed delay, like the real provider."""
+
+    def __init__(self, latency: float = 0.05) -> None:
+        self.latency = latency
+        self.sent = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return httpx.Response(
+            201, json={"message": "OK", "request_id": uuid.uuid4().hex}
+        )
+
+    @property
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handler)
+
+
+class OTPRecorder:
+    """Keep the codes the app issues so journeys can redeem them."""
+
+    def __init__(self) -> None:
+        self.issued: Dict[str, str] = {}
+        self._create_otp = otp_manager.create_otp
+
+    async def create_otp(self, user_id: str, **kwargs) -> str:
+        otp = await self._create_otp(user_id=user_id, **kwargs)
+        self.issued[user_id] = otp
+        return otp
+
+    def pop(self, user_id: str) -> str:
+        return self.issued.pop(str(user_id))
+
+    def install(self) -> None:
+        otp_manager.create_otp = self.create_otp
+
+    def uninstall(self) -> None:
+        del otp_manager.create_otp
+
+
+class Harness:
+    """Running app, HTTP client and the seeded test users."""
+
+    def __init__(
+        self,
+        app,
+        client: httpx.AsyncClient,
+        provider: StubEmailProvider,
+        prefix: str,
+    ) -> None:
+        self.app = app
+        self.client = client
+        self.provider = provider
+        self.prefix = prefix
+        self.otps = OTPRecorder()
+        self.users: List[Users] = []
+        self.reset_users: asyncio.Queue = asyncio.Queue()
+
+    def email(self, label: str) -> str:
+        return f"{self.prefix}-{label}@eelclip.test"
+
+    async def seed(self, count: int) -> None:
+        """Create verified users that share one password."""
+        password_hash = await hash_service.get_hash(PASSWORD)
+        await Users.bulk_create(
+            [
+                Users(
+                    email=self.email(f"seed-{i}"),
+                    email_normalized=self.email(f"seed-{i}"),
+                    first_name="Load",
+                    last_name=str(i),
+                    password_hash=password_hash,
+                    is_verified=True,
+                )
+                for i in range(count)
+            ]
+        )
+        self.users = await Users.filter(
+            email__startswith=f"{self.prefix}-seed-"
+        )
+        # Reset journeys check a user out so their codes never mix.
+        for user in self.users:
+            self.reset_users.put_nowait(user)
+
+    async def cleanup(self) -> None:
+        await Users.filter(email__startswith=f"{self.prefix}-").delete()
+
+
+async def _unlimited(keys, quotas) -> float:
+    return 0.0
+
+
+@asynccontextmanager
+async def running_app(
+    email_latency: float = 0.05,
+    seed_users: int = 100,
+    worker: bool = True,
+    rate_limits: bool = False,
+):
+    """Boot the app and yield a `Harness` for it."""
+    # A few seeded users log in far more often than real users would.
+    if not rate_limits:
+        rate_limiter.hit = _unlimited
+    provider = StubEmailProvider(email_latency)
+    # The lifespan keeps an already started transport.
+    await email_transport.start(transport=provider.transport)
+
+    app = get_application()
+    async with LifespanManager(app):
+        async with httpx.AsyncClient(
+            app=app,
+            base_url="http://loadtest",
+            headers={"Content-Type": "application/json"},
+            timeout=60,
+        ) as client:
+            harness = Harness(
+                app, client, provider, f"load-{uuid.uuid4().hex[:8]}"
+            )
+            harness.otps.install()
+
+            outbox_worker = OutboxWorker() if worker else None
+            worker_task = None
+            if outbox_worker is not None:
+                worker_task = asyncio.create_task(outbox_worker.run())
+            try:
+                await harness.seed(seed_users)
+                yield harness
+            finally:
+                if outbox_worker is not None:
+                    outbox_worker.stop()
+                    await worker_task
+                harness.otps.uninstall()
+                await harness.cleanup()
+                if not rate_limits:
+                    del rate_limiter.hit
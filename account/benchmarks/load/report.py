@@ -0,0 +1,70 @@
+"""
+Turn raw samples and /metrics deltas into a report, and compare
+reports against a baseline.
+"""
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from prometheus_client.parser import text_string_to_metric_families
+
+DEPENDENCY_METRIC = "dependency_duration_seconds"
+
+
+def dependency_totals(text: str) -> Dict[Tuple[str, str], List[float]]:
+    """Read `[count, sum]` per dependency and operation from /metrics."""
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for family in text_string_to_metric_families(text):
+        if family.name != DEPENDENCY_METRIC:
+            continue
+        for sample in family.samples:
+            key = (sample.labels["dependency"], sample.labels["operation"])
+            if sample.name.endswith("_count"):
+                totals[key][0] += sample.value
+            elif sample.name.endswith("_sum"):
+                totals[key][1] += sample.value
+    return totals
+
+
+def phase_breakdown(before: str, after: str, elapsed: float) -> Dict:
+    """Per-dependency time spent during the run."""
+    start, end = dependency_totals(before), dependency_totals(after)
+    phases = {}
+    for key, (count, total) in end.items():
+        count -= start.get(key, [0, 0])[0]
+        total -= start.get(key, [0, 0])[1]
+        if count <= 0:
+            continue
+        phases[":".join(key)] = {
+            "count": int(count),
+            "mean_ms": round(total / count * 1000, 3),
+            "total_s": round(total, 3),
+            "per_sec": round(count / elapsed, 3),
+        }
+    return dict(
+        sorted(phases.items(), key=lambda item: -item[1]["total_s"])
+    )
+
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """List every route whose p99 or throughput regressed."""
+    regressions = []
+    for route, base in baseline.get("routes", {}).items():
+        current = report["routes"].get(route)
+        if not current or not base.get("count"):
+            continue
+        if current["p99_ms"] > base["p99_ms"] * (1 + threshold):
+            regressions.append(
+                f"{route}: p99 {current['p99_ms']}ms > "
+                f"baseline {base['p99_ms']}ms"
+            )
+        if current["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"{route}: {current['ops_per_sec']} req/s < "
+                f"baseline {base['ops_per_sec']} req/s"
+            )
+        if current["error_rate"] > base["error_rate"] + threshold / 10:
+            regressions.append(
+                f"{route}: error rate {current['error_rate']} > "
+                f"baseline {base['error_rate']}"
+            )
+    return regressions
@@ -0,0 +1,99 @@
+"""
+User journeys driven by the load test.
+
+Each journey makes one or more requests and records every one of them
+against its route name.
+"""
+import random
+import time
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+from benchmarks.load.harness import PASSWORD, Harness
+
+
+class JourneyFailed(Exception):
+    pass
+
+
+class Recorder:
+    """Latency samples and failures per route."""
+
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(
+        self, harness: Harness, route: str, expected: int, **json
+    ) -> dict:
+        url = harness.app.url_path_for(route)
+        started = time.perf_counter()
+        res = await harness.client.post(url, json=json)
+        self.samples[route].append(time.perf_counter() - started)
+        if res.status_code != expected:
+            self.errors[route] += 1
+            raise JourneyFailed(f"{route} returned {res.status_code}")
+        return res.json()
+
+
+async def login(harness: Harness, recorder: Recorder) -> None:
+    user = random.choice(harness.users)
+    await recorder.call(
+        harness, "auth:login", 200, email=user.email, password=PASSWORD
+    )
+
+
+async def signup(harness: Harness, recorder: Recorder) -> None:
+    user = await recorder.call(
+        harness,
+        "register:user_register",
+        201,
+        email=harness.email(f"signup-{uuid.uuid4().hex[:12]}"),
+        first_name="Load",
+        last_name="Signup",
+        password=PASSWORD,
+    )
+    await recorder.call(
+        harness,
+        "register:verify_account",
+        200,
+        email=user["email"],
+        otp=harness.otps.pop(user["id"]),
+    )
+
+
+async def reset(harness: Harness, recorder: Recorder) -> None:
+    user = await harness.reset_users.get()
+    try:
+        await recorder.call(
+            harness, "auth:request_password_reset", 200, email=user.email
+        )
+        await recorder.call(
+            harness,
+            "auth:confirm_password_reset",
+            200,
+            email=user.email,
+            otp=harness.otps.pop(user.id),
+            new_password=PASSWORD,
+        )
+    finally:
+        harness.reset_users.put_nowait(user)
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "login": login,
+    "signup": signup,
+    "reset": reset,
+}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse `login=6,signup=2` into scenario weights."""
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: {name}")
+        weights[name] = float(weight or 1)
+    return weights
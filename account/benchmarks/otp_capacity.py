@@ -0,0 +1,178 @@
+"""
+Measure the OTP store at a given number of outstanding codes.
+
+Fills a scratch Redis db with `--codes` outstanding codes in the
+bucketed layout of library.security.otp, then reports memory per code,
+the encodings Redis chose for the buckets and create/validate latency
+at that fill. `--legacy` does the same for the old layout (one
+top-level key per code) and reports how many SET NX attempts a new code
+needs, which grows as the 6-digit space fills up. At 10**6 codes the
+space is full: the fill stops there, `unissued` counts the codes that
+could not be stored and `failed` the probes that gave up after
+MAX_TRIES attempts.
+
+The scratch db is flushed before and after the run.
+
+    python -m benchmarks.otp_capacity --codes 1000000 --db 15
+    python -m benchmarks.otp_capacity --codes 1000000 --db 15 --legacy
+
+Results on the target Redis have not been recorded yet: no Redis 7.4
+server was available where this script was written. Run both commands
+above and record the output before relying on the 1M code figures.
+"""
+import argparse
+import asyncio
+import json
+import secrets
+import time
+import uuid
+from collections import Counter
+from typing import Dict
+
+from benchmarks.stats import summarize
+from config import (
+    OTP_BUCKETS,
+    REDIS_OTP_DB,
+    REDIS_OUTBOX_DB,
+    REDIS_RATELIMIT_DB,
+)
+from database.redis import close_redis
+from library.security.otp import OTPManager
+
+BATCH = 10000
+TTL = 3600
+CODE_SPACE = 10**6
+MAX_TRIES = 10000
+
+
+def code() -> str:
+    return str(secrets.randbelow(10**6)).zfill(6)
+
+
+async def used_memory(redis) -> int:
+    return (await redis.info("memory"))["used_memory"]
+
+
+async def fill_bucketed(manager: OTPManager, count: int) -> None:
+    redis = manager.redis
+    for start in range(0, count, BATCH):
+        pipe = redis.pipeline(transaction=False)
+        for i in range(start, min(count, start + BATCH)):
+            user_id = str(uuid.UUID(int=i))
+            key = manager.key(user_id, "verify")
+            pipe.hset(key, user_id, f"{code()}:0")
+            pipe.execute_command("HEXPIRE", key, TTL, "FIELDS", 1, user_id)
+        await pipe.execute()
+
+
+async def fill_legacy(redis, count: int) -> Dict:
+    # Random codes collide, so keep going until count keys exist or the
+    # code space is full. The old create_otp would spin forever there.
+    target = min(count, CODE_SPACE)
+    while await redis.dbsize() < target:
+        pipe = redis.pipeline(transaction=False)
+        for _ in range(min(BATCH, target - await redis.dbsize())):
+            pipe.set(code(), str(uuid.uuid4()), ex=TTL, nx=True)
+        await pipe.execute()
+
+    # Attempts a new code needs at this fill, given up after MAX_TRIES.
+    attempts, failed = [], 0
+    for _ in range(1000):
+        tries = 1
+        while not await redis.set(code(), "probe", ex=TTL, nx=True):
+            tries += 1
+            if tries > MAX_TRIES:
+                failed += 1
+                break
+        else:
+            attempts.append(tries)
+    return {
+        "unissued": count - target,
+        "avg_attempts": (
+            round(sum(attempts) / len(attempts), 3) if attempts else None
+        ),
+        "max_attempts": max(attempts, default=None),
+        "failed": failed,
+    }
+
+
+async def encodings(manager: OTPManager, samples: int = 200) -> Dict:
+    found = Counter()
+    for bucket in range(min(samples, manager.buckets)):
+        key = f"otp:verify:{bucket}"
+        encoding = await manager.redis.object("encoding", key)
+        if encoding:
+            found[encoding] += 1
+    return dict(found)
+
+
+async def latency(manager: OTPManager, calls: int = 2000) -> Dict:
+    create, validate = [], []
+    for i in range(calls):
+        user_id = f"probe-{i}"
+        started = time.perf_counter()
+        otp = await manager.create_otp(user_id=user_id, purpose="verify")
+        create.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await manager.validate_user_otp(
+            user_id=user_id, otp=otp, purpose="verify"
+        )
+        validate.append(time.perf_counter() - started)
+    return {"create": summarize(create), "validate": summarize(validate)}
+
+
+async def run(args) -> Dict:
+    manager = OTPManager(db=args.db, buckets=args.buckets)
+    redis = manager.redis
+    await redis.flushdb()
+    before = await used_memory(redis)
+    started = time.perf_counter()
+    try:
+        if args.legacy:
+            collisions = await fill_legacy(redis, args.codes)
+        else:
+            await fill_bucketed(manager, args.codes)
+        filled_in = time.perf_counter() - started
+        stored = min(args.codes, CODE_SPACE) if args.legacy else args.codes
+        after = await used_memory(redis)
+
+        result = {
+            "layout": "legacy" if args.legacy else "bucketed",
+            "codes": args.codes,
+            "fill_s": round(filled_in, 3),
+            "used_memory_mb": round((after - before) / 2**20, 2),
+            "bytes_per_code": round((after - before) / stored, 1),
+            "keys": await redis.dbsize(),
+        }
+        if args.legacy:
+            result["new_code"] = collisions
+        else:
+            result["buckets"] = args.buckets
+            result["codes_per_bucket"] = round(args.codes / args.buckets, 1)
+            result["encodings"] = await encodings(manager)
+            result["latency"] = await latency(manager)
+        return result
+    finally:
+        if not args.keep:
+            await redis.flushdb()
+        await close_redis()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OTP store capacity.")
+    parser.add_argument("--codes", type=int, default=1_000_000)
+    parser.add_argument("--buckets", type=int, default=OTP_BUCKETS)
+    parser.add_argument(
+        "--db", type=int, default=15, help="Scratch db, it is flushed."
+    )
+    parser.add_argument("--legacy", action="store_true")
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+    if args.db in (REDIS_OTP_DB, REDIS_OUTBOX_DB, REDIS_RATELIMIT_DB):
+        parser.error(f"Redis db {args.db} is used by the app.")
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
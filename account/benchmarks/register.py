@@ -0,0 +1,117 @@
+"""
+Compare the old check-then-insert registration against inserting and
+letting the unique index reject duplicates, under concurrent signups.
+
+The baseline is the query registration ran before the change, an
+`email__iexact` existence check and then the insert. `create_unique`
+is measured with the email fallback off, on while legacy rows remain
+(the backfill window, one extra query per signup) and on once they are
+gone. Half of the signups reuse an address, so both the insert and the
+conflict path are measured. Requires the configured Postgres database.
+
+    python -m benchmarks.register --signups 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from tortoise import Tortoise
+
+from benchmarks.stats import summarize
+from database.database import TORTOISE_ORM
+from models.user import Users, legacy_rows
+
+PASSWORD_HASH = "$2b$12$" + "x" * 53
+
+
+async def check_then_insert(email: str) -> bool:
+    if await Users.filter(email__iexact=email).exists():
+        return False
+    await Users.create(email=email, password_hash=PASSWORD_HASH)
+    return True
+
+
+async def insert_unique(email: str) -> bool:
+    user = await Users.create_unique(email=email, password_hash=PASSWORD_HASH)
+    return user is not None
+
+
+def fallback(enabled: bool, legacy_rows_remain: bool = False) -> None:
+    legacy_rows.enabled = enabled
+    legacy_rows.reset()
+    if legacy_rows_remain:
+        # Skip the existence check, as if the backfill were still running.
+        legacy_rows._checked_at = time.monotonic()
+        legacy_rows.interval = float("inf")
+    else:
+        legacy_rows.interval = 60.0
+
+
+async def run(strategy, signups: int, concurrency: int) -> dict:
+    prefix = uuid.uuid4().hex[:8]
+    emails = [f"bench-{prefix}-{i // 2}@eelclip.test" for i in range(signups)]
+    slots = asyncio.Semaphore(concurrency)
+    samples, errors = [], 0
+
+    async def signup(email: str) -> None:
+        nonlocal errors
+        async with slots:
+            started = time.perf_counter()
+            try:
+                await strategy(email)
+            except Exception:
+                # Concurrent check-then-insert can race into the index.
+                errors += 1
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(signup(email) for email in emails))
+    elapsed = time.perf_counter() - started
+
+    created = await Users.filter(email__startswith=f"bench-{prefix}-").count()
+    await Users.filter(email__startswith=f"bench-{prefix}-").delete()
+    return {
+        **summarize(samples, elapsed),
+        "created": created,
+        "errors": errors,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--signups", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    modes = {
+        "insert_unique:fallback_off": (False, False),
+        "insert_unique:fallback_on_backfilling": (True, True),
+        "insert_unique:fallback_on_backfilled": (True, False),
+    }
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        results = {
+            "check_then_insert": await run(
+                check_then_insert, args.signups, args.concurrency
+            )
+        }
+        for name, (enabled, remain) in modes.items():
+            fallback(enabled, remain)
+            results[name] = await run(
+                insert_unique, args.signups, args.concurrency
+            )
+    finally:
+        await Tortoise.close_connections()
+
+    old = results["check_then_insert"]
+    for name in modes:
+        new = results[name]
+        new["saved_p50_ms"] = round(old["p50_ms"] - new["p50_ms"], 3)
+        new["saved_p99_ms"] = round(old["p99_ms"] - new["p99_ms"], 3)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
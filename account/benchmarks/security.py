@@ -0,0 +1,308 @@
+"""
+Micro-benchmarks for the library.security primitives.
+
+Each primitive runs sequentially and then under concurrent asyncio load.
+A probe task measures how long the event loop was blocked meanwhile.
+Every run is appended as one JSON line to the history file, together
+with the library versions, so upgrades and new backends can be
+compared over time. The OTP benchmarks need the configured Redis.
+
+    python -m benchmarks.security --rounds 10,12 --concurrency 32
+    python -m benchmarks.security --only jwt,token_data --skip-redis
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+import uuid
+from contextlib import asynccontextmanager
+from importlib import metadata
+from typing import Awaitable, Callable, Dict, List
+
+from passlib.context import CryptContext
+
+from benchmarks.stats import percentile, summarize
+from database.redis import close_redis
+from library.schemas.auth import TokenData
+from library.security.hash import HashEngine
+from library.security.jwt import JWTManager, TokenCache
+from library.security.jwt_backends import get_jwt_backend
+from library.security.otp import OTPManager
+
+PASSWORD = "passWord23&"
+SECRET = "benchmark-secret"
+PACKAGES = ("passlib", "bcrypt", "python-jose", "orjson", "pydantic", "redis")
+
+_contexts: Dict[int, CryptContext] = {}
+
+
+def _context(rounds: int) -> CryptContext:
+    if rounds not in _contexts:
+        _contexts[rounds] = CryptContext(
+            schemes=["bcrypt"], bcrypt__rounds=rounds
+        )
+    return _contexts[rounds]
+
+
+# Module level, so they can also run on a process pool.
+def hash_with_rounds(rounds: int, string: str) -> str:
+    return _context(rounds).hash(string)
+
+
+def verify_with_rounds(rounds: int, string: str, hash: str) -> bool:
+    return _context(rounds).verify(string, hash)
+
+
+class LoopLagProbe:
+    """Measure how late the event loop wakes a sleeping task."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.lags: List[float] = []
+
+    async def _probe(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            self.lags.append(max(0.0, lag))
+
+    @asynccontextmanager
+    async def running(self):
+        task = asyncio.create_task(self._probe())
+        # Let the probe take its first timestamp.
+        await asyncio.sleep(0)
+        try:
+            yield self
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def report(self) -> Dict:
+        return {
+            "loop_lag_p99_ms": round(percentile(self.lags, 99) * 1000, 3),
+            "loop_lag_max_ms": round(max(self.lags, default=0) * 1000, 3),
+            "loop_blocked_ms": round(sum(self.lags) * 1000, 3),
+        }
+
+
+async def measure(
+    func: Callable[[int], Awaitable], iterations: int, concurrency: int
+) -> Dict:
+    """Call func(i) `iterations` times, `concurrency` at a time."""
+    samples: List[float] = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def call(i: int) -> None:
+        async with slots:
+            started = time.perf_counter()
+            await func(i)
+            samples.append(time.perf_counter() - started)
+
+    probe = LoopLagProbe()
+    async with probe.running():
+        started = time.perf_counter()
+        if concurrency == 1:
+            for i in range(iterations):
+                await call(i)
+        else:
+            await asyncio.gather(*(call(i) for i in range(iterations)))
+        elapsed = time.perf_counter() - started
+    return {**summarize(samples, elapsed), **probe.report()}
+
+
+def bcrypt_benchmarks(rounds: List[int], engine: HashEngine) -> Dict:
+    benchmarks = {}
+    for cost in rounds:
+        hashed = hash_with_rounds(cost, PASSWORD)
+
+        async def hash_(i: int, cost=cost) -> None:
+            await engine.run(hash_with_rounds, cost, PASSWORD)
+
+        async def verify(i: int, cost=cost, hashed=hashed) -> None:
+            await engine.run(verify_with_rounds, cost, PASSWORD, hashed)
+
+        benchmarks[f"bcrypt_hash:{cost}"] = hash_
+        benchmarks[f"bcrypt_verify:{cost}"] = verify
+    return benchmarks
+
+
+def jwt_benchmarks() -> Dict:
+    benchmarks = {}
+    data = TokenData(user_id=str(uuid.uuid4()), scopes=["user"])
+    for name in ("jose", "fast"):
+        # A zero-sized cache measures the backend on every call.
+        manager = JWTManager(
+            cache=TokenCache(maxsize=0), backend=get_jwt_backend(name)
+        )
+        cached = JWTManager(backend=get_jwt_backend(name))
+        token = manager.backend.encode(
+            {**data.dict(), "exp": time.time() + 3600}, SECRET
+        )
+
+        async def encode(i: int, manager=manager) -> None:
+            await manager.create_access_token(data, secret_key=SECRET)
+
+        async def decode(i: int, manager=manager, token=token) -> None:
+            await manager.decode_access_token(token, secret_key=SECRET)
+
+        async def decode_cached(i: int, cached=cached, token=token) -> None:
+            await cached.decode_access_token(token, secret_key=SECRET)
+
+        benchmarks[f"jwt_encode:{name}"] = encode
+        benchmarks[f"jwt_decode:{name}"] = decode
+        benchmarks[f"jwt_decode_cached:{name}"] = decode_cached
+    return benchmarks
+
+
+def token_data_benchmarks() -> Dict:
+    user_id = str(uuid.uuid4())
+
+    async def construct(i: int) -> None:
+        TokenData(user_id=user_id, scopes=["user"])
+
+    return {"token_data": construct}
+
+
+def otp_benchmarks() -> Dict:
+    manager = OTPManager()
+    prefix = uuid.uuid4().hex
+    codes: Dict[int, str] = {}
+
+    async def create(i: int) -> None:
+        codes[i] = await manager.create_otp(
+            user_id=f"{prefix}-{i}", purpose="verify", expires=60
+        )
+
+    async def validate(i: int) -> None:
+        await manager.validate_user_otp(
+            user_id=f"{prefix}-{i}", otp=codes[i], purpose="verify"
+        )
+
+    async def issue(iterations: int) -> None:
+        # Fresh codes for every pass, so each call redeems a valid code.
+        for i in range(iterations):
+            await create(i)
+
+    validate.setup = issue
+    return {"otp_create": create, "otp_validate": validate}
+
+
+def versions() -> Dict:
+    found = {}
+    for package in PACKAGES:
+        try:
+            found[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            found[package] = None
+    return found
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def run(args) -> List[Dict]:
+    engine = HashEngine(
+        executor=args.hash_executor,
+        max_workers=args.hash_workers,
+        max_queue=args.concurrency,
+    )
+    groups = {
+        "bcrypt": (
+            lambda: bcrypt_benchmarks(args.rounds, engine),
+            args.hash_iterations,
+        ),
+        "jwt": (jwt_benchmarks, args.iterations),
+        "token_data": (token_data_benchmarks, args.iterations),
+    }
+    if not args.skip_redis:
+        groups["otp"] = (otp_benchmarks, args.iterations)
+
+    results = []
+    try:
+        for group, (build, iterations) in groups.items():
+            if args.only and group not in args.only:
+                continue
+            for name, func in build().items():
+                for mode, concurrency in (
+                    ("sequential", 1),
+                    ("concurrent", args.concurrency),
+                ):
+                    setup = getattr(func, "setup", None)
+                    if setup is not None:
+                        await setup(iterations)
+                    result = await measure(func, iterations, concurrency)
+                    results.append(
+                        {"benchmark": name, "mode": mode, **result}
+                    )
+                    print(json.dumps(results[-1]))
+    finally:
+        await engine.shutdown()
+        if not args.skip_redis:
+            await close_redis()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rounds",
+        type=lambda value: [int(r) for r in value.split(",")],
+        default=[10, 12],
+        help="Comma separated bcrypt cost factors.",
+    )
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--hash-iterations", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--hash-executor", choices=("thread", "process"), default="thread"
+    )
+    parser.add_argument("--hash-workers", type=int, default=4)
+    parser.add_argument(
+        "--only",
+        type=lambda value: value.split(","),
+        help="Comma separated groups: bcrypt, jwt, token_data, otp.",
+    )
+    parser.add_argument("--skip-redis", action="store_true")
+    parser.add_argument(
+        "--history", default="benchmarks/security-history.jsonl"
+    )
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    record = {
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "versions": versions(),
+        "config": {
+            "rounds": args.rounds,
+            "iterations": args.iterations,
+            "hash_iterations": args.hash_iterations,
+            "concurrency": args.concurrency,
+            "hash_executor": args.hash_executor,
+            "hash_workers": args.hash_workers,
+        },
+        "results": results,
+    }
+    with open(args.history, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
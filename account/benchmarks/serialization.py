@@ -0,0 +1,115 @@
+"""
+Compare the CPU cost of encoding user responses.
+
+`response_model` is what the routes did before: validate the ORM row
+into the pydantic schema, run jsonable_encoder and encode with the
+stdlib. `fast` is library.utils.responses. Both paths are checked to
+produce the same bytes before timing. No database is needed.
+
+    python -m benchmarks.serialization --iterations 20000
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from library.schemas.auth import AuthResponse
+from library.schemas.shared import UserPublic
+from library.utils.responses import auth_response, user_response
+from models.user import Users
+
+TOKEN = "header." + "p" * 180 + ".signature"
+
+
+def sample_user() -> Users:
+    return Users(
+        id=uuid.uuid4(),
+        created_at=datetime.now(timezone.utc),
+        email="benchmark@eelclip.com",
+        first_name="Bench",
+        last_name="Mark",
+        is_verified=True,
+        password_hash="$2b$12$" + "x" * 53,
+    )
+
+
+def response_model_path(model, wrap: Callable) -> Callable:
+    field = create_response_field(name="Response", type_=model)
+
+    async def encode(user: Users) -> bytes:
+        content = await serialize_response(
+            field=field, response_content=wrap(user), is_coroutine=True
+        )
+        return JSONResponse(content).body
+
+    return encode
+
+
+def fast_path(encode: Callable) -> Callable:
+    async def wrapper(user: Users) -> bytes:
+        return encode(user).body
+
+    return wrapper
+
+
+PATHS = {
+    "user_public": {
+        "response_model": response_model_path(UserPublic, lambda u: u),
+        "fast": fast_path(user_response),
+    },
+    "auth_response": {
+        "response_model": response_model_path(
+            AuthResponse,
+            lambda u: AuthResponse(user=u, access_token=TOKEN),
+        ),
+        "fast": fast_path(lambda u: auth_response(u, TOKEN)),
+    },
+}
+
+
+async def cpu_per_call(encode: Callable, user: Users, iterations: int):
+    started = time.process_time()
+    for _ in range(iterations):
+        await encode(user)
+    return (time.process_time() - started) / iterations
+
+
+async def run(iterations: int) -> Dict:
+    user = sample_user()
+    results = {}
+    for name, paths in PATHS.items():
+        bodies = {path: await encode(user) for path, encode in paths.items()}
+        if len(set(bodies.values())) != 1:
+            raise AssertionError(f"{name}: outputs differ: {bodies}")
+
+        timings = {
+            path: await cpu_per_call(encode, user, iterations)
+            for path, encode in paths.items()
+        }
+        before, after = timings["response_model"], timings["fast"]
+        results[name] = {
+            "bytes": len(bodies["fast"]),
+            "response_model_us": round(before * 1e6, 2),
+            "fast_us": round(after * 1e6, 2),
+            "saved_us": round((before - after) * 1e6, 2),
+            "speedup": round(before / after, 2) if after else None,
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.iterations)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Shared helpers for benchmark reporting.
+"""
+import statistics
+from typing import Dict, List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples: List[float], elapsed: float = 0.0) -> Dict:
+    """Summarise latency samples given in seconds as milliseconds."""
+    if not samples:
+        return {"count": 0}
+    summary = {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p90_ms": percentile(samples, 90) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+    if elapsed:
+        summary["ops_per_sec"] = len(samples) / elapsed
+    return {k: round(v, 3) for k, v in summary.items()}
@@ -2,7 +2,7 @@
 This module handles application configurations
 """
 from starlette.config import Config
-from starlette.datastructures import Secret
+from starlette.datastructures import CommaSeparatedStrings, Secret
 
 config = Config(".env")
 
@@ -23,8 +23,186 @@ POSTGRES_URL = config(
     default=f"postgres://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}",  # noqa
 )  # noqa
 
+# Postgres connection pool settings, per worker process
+POSTGRES_POOL_MIN_SIZE = config("POSTGRES_POOL_MIN_SIZE", cast=int, default=1)
+POSTGRES_POOL_MAX_SIZE = config("POSTGRES_POOL_MAX_SIZE", cast=int, default=10)
+POSTGRES_ACQUIRE_TIMEOUT = config(
+    "POSTGRES_ACQUIRE_TIMEOUT", cast=float, default=10.0
+)
+POSTGRES_STATEMENT_CACHE_SIZE = config(
+    "POSTGRES_STATEMENT_CACHE_SIZE", cast=int, default=100
+)
+POSTGRES_MAX_INACTIVE_LIFETIME = config(
+    "POSTGRES_MAX_INACTIVE_LIFETIME", cast=float, default=300.0
+)
+# PgBouncer in transaction mode cannot keep prepared statements.
+POSTGRES_PGBOUNCER = config("POSTGRES_PGBOUNCER", cast=bool, default=False)
+
+# Read replicas, as comma separated postgres urls
+POSTGRES_REPLICA_URLS = config(
+    "POSTGRES_REPLICA_URLS", cast=CommaSeparatedStrings, default=""
+)
+REPLICA_MAX_LAG = config("REPLICA_MAX_LAG", cast=float, default=5.0)
+REPLICA_CHECK_INTERVAL = config(
+    "REPLICA_CHECK_INTERVAL", cast=float, default=5.0
+)
+
 
 JWT_ALGORITHM = config("ALGORITHM", cast=str, default="HS256")
+JWT_BACKEND = config("JWT_BACKEND", cast=str, default="jose")  # or "fast"
 ACCESS_TOKEN_EXPIRE_SECONDS = config(
     "ACCESS_TOKEN_EXPIRE_SECONDS", cast=int, default=604800  # 1 week
 )
+TOKEN_CACHE_SIZE = config("TOKEN_CACHE_SIZE", cast=int, default=10000)
+
+# Password hashing settings
+# Pick BCRYPT_ROUNDS with `python -m services.bcrypt_cost calibrate`.
+BCRYPT_ROUNDS = config("BCRYPT_ROUNDS", cast=int, default=12)
+BCRYPT_LATENCY_BUDGET_MS = config(
+    "BCRYPT_LATENCY_BUDGET_MS", cast=float, default=250.0
+)
+HASH_EXECUTOR = config("HASH_EXECUTOR", cast=str, default="thread")
+HASH_MAX_WORKERS = config("HASH_MAX_WORKERS", cast=int, default=4)
+HASH_MAX_QUEUE = config("HASH_MAX_QUEUE", cast=int, default=64)
+
+# Match users on `email` while email_normalized is being backfilled. Each
+# process stops querying on its own once no such rows remain; turn off
+# once `python -m services.backfill_email` has finished.
+EMAIL_LOOKUP_FALLBACK = config(
+    "EMAIL_LOOKUP_FALLBACK", cast=bool, default=True
+)
+
+# REDIS settings
+REDIS_HOST = config("REDIS_HOST", cast=str, default="redis")
+REDIS_PORT = config("REDIS_PORT", cast=int, default=6379)
+REDIS_MAX_CONNECTIONS = config("REDIS_MAX_CONNECTIONS", cast=int, default=50)
+REDIS_OTP_DB = config("REDIS_OTP_DB", cast=int, default=1)
+REDIS_OUTBOX_DB = config("REDIS_OUTBOX_DB", cast=int, default=2)
+REDIS_RATELIMIT_DB = config("REDIS_RATELIMIT_DB", cast=int, default=3)
+
+# OTP settings. Keep OTP_BUCKETS above outstanding codes / 128 so each
+# bucket stays in Redis' compact hash encoding.
+OTP_BUCKETS = config("OTP_BUCKETS", cast=int, default=16384)
+OTP_MAX_ATTEMPTS = config("OTP_MAX_ATTEMPTS", cast=int, default=5)
+# Seconds a code can be redeemed without the account email, for clients
+# that predate scoped codes. Deprecated, set to 0 once they send it.
+OTP_CODE_INDEX_TTL = config("OTP_CODE_INDEX_TTL", cast=int, default=900)
+
+# Proxies trusted to set X-Forwarded-For, as comma separated addresses or
+# networks, or `*`. Also passed to gunicorn as forwarded_allow_ips.
+FORWARDED_ALLOW_IPS = config(
+    "FORWARDED_ALLOW_IPS", cast=CommaSeparatedStrings, default="127.0.0.1"
+)
+
+# Rate limits, as comma separated scope:limit/seconds quotas.
+# Scopes are `ip`, `email` and `route` (shared by every caller).
+RATE_LIMIT_LOGIN = config(
+    "RATE_LIMIT_LOGIN", cast=str, default="ip:20/60,email:5/60"
+)
+RATE_LIMIT_PASSWORD_RESET = config(
+    "RATE_LIMIT_PASSWORD_RESET", cast=str, default="ip:10/600,email:3/600"
+)
+RATE_LIMIT_RESEND_VERIFICATION = config(
+    "RATE_LIMIT_RESEND_VERIFICATION",
+    cast=str,
+    default="ip:10/600,email:3/600",
+)
+# Code redemptions, which bound guessing on codes sent without an email.
+RATE_LIMIT_VERIFY_ACCOUNT = config(
+    "RATE_LIMIT_VERIFY_ACCOUNT", cast=str, default="ip:20/600,email:10/600"
+)
+RATE_LIMIT_CONFIRM_PASSWORD_RESET = config(
+    "RATE_LIMIT_CONFIRM_PASSWORD_RESET",
+    cast=str,
+    default="ip:20/600,email:10/600",
+)
+
+# Email settings
+EMAIL_API_URL = config(
+    "EMAIL_API_URL", cast=str, default="https://api.zeptomail.com/v1.1/email"
+)
+EMAIL_BATCH_API_URL = config(
+    "EMAIL_BATCH_API_URL",
+    cast=str,
+    default="https://api.zeptomail.com/v1.1/email/batch",
+)
+EMAIL_CONNECT_TIMEOUT = config(
+    "EMAIL_CONNECT_TIMEOUT", cast=float, default=3.0
+)
+EMAIL_READ_TIMEOUT = config("EMAIL_READ_TIMEOUT", cast=float, default=10.0)
+EMAIL_MAX_CONNECTIONS = config("EMAIL_MAX_CONNECTIONS", cast=int, default=20)
+EMAIL_HTTP2 = config("EMAIL_HTTP2", cast=bool, default=True)
+
+# Email outbox settings
+OUTBOX_CONCURRENCY = config("OUTBOX_CONCURRENCY", cast=int, default=10)
+OUTBOX_MAX_ATTEMPTS = config("OUTBOX_MAX_ATTEMPTS", cast=int, default=6)
+OUTBOX_BACKOFF_BASE = config("OUTBOX_BACKOFF_BASE", cast=float, default=2.0)
+OUTBOX_BACKOFF_MAX = config("OUTBOX_BACKOFF_MAX", cast=float, default=600.0)
+OUTBOX_MAXLEN = config("OUTBOX_MAXLEN", cast=int, default=100000)
+OUTBOX_DEAD_MAXLEN = config("OUTBOX_DEAD_MAXLEN", cast=int, default=10000)
+
+# Email campaign settings
+CAMPAIGN_BATCH_SIZE = config("CAMPAIGN_BATCH_SIZE", cast=int, default=500)
+CAMPAIGN_CONCURRENCY = config("CAMPAIGN_CONCURRENCY", cast=int, default=4)
+CAMPAIGN_RATE_LIMIT = config(
+    "CAMPAIGN_RATE_LIMIT", cast=float, default=200.0
+)  # emails per second
+
+# Template settings
+TEMPLATE_CACHE_DIR = config(
+    "TEMPLATE_CACHE_DIR", cast=str, default="/tmp/eelclip-templates"
+)
+
+# Parameter store settings
+PARAMETER_BACKEND = config(
+    "PARAMETER_BACKEND", cast=str, default="static" if TESTING else "ssm"
+)
+PARAMETER_FILE = config("PARAMETER_FILE", cast=str, default="parameters.json")
+PARAMETER_TTL = config("PARAMETER_TTL", cast=float, default=300.0)
+PARAMETER_REFRESH_INTERVAL = config(
+    "PARAMETER_REFRESH_INTERVAL", cast=float, default=240.0
+)
+
+# Tracing settings. Traces go to `sentry`, a JSON lines `file`, `memory`
+# (tests) or nowhere (`off`). SENTRY_DSN overrides the parameter store.
+SENTRY_DSN = config("SENTRY_DSN", cast=str, default="")
+TRACE_SINK = config("TRACE_SINK", cast=str, default="sentry")
+TRACE_FILE = config("TRACE_FILE", cast=str, default="traces.jsonl")
+TRACE_SAMPLE_RATE = config("TRACE_SAMPLE_RATE", cast=float, default=0.05)
+# Per-route sample rates, as comma separated route_name=rate pairs.
+TRACE_ROUTE_RATES = config(
+    "TRACE_ROUTE_RATES",
+    cast=str,
+    default="root=0,metrics=0,health:startup=0,health:db_pool=0,health:replicas=0,health:tracing=0,health:memory=0",  # noqa
+)
+TRACE_MAX_PER_SECOND = config("TRACE_MAX_PER_SECOND", cast=float, default=5.0)
+# Error and slow requests are always traced, whatever the rates.
+TRACE_SLOW_SECONDS = config("TRACE_SLOW_SECONDS", cast=float, default=1.0)
+
+# Server settings, see gunicorn.conf.py. Every worker has its own
+# postgres pool, so the database sees up to
+# WEB_CONCURRENCY * POSTGRES_POOL_MAX_SIZE connections.
+PORT = config("PORT", cast=int, default=8081)
+WEB_CONCURRENCY = config("WEB_CONCURRENCY", cast=int, default=0)  # 0 = CPUs
+WORKER_TIMEOUT = config("WORKER_TIMEOUT", cast=int, default=60)
+GRACEFUL_TIMEOUT = config("GRACEFUL_TIMEOUT", cast=int, default=30)
+KEEPALIVE = config("KEEPALIVE", cast=int, default=5)
+MAX_REQUESTS = config("MAX_REQUESTS", cast=int, default=10000)
+MAX_REQUESTS_JITTER = config("MAX_REQUESTS_JITTER", cast=int, default=1000)
+MEMORY_LOG_INTERVAL = config(
+    "MEMORY_LOG_INTERVAL", cast=float, default=300.0
+)
+PROMETHEUS_MULTIPROC_DIR = config(
+    "PROMETHEUS_MULTIPROC_DIR", cast=str, default="/tmp/prometheus-multiproc"
+)
+
+# Shutdown settings. Keep the drain below GRACEFUL_TIMEOUT.
+SHUTDOWN_DRAIN_TIMEOUT = config(
+    "SHUTDOWN_DRAIN_TIMEOUT", cast=float, default=20.0
+)
+RESOURCE_STOP_TIMEOUT = config(
+    "RESOURCE_STOP_TIMEOUT", cast=float, default=5.0
+)
+
+# Startup settings
+GENERATE_SCHEMAS = config("GENERATE_SCHEMAS", cast=bool, default=TESTING)
@@ -0,0 +1,58 @@
+"""
+Tortoise engine that wraps the asyncpg pool with `MeteredPool`.
+
+Use it as `"engine": "database.backend"` in the tortoise config. It
+accepts every asyncpg credential plus `acquire_timeout`. Query
+latency is recorded per statement type.
+"""
+from typing import Optional
+
+from tortoise.backends.asyncpg import AsyncpgDBClient
+
+from database.pool import MeteredPool, get_pool_metrics
+from library.utils.metrics import track
+
+
+STATEMENT_TYPES = {"select", "insert", "update", "delete"}
+
+
+def statement_type(query: str) -> str:
+    """First keyword of a query, e.g. `select` or `update`."""
+    words = query.lstrip().split(None, 1)
+    word = words[0].lower() if words else ""
+    return word if word in STATEMENT_TYPES else "other"
+
+
+class MeteredAsyncpgDBClient(AsyncpgDBClient):
+    def __init__(self, *args, acquire_timeout=None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.acquire_timeout = acquire_timeout
+        self.pool_metrics = get_pool_metrics(self.connection_name)
+
+    async def create_connection(self, with_db: bool) -> None:
+        await super().create_connection(with_db)
+        if self._pool is not None and not isinstance(self._pool, MeteredPool):
+            self._pool = MeteredPool(
+                self._pool, self.pool_metrics, self.acquire_timeout
+            )
+
+    async def execute_query(self, query: str, values: Optional[list] = None):
+        with track("postgres", statement_type(query)):
+            return await super().execute_query(query, values)
+
+    async def execute_query_dict(
+        self, query: str, values: Optional[list] = None
+    ):
+        with track("postgres", statement_type(query)):
+            return await super().execute_query_dict(query, values)
+
+    async def execute_insert(self, query: str, values: list):
+        with track("postgres", "insert"):
+            return await super().execute_insert(query, values)
+
+    async def execute_many(self, query: str, values: list) -> None:
+        with track("postgres", statement_type(query)):
+            return await super().execute_many(query, values)
+
+
+client_class = MeteredAsyncpgDBClient
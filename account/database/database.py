@@ -2,34 +2,71 @@
     This module handles database setup
 """
 import logging
-from fastapi import FastAPI
-from tortoise.contrib.fastapi import register_tortoise
+from urllib.parse import unquote, urlparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from tortoise import Tortoise
+from tortoise.exceptions import DoesNotExist, IntegrityError
 from config import (
     POSTGRES_URL,
-    POSTGRES_USER,
-    POSTGRES_PASSWORD,
-    POSTGRES_HOST,
-    POSTGRES_PORT,
-    POSTGRES_DB,
+    POSTGRES_POOL_MIN_SIZE,
+    POSTGRES_POOL_MAX_SIZE,
+    POSTGRES_ACQUIRE_TIMEOUT,
+    POSTGRES_STATEMENT_CACHE_SIZE,
+    POSTGRES_MAX_INACTIVE_LIFETIME,
+    POSTGRES_PGBOUNCER,
+    POSTGRES_REPLICA_URLS,
+    GENERATE_SCHEMAS,
 )
+from database.pool import PoolAcquireTimeout
+from database.router import replica_set
 
 logger = logging.getLogger(__name__)
 
 MODELS = ["models", "aerich.models"]
 
 
+def get_credentials(url: str) -> dict:
+    """Split a postgres url into tortoise credentials."""
+    parsed = urlparse(str(url))
+    return {
+        "host": parsed.hostname,
+        "port": parsed.port or 5432,
+        "user": unquote(parsed.username or ""),
+        "password": unquote(parsed.password or ""),
+        "database": parsed.path.lstrip("/"),
+    }
+
+
+def get_pool_options() -> dict:
+    """Pool sizing and statement cache options for every connection."""
+    return {
+        "minsize": POSTGRES_POOL_MIN_SIZE,
+        "maxsize": POSTGRES_POOL_MAX_SIZE,
+        "acquire_timeout": POSTGRES_ACQUIRE_TIMEOUT,
+        "max_inactive_connection_lifetime": POSTGRES_MAX_INACTIVE_LIFETIME,
+        "statement_cache_size": (
+            0 if POSTGRES_PGBOUNCER else POSTGRES_STATEMENT_CACHE_SIZE
+        ),
+    }
+
+
+def get_connection(url: str) -> dict:
+    return {
+        "engine": "database.backend",
+        "credentials": {**get_credentials(url), **get_pool_options()},
+    }
+
+
+REPLICAS = {
+    f"replica_{i}": url for i, url in enumerate(POSTGRES_REPLICA_URLS)
+}
+
 TORTOISE_ORM = {
     "connections": {
-        "default": {
-            "engine": "tortoise.backends.asyncpg",
-            "credentials": {
-                "host": f"{POSTGRES_HOST}",
-                "port": f"{POSTGRES_PORT}",
-                "user": f"{POSTGRES_USER}",
-                "password": f"{POSTGRES_PASSWORD}",
-                "database": f"{POSTGRES_DB}",
-            },
-        },
+        "default": get_connection(POSTGRES_URL),
+        **{name: get_connection(url) for name, url in REPLICAS.items()},
     },
     "apps": {
         "models": {
@@ -37,20 +74,45 @@ TORTOISE_ORM = {
             "default_connection": "default",
         }
     },
+    "routers": ["database.router.ReplicaRouter"] if REPLICAS else [],
 }
 
 
-async def init_db(app: FastAPI) -> None:
-    try:
-        register_tortoise(
-            app,
-            db_url=POSTGRES_URL,
-            modules={"models": MODELS},
-            generate_schemas=True,
-            add_exception_handlers=True,
+async def init_db() -> None:
+    """Connect to the database. Errors fail startup, not the requests."""
+    await Tortoise.init(config=TORTOISE_ORM)
+    replica_set.configure(list(REPLICAS))
+    if GENERATE_SCHEMAS:
+        await Tortoise.generate_schemas()
+    logger.warning("--- DB CONNECTION WAS SUCCESSFUL ---")
+
+
+async def close_db() -> None:
+    await Tortoise.close_connections()
+
+
+def add_exception_handlers(app: FastAPI) -> None:
+    """Map ORM lookup and constraint errors to HTTP responses."""
+
+    @app.exception_handler(DoesNotExist)
+    async def does_not_exist_handler(request: Request, exc: DoesNotExist):
+        return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+    @app.exception_handler(PoolAcquireTimeout)
+    async def pool_timeout_handler(request: Request, exc: PoolAcquireTimeout):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "The service is busy, please try again."},
+            headers={"Retry-After": "1"},
+        )
+
+    @app.exception_handler(IntegrityError)
+    async def integrity_error_handler(request: Request, exc: IntegrityError):
+        return JSONResponse(
+            status_code=422,
+            content={
+                "detail": [
+                    {"loc": [], "msg": str(exc), "type": "IntegrityError"}
+                ]
+            },
         )
-        logger.warning("--- DB CONNECTION WAS SUCCESSFUL ---")
-    except Exception as e:
-        logger.warning("--- DB CONNECTION ERROR ---")
-        logger.warning(e)
-        logger.warning("--- DB CONNECTION ERROR ---")
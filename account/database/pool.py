@@ -0,0 +1,132 @@
+"""
+This module handles connection pool instrumentation.
+
+`MeteredPool` wraps an asyncpg pool, applies a default acquire timeout
+and records how long callers wait for a connection.
+"""
+import asyncio
+import bisect
+import time
+from typing import Dict, Optional
+
+# Upper bounds in seconds, the last bucket catches everything else.
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class PoolAcquireTimeout(asyncio.TimeoutError):
+    """No connection became free within the acquire timeout."""
+
+
+class PoolMetrics:
+    """Live usage and acquire-wait histogram for one pool."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.pool = None
+        self.waiters = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def observe_wait(self, seconds: float) -> None:
+        self.wait_sum += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+    def snapshot(self) -> dict:
+        size = idle = max_size = 0
+        if self.pool is not None:
+            size = self.pool.get_size()
+            idle = self.pool.get_idle_size()
+            max_size = self.pool.get_max_size()
+
+        observed = sum(self.wait_buckets)
+        histogram, total = {}, 0
+        for bound, count in zip(WAIT_BUCKETS + ("+Inf",), self.wait_buckets):
+            total += count
+            histogram[str(bound)] = total
+        return {
+            "size": size,
+            "max_size": max_size,
+            "in_use": size - idle,
+            "idle": idle,
+            "waiters": self.waiters,
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "wait": {
+                "count": observed,
+                "sum": round(self.wait_sum, 6),
+                "max": round(self.wait_max, 6),
+                "avg": round(self.wait_sum / observed, 6) if observed else 0,
+                "buckets": histogram,
+            },
+        }
+
+
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+def get_pool_metrics(name: str) -> PoolMetrics:
+    if name not in pool_metrics:
+        pool_metrics[name] = PoolMetrics(name)
+    return pool_metrics[name]
+
+
+class _AcquireContext:
+    """Support both `await pool.acquire()` and `async with`."""
+
+    def __init__(self, pool: "MeteredPool", timeout: Optional[float]) -> None:
+        self.pool = pool
+        self.timeout = timeout
+        self.connection = None
+
+    def __await__(self):
+        return self.pool._acquire(self.timeout).__await__()
+
+    async def __aenter__(self):
+        self.connection = await self.pool._acquire(self.timeout)
+        return self.connection
+
+    async def __aexit__(self, *exc) -> None:
+        connection, self.connection = self.connection, None
+        await self.pool.release(connection)
+
+
+class MeteredPool:
+    """Proxy an asyncpg pool and record acquire waits."""
+
+    def __init__(
+        self, pool, metrics: PoolMetrics, acquire_timeout: Optional[float]
+    ) -> None:
+        self._pool = pool
+        self.metrics = metrics
+        self.acquire_timeout = acquire_timeout
+        metrics.pool = pool
+
+    def __getattr__(self, name: str):
+        return getattr(self._pool, name)
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _AcquireContext:
+        return _AcquireContext(self, timeout or self.acquire_timeout)
+
+    async def _acquire(self, timeout: Optional[float]):
+        self.metrics.waiters += 1
+        started = time.perf_counter()
+        try:
+            connection = await self._pool.acquire(timeout=timeout)
+        except asyncio.TimeoutError:
+            self.metrics.timeouts += 1
+            raise PoolAcquireTimeout(
+                f"Timed out after {timeout}s waiting for a "
+                f"{self.metrics.name} database connection."
+            )
+        finally:
+            self.metrics.waiters -= 1
+            self.metrics.observe_wait(time.perf_counter() - started)
+        self.metrics.acquired += 1
+        return connection
+
+    async def release(self, connection, *, timeout=None) -> None:
+        await self._pool.release(connection, timeout=timeout)
@@ -0,0 +1,39 @@
+"""
+    This module handles redis connection pools
+"""
+from typing import Dict, Tuple
+
+from redis import asyncio as aioredis
+
+from config import REDIS_HOST, REDIS_PORT, REDIS_MAX_CONNECTIONS
+
+_pools: Dict[int, aioredis.ConnectionPool] = {}
+
+
+def get_redis(db: int) -> aioredis.Redis:
+    """Get a client backed by the shared connection pool for db."""
+    pool = _pools.get(db)
+    if pool is None:
+        pool = aioredis.ConnectionPool(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=db,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            decode_responses=True,
+        )
+        _pools[db] = pool
+    return aioredis.Redis(connection_pool=pool)
+
+
+async def server_version(redis: aioredis.Redis) -> Tuple[int, int]:
+    """Major and minor version of the Redis server."""
+    info = await redis.info("server")
+    major, minor = str(info["redis_version"]).split(".")[:2]
+    return int(major), int(minor)
+
+
+async def close_redis() -> None:
+    """Disconnect every shared connection pool."""
+    while _pools:
+        _, pool = _pools.popitem()
+        await pool.disconnect()
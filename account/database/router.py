@@ -0,0 +1,162 @@
+"""
+This module routes read-only queries to read replicas.
+
+Writes always go to the primary. Once a request has written, its later
+reads are pinned to the primary too, so it reads its own writes. A
+background task checks each replica's replay lag and takes a replica
+out of rotation while its lag is above the threshold.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from tortoise import connections
+
+from config import REPLICA_MAX_LAG, REPLICA_CHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Zero when the replica has replayed everything it received, otherwise
+# the age of the last replayed transaction.
+LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(
+        EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+    )
+END AS lag
+"""
+
+_use_primary: ContextVar[bool] = ContextVar("use_primary", default=False)
+
+
+def pin_primary() -> None:
+    """Send the rest of this request's reads to the primary."""
+    _use_primary.set(True)
+
+
+@contextmanager
+def use_primary():
+    """Send reads inside the block to the primary."""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+class ReplicaSet:
+    """Track which replicas are healthy enough to serve reads."""
+
+    def __init__(
+        self,
+        names: Optional[List[str]] = None,
+        max_lag: float = REPLICA_MAX_LAG,
+        check_interval: float = REPLICA_CHECK_INTERVAL,
+    ) -> None:
+        self.names: List[str] = list(names or [])
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag: Dict[str, Optional[float]] = {}
+        self.errors: Dict[str, str] = {}
+        self.last_check: Optional[float] = None
+        self._healthy: List[str] = []
+        self._cycle = iter(())
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(self, names: List[str]) -> None:
+        self.names = list(names)
+        self._set_healthy([])
+
+    def _set_healthy(self, names: List[str]) -> None:
+        if names != self._healthy:
+            dropped = set(self._healthy) - set(names)
+            if dropped:
+                logger.warning("Replicas out of rotation: %s", dropped)
+            self._healthy = names
+            self._cycle = itertools.cycle(names)
+
+    def choose(self) -> Optional[str]:
+        """Next healthy replica, or None to read from the primary."""
+        if not self._healthy:
+            return None
+        return next(self._cycle)
+
+    async def check(self) -> None:
+        """Measure replay lag on every replica."""
+        healthy = []
+        for name in self.names:
+            try:
+                client = connections.get(name)
+                _, rows = await client.execute_query(LAG_QUERY)
+                lag = float(rows[0]["lag"])
+            except Exception as e:
+                self.lag[name] = None
+                self.errors[name] = repr(e)
+                continue
+            self.lag[name] = lag
+            self.errors.pop(name, None)
+            if lag <= self.max_lag:
+                healthy.append(name)
+        self.last_check = time.time()
+        self._set_healthy(healthy)
+
+    async def _check_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.warning("Replica check failed: %r", e)
+
+    async def start(self) -> None:
+        """Check replicas now and keep checking in the background."""
+        if not self.names:
+            return
+        await self.check()
+        if self._task is None:
+            self._task = asyncio.create_task(self._check_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {
+            "max_lag": self.max_lag,
+            "last_check": self.last_check,
+            "replicas": {
+                name: {
+                    "lag": self.lag.get(name),
+                    "in_rotation": name in self._healthy,
+                    "error": self.errors.get(name),
+                }
+                for name in self.names
+            },
+        }
+
+
+replica_set = ReplicaSet()
+
+
+class ReplicaRouter:
+    """Tortoise router sending reads to replicas and writes to primary."""
+
+    def db_for_read(self, model) -> Optional[str]:
+        if _use_primary.get() or model.__module__.startswith("aerich"):
+            return None
+        return replica_set.choose()
+
+    def db_for_write(self, model) -> Optional[str]:
+        pin_primary()
+        return None
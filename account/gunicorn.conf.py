@@ -0,0 +1,110 @@
+"""
+Production server configuration.
+
+    gunicorn -c gunicorn.conf.py server:app
+
+The app is imported once in the master (`preload_app`) and the workers
+are forked from it, so they share its memory copy-on-write. Garbage
+collection would write to every tracked object's header and copy those
+pages, so the master runs with the collector off and freezes its
+objects before each fork. Database and Redis connections are opened by
+each worker's lifespan startup, after the fork.
+
+Workers are recycled after MAX_REQUESTS (+ jitter) requests. Signals:
+
+- HUP: start new workers and stop the old ones gracefully. The code is
+  not re-imported, because it was preloaded.
+- TERM: stop gracefully, waiting up to GRACEFUL_TIMEOUT seconds.
+- USR2 then WINCH and TERM on the old master: deploy new code without
+  dropping connections.
+
+Per-worker RSS, PSS and private memory are logged every
+MEMORY_LOG_INTERVAL seconds.
+"""
+import gc
+import glob
+import os
+import threading
+import time
+
+from config import (
+    FORWARDED_ALLOW_IPS,
+    GRACEFUL_TIMEOUT,
+    KEEPALIVE,
+    MAX_REQUESTS,
+    MAX_REQUESTS_JITTER,
+    MEMORY_LOG_INTERVAL,
+    PORT,
+    PROMETHEUS_MULTIPROC_DIR,
+    WEB_CONCURRENCY,
+    WORKER_TIMEOUT,
+)
+from library.utils.memory import cpu_count, log_memory
+
+# prometheus_client reads this when imported, so it has to be set before
+# the app is preloaded.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", PROMETHEUS_MULTIPROC_DIR)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+# Keep the objects created while preloading where fork left them.
+gc.disable()
+
+bind = f"0.0.0.0:{PORT}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = WEB_CONCURRENCY or cpu_count()
+preload_app = True
+timeout = WORKER_TIMEOUT
+graceful_timeout = GRACEFUL_TIMEOUT
+keepalive = KEEPALIVE
+max_requests = MAX_REQUESTS
+max_requests_jitter = MAX_REQUESTS_JITTER
+accesslog = "-"
+# UvicornWorker passes this on, so request.client is the real client
+# when the load balancer is trusted.
+forwarded_allow_ips = ",".join(FORWARDED_ALLOW_IPS)
+
+
+def on_starting(server):
+    # Drop samples left by the workers of a previous run.
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    for name in glob.glob(os.path.join(path, "*.db")):
+        os.remove(name)
+
+
+def when_ready(server):
+    gc.collect()
+    gc.freeze()
+    if MEMORY_LOG_INTERVAL > 0:
+        threading.Thread(
+            target=_log_memory, args=(server,), name="memory", daemon=True
+        ).start()
+
+
+def pre_fork(server, worker):
+    # Anything allocated since the last fork, e.g. on HUP.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_reload(server):
+    server.log.info("Reloading workers.")
+
+
+def _log_memory(server):
+    while True:
+        time.sleep(MEMORY_LOG_INTERVAL)
+        try:
+            pids = list(server.WORKERS)
+        except RuntimeError:
+            # Workers changed while copying, try again next time.
+            continue
+        log_memory(os.getpid(), pids, log=server.log.info)
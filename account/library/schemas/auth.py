@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, EmailStr, Field
 from library.schemas.shared import UserPublic
@@ -30,5 +30,7 @@ class LoginSchema(BaseModel):
 class ConfirmPasswordReset(BaseModel):
     """Confirm password reset."""
 
+    # Optional for one release, for clients that predate scoped codes.
+    email: Optional[EmailStr] = None
     otp: str
     new_password: str = Field(..., min_length=8)
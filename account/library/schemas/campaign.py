@@ -0,0 +1,37 @@
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+from config import (
+    CAMPAIGN_BATCH_SIZE,
+    CAMPAIGN_CONCURRENCY,
+    CAMPAIGN_RATE_LIMIT,
+)
+
+
+class CampaignIn(BaseModel):
+    """Bulk email campaign request."""
+
+    campaign_id: str = Field(..., regex=r"^[A-Za-z0-9_.-]{1,100}$")
+    template: str = Field(..., regex=r"^campaigns/[A-Za-z0-9_.-]+\.html$")
+    subject: str
+    context: Dict[str, str] = {}
+    batch_size: int = Field(CAMPAIGN_BATCH_SIZE, ge=1, le=500)
+    concurrency: int = Field(CAMPAIGN_CONCURRENCY, ge=1, le=32)
+    rate_limit: float = Field(CAMPAIGN_RATE_LIMIT, gt=0)
+
+
+class CampaignStatus(BaseModel):
+    """Bulk email campaign progress."""
+
+    campaign_id: str
+    status: str
+    template: Optional[str] = None
+    subject: Optional[str] = None
+    last_id: Optional[str] = None
+    sent: int = 0
+    failed: int = 0
+    batches: int = 0
+    started_at: Optional[float] = None
+    updated_at: Optional[float] = None
+    error: Optional[str] = None
@@ -0,0 +1,13 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class EmailResult(BaseModel):
+    """Outcome of an email provider request."""
+
+    ok: bool
+    status_code: Optional[int] = None
+    request_id: Optional[str] = None
+    message: Optional[str] = None
+    elapsed: float = 0.0
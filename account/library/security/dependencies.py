@@ -0,0 +1,32 @@
+"""
+This module handles authentication dependencies for protected routes.
+"""
+from typing import Callable
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from library.schemas.auth import TokenData
+from library.security.jwt import jwt_manager
+
+
+bearer_scheme = HTTPBearer()
+
+
+def require_scope(scope: str) -> Callable:
+    """Require a valid access token that carries scope."""
+
+    async def dependency(
+        credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    ) -> TokenData:
+        token_data = await jwt_manager.decode_access_token(
+            access_token=credentials.credentials
+        )
+        if scope not in token_data.scopes:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You do not have permission to perform this action.",
+            )
+        return token_data
+
+    return dependency
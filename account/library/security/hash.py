@@ -2,20 +2,173 @@
 This module handles main service authentication related
 functions.
 """
+import asyncio
+import time
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
+from config import (
+    BCRYPT_ROUNDS,
+    HASH_EXECUTOR,
+    HASH_MAX_WORKERS,
+    HASH_MAX_QUEUE,
+)
+from library.utils.metrics import track
+
+
+# Hashes below the configured cost are flagged by needs_update().
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+
+def _hash(string: str) -> str:
+    return pwd_context.hash(string)
+
+
+def _verify(string: str, hash: str) -> bool:
+    return pwd_context.verify(string, hash)
+
+
+def _timed(func: Callable, queued_at: float, *args) -> tuple:
+    """Run func in a worker and report how long it waited to start."""
+    return time.time() - queued_at, func(*args)
+
+
+class HashMetrics:
+    """Track hashing engine queue depth and wait time."""
+
+    def __init__(self) -> None:
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def observe_wait(self, seconds: float) -> None:
+        self.completed += 1
+        self.wait_time_total += seconds
+        self.wait_time_max = max(self.wait_time_max, seconds)
+
+    @property
+    def wait_time_avg(self) -> float:
+        if not self.completed:
+            return 0.0
+        return self.wait_time_total / self.completed
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    def snapshot(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_time_avg": self.wait_time_avg,
+            "wait_time_max": self.wait_time_max,
+        }
+
+
+class HashEngine:
+    """
+    Run password hashing off the event loop on a bounded worker pool.
+
+    At most `max_workers` jobs run at once and at most `max_queue`
+    more wait for a worker. Anything beyond that is rejected with a
+    503 so a burst of logins sheds load instead of piling up.
+    """
+
+    def __init__(
+        self,
+        executor: str = HASH_EXECUTOR,
+        max_workers: int = HASH_MAX_WORKERS,
+        max_queue: int = HASH_MAX_QUEUE,
+    ) -> None:
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown hash executor: {executor}")
+        self.executor = executor
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.metrics = HashMetrics()
+        self._pool: Optional[Executor] = None
+        self._pending = 0
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.executor == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="hash",
+                )
+        return self._pool
+
+    def _update_depth(self) -> None:
+        self.metrics.in_flight = min(self._pending, self.max_workers)
+        self.metrics.queue_depth = max(0, self._pending - self.max_workers)
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Run func on the pool, rejecting work when the queue is full."""
+        if self._pending >= self.max_workers + self.max_queue:
+            self.metrics.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The server is busy. Please try again shortly.",
+                headers={"Retry-After": "1"},
+            )
+
+        self._pending += 1
+        self._update_depth()
+        try:
+            loop = asyncio.get_running_loop()
+            wait, result = await loop.run_in_executor(
+                self._get_pool(), _timed, func, time.time(), *args
+            )
+            self.metrics.observe_wait(wait)
+            return result
+        finally:
+            self._pending -= 1
+            self._update_depth()
+
+    async def shutdown(self) -> None:
+        """Stop the worker pool without blocking the event loop."""
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            # Drop queued jobs now, then wait for running ones off-loop.
+            pool.shutdown(wait=False, cancel_futures=True)
+            await asyncio.to_thread(pool.shutdown, wait=True)
+
+
+hash_engine = HashEngine()
 
 
 class HashService:
+    def __init__(self, engine: HashEngine = hash_engine) -> None:
+        self.engine = engine
+
     async def get_hash(self, string: str) -> str:
         """Hash a piece of string."""
-        return pwd_context.hash(string)
+        with track("bcrypt", "hash"):
+            return await self.engine.run(_hash, string)
 
     async def verify_hash(self, string: str, hash: str) -> bool:
         """Verify that hash is valid."""
-        return pwd_context.verify(string, hash)
+        with track("bcrypt", "verify"):
+            return await self.engine.run(_verify, string, hash)
+
+    def needs_update(self, hash: str) -> bool:
+        """Check whether a hash was made with an outdated cost."""
+        return pwd_context.needs_update(hash)
 
 
 hash_service = HashService()
@@ -1,49 +1,144 @@
 """
 This module handles security related features of authentication service.
 """
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Tuple
 
-from jose import jwt
 from jose.exceptions import ExpiredSignatureError, JWTError
 from fastapi import HTTPException, status
 from pydantic import ValidationError
 
 from config import (
-    JWT_ALGORITHM,
     ACCESS_TOKEN_EXPIRE_SECONDS,
+    TOKEN_CACHE_SIZE,
 )
 from library.schemas.auth import TokenData
-from library.utils.parameters import get_ssm_parameters
+from library.security.jwt_backends import JWTBackend, get_jwt_backend
+from library.utils.parameters import parameter_store
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified tokens.
+
+    Entries are keyed by a digest of the secret key and the token, and
+    are dropped once the token's `exp` passes on `clock`.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = TOKEN_CACHE_SIZE,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.maxsize = maxsize
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[bytes, Tuple[TokenData, float]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(access_token: str, secret_key: str) -> bytes:
+        digest = hashlib.sha256(str(secret_key).encode())
+        digest.update(b"\0")
+        digest.update(access_token.encode())
+        return digest.digest()
+
+    def get(self, access_token: str, secret_key: str) -> Optional[TokenData]:
+        key = self.key(access_token, secret_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= self.clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry[0].copy(deep=True)
+
+    def set(
+        self,
+        access_token: str,
+        secret_key: str,
+        token_data: TokenData,
+        expires_at: float,
+    ) -> None:
+        if self.maxsize <= 0:
+            return
+        key = self.key(access_token, secret_key)
+        with self._lock:
+            self._entries[key] = (token_data.copy(deep=True), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def revoke(self, access_token: str, secret_key: str) -> bool:
+        """Drop a token so the next decode verifies it again."""
+        with self._lock:
+            key = self.key(access_token, secret_key)
+            return self._entries.pop(key, None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
 
 
 class JWTManager:
-    parameters = get_ssm_parameters()
+    def __init__(
+        self,
+        cache: Optional[TokenCache] = None,
+        backend: Optional[JWTBackend] = None,
+    ) -> None:
+        self.cache = cache or TokenCache()
+        self.backend = backend or get_jwt_backend()
+
+    @property
+    def secret_key(self) -> str:
+        return parameter_store.get("app_secret_key")
 
     async def create_access_token(
         self,
         token_data: TokenData,
-        secret_key: str = parameters["app_secret_key"],
+        secret_key: Optional[str] = None,
         expires_in: int = ACCESS_TOKEN_EXPIRE_SECONDS,
     ) -> str:
         """Create an access token for user."""
+        secret_key = secret_key or self.secret_key
         to_encode = token_data.dict()
         expire = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
         to_encode.update({"exp": expire.timestamp()})
-        encoded_jwt = jwt.encode(
-            to_encode, secret_key, algorithm=JWT_ALGORITHM
-        )
+        encoded_jwt = self.backend.encode(to_encode, secret_key)
         return encoded_jwt
 
     async def decode_access_token(
-        self, access_token: str, secret_key: str = parameters["app_secret_key"]
+        self, access_token: str, secret_key: Optional[str] = None
     ) -> TokenData:
         """Check that submitted token is valid."""
+        secret_key = secret_key or self.secret_key
+        payload = self.cache.get(access_token, secret_key)
+        if payload is not None:
+            return payload
+
         try:
-            decoded_token = jwt.decode(
-                access_token,
-                str(secret_key),
-                algorithms=[JWT_ALGORITHM],
-            )
+            decoded_token = self.backend.decode(access_token, secret_key)
             payload = TokenData(**decoded_token)
         except ExpiredSignatureError as e:  # noqa
             raise HTTPException(
@@ -57,7 +152,18 @@ class JWTManager:
                 detail="Invalid token credentials. Please login.",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+
+        if isinstance(decoded_token.get("exp"), (int, float)):
+            self.cache.set(
+                access_token, secret_key, payload, decoded_token["exp"]
+            )
         return payload
 
+    def revoke_access_token(
+        self, access_token: str, secret_key: Optional[str] = None
+    ) -> bool:
+        """Drop a token from the decoded-token cache."""
+        return self.cache.revoke(access_token, secret_key or self.secret_key)
+
 
 jwt_manager = JWTManager()
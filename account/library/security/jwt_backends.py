@@ -0,0 +1,172 @@
+"""
+This module handles JWT signing and verification backends.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+from typing import Dict
+
+import orjson
+from jose import jwt
+from jose.exceptions import ExpiredSignatureError, JWTClaimsError, JWTError
+
+from config import JWT_ALGORITHM, JWT_BACKEND
+
+
+def base64url_encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def base64url_decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+class JWTBackend:
+    """Sign and verify JWTs."""
+
+    def __init__(self, algorithm: str = JWT_ALGORITHM) -> None:
+        self.algorithm = algorithm
+
+    def encode(self, claims: dict, secret_key: str) -> str:
+        raise NotImplementedError
+
+    def decode(self, token: str, secret_key: str) -> dict:
+        """Verify a token and return its claims, raising JWTError."""
+        raise NotImplementedError
+
+
+class JoseBackend(JWTBackend):
+    """Sign and verify JWTs with python-jose."""
+
+    def encode(self, claims: dict, secret_key: str) -> str:
+        return jwt.encode(claims, secret_key, algorithm=self.algorithm)
+
+    def decode(self, token: str, secret_key: str) -> dict:
+        return jwt.decode(token, str(secret_key), algorithms=[self.algorithm])
+
+
+class FastHMACBackend(JWTBackend):
+    """
+    Sign and verify HMAC JWTs with precomputed keys and headers.
+
+    The encoded header segment and each keyed HMAC object are built
+    once and reused. Claims are serialised with orjson. Tokens are
+    byte-for-byte identical to the ones python-jose produces.
+    """
+
+    digests = {
+        "HS256": hashlib.sha256,
+        "HS384": hashlib.sha384,
+        "HS512": hashlib.sha512,
+    }
+    max_keys = 16
+
+    def __init__(self, algorithm: str = JWT_ALGORITHM) -> None:
+        if algorithm not in self.digests:
+            raise ValueError(f"Unsupported fast JWT algorithm: {algorithm}")
+        super().__init__(algorithm)
+        self.digest = self.digests[algorithm]
+        header = json.dumps(
+            {"alg": algorithm, "typ": "JWT"},
+            separators=(",", ":"),
+            sort_keys=True,
+        )
+        self.header_segment = base64url_encode(header.encode())
+        self._keys: Dict[str, hmac.HMAC] = {}
+        self._lock = threading.Lock()
+
+    def _mac(self, secret_key: str) -> hmac.HMAC:
+        mac = self._keys.get(secret_key)
+        if mac is None:
+            mac = hmac.new(str(secret_key).encode(), digestmod=self.digest)
+            with self._lock:
+                if len(self._keys) >= self.max_keys:
+                    self._keys.clear()
+                self._keys[secret_key] = mac
+        return mac.copy()
+
+    def _sign(self, signing_input: bytes, secret_key: str) -> bytes:
+        mac = self._mac(secret_key)
+        mac.update(signing_input)
+        return mac.digest()
+
+    @staticmethod
+    def _serialize(claims: dict) -> bytes:
+        payload = orjson.dumps(claims)
+        if payload.isascii():
+            return payload
+        # python-jose escapes non-ASCII characters, orjson does not.
+        return json.dumps(claims, separators=(",", ":")).encode()
+
+    def encode(self, claims: dict, secret_key: str) -> str:
+        signing_input = (
+            self.header_segment
+            + b"."
+            + base64url_encode(self._serialize(claims))
+        )
+        signature = base64url_encode(self._sign(signing_input, secret_key))
+        return (signing_input + b"." + signature).decode()
+
+    def decode(self, token: str, secret_key: str) -> dict:
+        try:
+            token_bytes = token.encode()
+            signing_input, signature = token_bytes.rsplit(b".", 1)
+            header_segment, payload_segment = signing_input.split(b".")
+            header = orjson.loads(base64url_decode(header_segment))
+            claims = orjson.loads(base64url_decode(payload_segment))
+            signature = base64url_decode(signature)
+        except (ValueError, TypeError, orjson.JSONDecodeError):
+            raise JWTError("Error decoding token.")
+
+        if not isinstance(header, dict) or header.get("alg") != self.algorithm:
+            raise JWTError("The specified alg value is not allowed")
+        expected = self._sign(signing_input, secret_key)
+        if not hmac.compare_digest(expected, signature):
+            raise JWTError("Signature verification failed.")
+        if not isinstance(claims, dict):
+            raise JWTError("Invalid payload string: must be a json object")
+
+        self._validate_times(claims)
+        self._validate_claims(claims)
+        return claims
+
+    @staticmethod
+    def _validate_times(claims: dict) -> None:
+        # Mirrors python-jose: whole seconds and no leeway.
+        now = int(time.time())
+        try:
+            if "iat" in claims:
+                int(claims["iat"])
+            exp = int(claims["exp"]) if "exp" in claims else None
+            nbf = int(claims["nbf"]) if "nbf" in claims else None
+        except (TypeError, ValueError):
+            raise JWTClaimsError("Time claims must be integers.")
+        if nbf is not None and nbf > now:
+            raise JWTClaimsError("The token is not yet valid (nbf)")
+        if exp is not None and exp < now:
+            raise ExpiredSignatureError("Signature has expired.")
+
+    @staticmethod
+    def _validate_claims(claims: dict) -> None:
+        # Mirrors python-jose decoding without an audience or issuer:
+        # any audience is rejected.
+        if "aud" in claims:
+            raise JWTClaimsError("Invalid audience")
+        if "sub" in claims and not isinstance(claims["sub"], str):
+            raise JWTClaimsError("Subject must be a string.")
+        if "jti" in claims and not isinstance(claims["jti"], str):
+            raise JWTClaimsError("JWT ID must be a string.")
+
+
+def get_jwt_backend(
+    name: str = JWT_BACKEND, algorithm: str = JWT_ALGORITHM
+) -> JWTBackend:
+    """Build the configured JWT backend."""
+    if name == "jose":
+        return JoseBackend(algorithm)
+    if name == "fast":
+        return FastHMACBackend(algorithm)
+    raise ValueError(f"Unknown JWT backend: {name}")
@@ -1,39 +1,178 @@
-import random
-import string
+"""
+This module handles one-time codes sent to users.
 
-import redis
+Codes are scoped to a user and a purpose, so they never have to be
+unique across users and issuing one is a single write. Each purpose
+keeps its codes as fields of bucketed hashes:
+
+    otp:{purpose}:{bucket}  user_id -> "{code}:{attempts}"
+
+Issuing a code overwrites the user's field, which invalidates the
+previous one. Every field carries its own TTL (HPEXPIRE, Redis 7.4+).
+With few fields per bucket, Redis keeps each hash in its compact
+listpack encoding. See benchmarks/otp_capacity.py for memory use.
+
+Older clients redeem a code without the account email. For one release
+each new code is also indexed for OTP_CODE_INDEX_TTL seconds:
+
+    otp:code:{purpose}:{code}  user_id
+
+The index is first come, first served, so a code that collides with
+another user's indexed code needs the email. A wrong code sent without
+an email matches no user, so no attempt is counted; the verify and
+reset routes are rate limited per IP instead.
+"""
+import secrets
+import zlib
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+from config import (
+    OTP_BUCKETS,
+    OTP_CODE_INDEX_TTL,
+    OTP_MAX_ATTEMPTS,
+    REDIS_OTP_DB,
+)
+from database.redis import get_redis
+from library.utils.metrics import track
+
+# Per-field TTLs (HEXPIRE, HPEXPIRE, HPTTL).
+MIN_REDIS_VERSION = (7, 4)
+PURPOSES = ("verify", "reset")
+KEY = "otp:{}:{}"
+INDEX_KEY = "otp:code:{}:{}"
+
+# Returns 1 for a valid code, 0 for a wrong or missing code and -1
+# when the wrong guess used up the last attempt. KEYS[2] is the index
+# entry of the submitted code, dropped with the code if it is the
+# user's. Burnt codes leave their entry to expire, it no longer matches.
+VALIDATE_OTP = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+if not raw then
+    return 0
+end
+local code, attempts = string.match(raw, '^(%d+):(%d+)$')
+if code == ARGV[2] then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    if redis.call('GET', KEYS[2]) == ARGV[1] then
+        redis.call('DEL', KEYS[2])
+    end
+    return 1
+end
+attempts = tonumber(attempts) + 1
+if attempts >= tonumber(ARGV[3]) then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    return -1
+end
+local ttl = redis.call('HPTTL', KEYS[1], 'FIELDS', 1, ARGV[1])[1]
+redis.call('HSET', KEYS[1], ARGV[1], code .. ':' .. attempts)
+if ttl > 0 then
+    redis.call('HPEXPIRE', KEYS[1], ttl, 'FIELDS', 1, ARGV[1])
+end
+return 0
+"""
 
 
 class OTPManager:
     """Manage user OTP."""
 
-    redis = redis.Redis(host="redis", port=6379, db=1)
+    def __init__(
+        self,
+        db: int = REDIS_OTP_DB,
+        buckets: int = OTP_BUCKETS,
+        max_attempts: int = OTP_MAX_ATTEMPTS,
+        index_ttl: int = OTP_CODE_INDEX_TTL,
+    ) -> None:
+        self.db = db
+        self.buckets = buckets
+        self.max_attempts = max_attempts
+        self.index_ttl = index_ttl
+        self._validate = None
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        return get_redis(self.db)
+
+    def key(self, user_id: str, purpose: str) -> str:
+        if purpose not in PURPOSES:
+            raise ValueError(f"Unknown OTP purpose: {purpose}")
+        bucket = zlib.crc32(str(user_id).encode()) % self.buckets
+        return KEY.format(purpose, bucket)
 
     def generate_token(self, num: int = 6) -> str:
         """Generate random token."""
-        characters = string.digits
-        return "".join(random.choice(characters) for _ in range(num))
+        return "".join(str(secrets.randbelow(10)) for _ in range(num))
 
-    def create_otp(self, user_id: str, expires: int = 3600):
-        """Create OTP"""
+    async def create_otp(
+        self, user_id: str, purpose: str, expires: int = 3600
+    ) -> str:
+        """Issue a code, replacing the user's previous one."""
         otp = self.generate_token()
-        while self.redis.exists(otp):
-            otp = self.generate_token()
-        self.redis.set(otp, user_id, ex=expires)
+        key = self.key(user_id, purpose)
+        with track("redis", "create_otp"):
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.hset(key, str(user_id), f"{otp}:0")
+            pipe.execute_command(
+                "HEXPIRE", key, expires, "FIELDS", 1, str(user_id)
+            )
+            if self.index_ttl > 0:
+                pipe.set(
+                    INDEX_KEY.format(purpose, otp),
+                    str(user_id),
+                    ex=min(expires, self.index_ttl),
+                    nx=True,
+                )
+            await pipe.execute()
         return otp
 
-    def validate_user_otp(self, otp: str):
-        """Check that otp is valid."""
-        if self.redis.exists(otp):
-            user_id = self.redis.get(otp).decode("utf-8")
-            self.delete_user_otp(otp)
-            return user_id
-        return None
+    async def find_user(self, otp: str, purpose: str) -> Optional[str]:
+        """
+        Look up who a code was issued to, without the account email.
+
+        Deprecated, only for clients that predate scoped codes.
+        """
+        if self.index_ttl <= 0 or not otp.isdigit():
+            return None
+        with track("redis", "find_otp_user"):
+            return await self.redis.get(INDEX_KEY.format(purpose, otp))
 
-    def delete_user_otp(self, otp: str):
+    async def validate_user_otp(
+        self, user_id: str, otp: str, purpose: str
+    ) -> bool:
+        """Check a code and consume it if it is valid."""
+        if not otp.isdigit():
+            otp = ""
+        if self._validate is None:
+            self._validate = self.redis.register_script(VALIDATE_OTP)
+        with track("redis", "validate_otp"):
+            result = await self._validate(
+                keys=[
+                    self.key(user_id, purpose),
+                    INDEX_KEY.format(purpose, otp),
+                ],
+                args=[str(user_id), otp, self.max_attempts],
+                client=self.redis,
+            )
+        return result == 1
+
+    async def delete_user_otp(self, user_id: str, purpose: str) -> None:
         """Delete user OTP."""
-        if self.redis.exists(otp):
-            self.redis.delete(otp)
+        with track("redis", "delete_otp"):
+            await self.redis.hdel(self.key(user_id, purpose), str(user_id))
+
+    async def invalidate_user(self, user_id: str) -> None:
+        """Drop the user's outstanding codes for every purpose."""
+        with track("redis", "delete_otp"):
+            pipe = self.redis.pipeline(transaction=True)
+            for purpose in PURPOSES:
+                pipe.hdel(self.key(user_id, purpose), str(user_id))
+            await pipe.execute()
+
+    async def get_user_otp(self, user_id: str, purpose: str) -> Optional[str]:
+        """Get the user's outstanding code, if any."""
+        raw = await self.redis.hget(self.key(user_id, purpose), str(user_id))
+        return raw.split(":")[0] if raw else None
 
 
 otp_manager = OTPManager()
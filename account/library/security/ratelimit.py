@@ -0,0 +1,221 @@
+"""
+This module handles rate limiting for expensive endpoints.
+
+Each request is counted in a sliding window per client IP, per email
+and per route. Behind a trusted proxy the client IP is taken from
+X-Forwarded-For. One Lua script checks and records every window in a
+single round trip, so a rejected request never reaches bcrypt or the
+email outbox. If Redis is unreachable, each process falls back to
+counting in memory.
+"""
+import hashlib
+import ipaddress
+import logging
+import math
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Callable, Deque, Dict, List, NamedTuple
+
+from fastapi import HTTPException, Request, status
+from redis import asyncio as aioredis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from config import FORWARDED_ALLOW_IPS, REDIS_RATELIMIT_DB
+from database.redis import get_redis
+from library.utils.metrics import track
+
+logger = logging.getLogger(__name__)
+
+KEY = "ratelimit:{}:{}:{}"
+
+# KEYS are the windows to check. ARGV holds the current time and a
+# unique member, then a window length and limit (ms) for every key.
+# Returns 0 when the request is allowed, otherwise the milliseconds
+# until the fullest window has room again.
+SLIDING_WINDOW = """
+local now = tonumber(ARGV[1])
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local window = tonumber(ARGV[i * 2 + 1])
+    local limit = tonumber(ARGV[i * 2 + 2])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= limit then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        local wait = tonumber(oldest[2]) + window - now
+        if wait > retry_after then
+            retry_after = wait
+        end
+    end
+end
+if retry_after > 0 then
+    return retry_after
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, ARGV[2])
+    redis.call('PEXPIRE', key, ARGV[i * 2 + 1])
+end
+return 0
+"""
+
+
+class Quota(NamedTuple):
+    scope: str
+    limit: int
+    window: float
+
+
+def parse_quotas(spec: str) -> List[Quota]:
+    """Parse `ip:20/60,email:5/60` into quotas."""
+    quotas = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        scope, _, rate = item.partition(":")
+        limit, _, window = rate.partition("/")
+        if scope not in ("ip", "email", "route"):
+            raise ValueError(f"Unknown rate limit scope: {scope}")
+        quotas.append(Quota(scope, int(limit), float(window)))
+    return quotas
+
+
+class MemoryWindow:
+    """In-process sliding windows, used while Redis is unavailable."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self.clock = clock
+        self._hits: Dict[str, Deque[float]] = defaultdict(deque)
+
+    def hit(self, keys: List[str], quotas: List[Quota]) -> float:
+        now = self.clock()
+        retry_after = 0.0
+        for key, quota in zip(keys, quotas):
+            hits = self._hits[key]
+            while hits and hits[0] <= now - quota.window:
+                hits.popleft()
+            if len(hits) >= quota.limit:
+                retry_after = max(retry_after, hits[0] + quota.window - now)
+        if retry_after:
+            return retry_after
+        for key in keys:
+            self._hits[key].append(now)
+        return 0.0
+
+    def clear(self) -> None:
+        self._hits.clear()
+
+
+class SlidingWindowLimiter:
+    """Check and record requests against their quotas."""
+
+    def __init__(self, db: int = REDIS_RATELIMIT_DB) -> None:
+        self.db = db
+        self.fallback = MemoryWindow()
+        self.fallback_hits = 0
+        self._script = None
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        return get_redis(self.db)
+
+    async def hit(self, keys: List[str], quotas: List[Quota]) -> float:
+        """Record a request, or return seconds to wait if over quota."""
+        if self._script is None:
+            self._script = self.redis.register_script(SLIDING_WINDOW)
+        args = [int(time.time() * 1000), uuid.uuid4().hex]
+        for quota in quotas:
+            args += [int(quota.window * 1000), quota.limit]
+        try:
+            with track("redis", "rate_limit"):
+                retry_after = await self._script(
+                    keys=keys, args=args, client=self.redis
+                )
+        except (RedisConnectionError, RedisTimeoutError, OSError) as e:
+            if not self.fallback_hits % 1000:
+                logger.warning("Rate limiting in memory: %r", e)
+            self.fallback_hits += 1
+            return self.fallback.hit(keys, quotas)
+        return retry_after / 1000
+
+
+rate_limiter = SlidingWindowLimiter()
+
+
+class TrustedProxies:
+    """Addresses allowed to report the client IP in X-Forwarded-For."""
+
+    def __init__(self, allowed=FORWARDED_ALLOW_IPS) -> None:
+        allowed = [item.strip() for item in allowed if item.strip()]
+        self.trust_all = "*" in allowed
+        self.networks = [
+            ipaddress.ip_network(item, strict=False)
+            for item in allowed
+            if item != "*"
+        ]
+
+    def trusts(self, host: str) -> bool:
+        if self.trust_all:
+            return True
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self.networks)
+
+    def client_ip(self, request: Request) -> str:
+        """The first address, from the right, not added by a proxy."""
+        host = request.client.host if request.client else "unknown"
+        if not self.trusts(host):
+            return host
+        forwarded = request.headers.get("x-forwarded-for", "")
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not self.trusts(hop):
+                return hop
+        return hops[0] if hops else host
+
+
+trusted_proxies = TrustedProxies()
+
+
+def _identity(scope: str, request: Request, email: str) -> str:
+    if scope == "ip":
+        return trusted_proxies.client_ip(request)
+    if scope == "email":
+        # Keep addresses out of Redis keys.
+        return hashlib.sha256(email.encode()).hexdigest()[:32]
+    return "*"
+
+
+def rate_limit(
+    name: str, spec: str, limiter: SlidingWindowLimiter = rate_limiter
+) -> Callable:
+    """Reject requests to a route once any of its quotas is used up."""
+    quotas = parse_quotas(spec)
+
+    async def dependency(request: Request) -> None:
+        email = ""
+        if any(quota.scope == "email" for quota in quotas):
+            try:
+                body = await request.json()
+            except ValueError:
+                body = None
+            if isinstance(body, dict) and isinstance(body.get("email"), str):
+                email = body["email"].strip().lower()
+
+        # Requests without an email are only limited per IP and route.
+        active = [q for q in quotas if q.scope != "email" or email]
+        if not active:
+            return
+        keys = [
+            KEY.format(name, q.scope, _identity(q.scope, request, email))
+            for q in active
+        ]
+        retry_after = await limiter.hit(keys, active)
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests. Please try again later.",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    return dependency
@@ -1,17 +1,144 @@
-from typing import List
+import logging
+import time
+from typing import Dict, List, Optional
 
-import requests
+import httpx
 
-from library.utils.parameters import get_ssm_parameters
+from config import (
+    EMAIL_API_URL,
+    EMAIL_BATCH_API_URL,
+    EMAIL_CONNECT_TIMEOUT,
+    EMAIL_READ_TIMEOUT,
+    EMAIL_MAX_CONNECTIONS,
+    EMAIL_HTTP2,
+)
+from library.schemas.email import EmailResult
+from library.utils.metrics import track
+from library.utils.parameters import parameter_store
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa
+    except ImportError:
+        return False
+    return True
+
+
+class EmailTransport:
+    """Deliver emails through a long-lived, pooled HTTP client."""
+
+    def __init__(
+        self,
+        url: str = EMAIL_API_URL,
+        batch_url: str = EMAIL_BATCH_API_URL,
+        connect_timeout: float = EMAIL_CONNECT_TIMEOUT,
+        read_timeout: float = EMAIL_READ_TIMEOUT,
+        max_connections: int = EMAIL_MAX_CONNECTIONS,
+        http2: bool = EMAIL_HTTP2,
+    ) -> None:
+        self.url = url
+        self.batch_url = batch_url
+        self.timeout = httpx.Timeout(
+            read_timeout, connect=connect_timeout, pool=connect_timeout
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        self.http2 = http2 and _http2_available()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(
+        self, transport: Optional[httpx.AsyncBaseTransport] = None
+    ) -> None:
+        """Open the HTTP client."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                transport=transport,
+            )
+
+    async def close(self) -> None:
+        """Close the HTTP client and its pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("Email transport has not been started.")
+        return self._client
+
+    async def post(
+        self, payload: dict, url: Optional[str] = None
+    ) -> EmailResult:
+        """Post a payload to the email provider."""
+        headers = {"Authorization": parameter_store.get("zoho_trans_mail")}
+
+        started = time.perf_counter()
+        try:
+            with track("email", "send"):
+                res = await self.client.post(
+                    url or self.url, headers=headers, json=payload
+                )
+        except httpx.HTTPError as e:
+            logger.warning("Email request failed: %r", e)
+            return EmailResult(
+                ok=False,
+                message=str(e) or e.__class__.__name__,
+                elapsed=time.perf_counter() - started,
+            )
+        return self._parse_response(res, time.perf_counter() - started)
+
+    def _parse_response(
+        self, res: httpx.Response, elapsed: float
+    ) -> EmailResult:
+        try:
+            body = res.json()
+        except ValueError:
+            body = {}
+        # Proxies in front of the provider may answer with anything.
+        if not isinstance(body, dict):
+            body = {}
+        error = body.get("error")
+        if not isinstance(error, dict):
+            error = {}
+        result = EmailResult(
+            ok=res.is_success,
+            status_code=res.status_code,
+            request_id=body.get("request_id") or error.get("request_id"),
+            message=body.get("message") or error.get("message"),
+            elapsed=elapsed,
+        )
+        if result.ok:
+            logger.info(
+                "Email accepted: request_id=%s elapsed=%.3fs",
+                result.request_id,
+                elapsed,
+            )
+        else:
+            logger.warning(
+                "Email rejected: status=%s code=%s message=%s",
+                result.status_code,
+                error.get("code"),
+                result.message,
+            )
+        return result
+
+
+email_transport = EmailTransport()
 
 
 async def send_email(
     to_address: List[str], subject: str, body: str, name: str
-) -> None:
+) -> EmailResult:
     """Send email"""
-    parameters = get_ssm_parameters()
-    url = "https://api.zeptomail.com/v1.1/email"
-    headers = {"Authorization": parameters["zoho_trans_mail"]}
     payload = {
         "bounce_address": "bounce@bounce.eelclip.com",
         "from": {"address": "noreply@eelclip.com", "name": "eelclip"},
@@ -22,5 +149,34 @@ async def send_email(
         "subject": subject,
         "htmlbody": body,
     }
-    res = requests.post(url, headers=headers, json=payload)
-    print(res.json())
+    return await email_transport.post(payload)
+
+
+async def send_batch_email(
+    recipients: List[Dict], subject: str, body: str
+) -> EmailResult:
+    """
+    Send one email to many recipients in a single provider request.
+
+    Each recipient is a dict with `address`, `name` and optional
+    `merge_info` used to fill `{{field}}` merge tags in the body.
+    """
+    payload = {
+        "bounce_address": "bounce@bounce.eelclip.com",
+        "from": {"address": "noreply@eelclip.com", "name": "eelclip"},
+        "to": [
+            {
+                "email_address": {
+                    "address": recipient["address"],
+                    "name": recipient.get("name") or "Eelclip",
+                },
+                "merge_info": recipient.get("merge_info", {}),
+            }
+            for recipient in recipients
+        ],
+        "subject": subject,
+        "htmlbody": body,
+    }
+    return await email_transport.post(
+        payload, url=email_transport.batch_url
+    )
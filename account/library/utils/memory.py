@@ -0,0 +1,76 @@
+"""
+This module handles process memory reporting.
+
+RSS counts every page a process maps, including pages it still shares
+with the gunicorn master after fork, so it overstates what each worker
+costs. PSS splits shared pages between the processes sharing them and
+adds up to the real total. `private` is what a worker owns alone.
+"""
+import logging
+import math
+import os
+from typing import Callable, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared",
+    "Shared_Dirty": "shared",
+    "Private_Clean": "private",
+    "Private_Dirty": "private",
+}
+
+
+def process_memory(pid: int) -> Dict[str, float]:
+    """Memory of a process in MB, from /proc/<pid>/smaps_rollup."""
+    usage = {"rss": 0.0, "pss": 0.0, "shared": 0.0, "private": 0.0}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in FIELDS:
+                usage[FIELDS[name]] += int(value.split()[0]) / 1024
+    return {key: round(value, 1) for key, value in usage.items()}
+
+
+def log_memory(
+    master: int, workers: Iterable[int], log: Callable = logger.info
+) -> None:
+    """Log the memory of the master and each worker."""
+    total_rss = total_pss = 0.0
+    for role, pid in [("master", master)] + [("worker", p) for p in workers]:
+        try:
+            usage = process_memory(pid)
+        except OSError:
+            # The worker exited meanwhile, or /proc is not available.
+            continue
+        total_rss += usage["rss"]
+        total_pss += usage["pss"]
+        log(
+            "Memory %s %s: rss=%.1fMB pss=%.1fMB shared=%.1fMB "
+            "private=%.1fMB",
+            role,
+            pid,
+            usage["rss"],
+            usage["pss"],
+            usage["shared"],
+            usage["private"],
+        )
+    log("Memory total: rss=%.1fMB pss=%.1fMB", total_rss, total_pss)
+
+
+def cpu_count() -> int:
+    """CPUs this process may use, honouring cgroup CPU quotas."""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            count = min(count, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, count)
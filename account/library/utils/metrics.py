@@ -0,0 +1,145 @@
+"""
+This module handles Prometheus metrics.
+
+Requests are counted and timed per route name, and calls to slow
+dependencies (bcrypt, redis, postgres, templates, email) are timed per
+operation. When `PROMETHEUS_MULTIPROC_DIR` is set in the environment
+before start-up, every worker process writes its samples there and
+`/metrics` aggregates all of them.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from library.utils.tracing import record_span
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by route and status.",
+    ["method", "route", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being served.",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+DEPENDENCY_LATENCY = Histogram(
+    "dependency_duration_seconds",
+    "Latency of calls to downstream dependencies.",
+    ["dependency", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+DEPENDENCY_ERRORS = Counter(
+    "dependency_errors_total",
+    "Failed calls to downstream dependencies.",
+    ["dependency", "operation"],
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+@contextmanager
+def track(dependency: str, operation: str):
+    """Time a dependency call, counting it as failed if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        DEPENDENCY_ERRORS.labels(dependency, operation).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        DEPENDENCY_LATENCY.labels(dependency, operation).observe(elapsed)
+        record_span(dependency, operation, started, elapsed)
+
+
+def route_name(scope: Scope) -> str:
+    """Name of the route that handled the request."""
+    route = scope.get("route")
+    return getattr(route, "name", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Count and time requests per route name."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        method = scope["method"]
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        # The route is only known once routing has run, so in-progress
+        # requests are tracked per method.
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            route = route_name(scope)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            REQUEST_LATENCY.labels(method, route).observe(elapsed)
+
+
+def get_registry() -> CollectorRegistry:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_response() -> Response:
+    """Render every metric in the Prometheus text format."""
+    return Response(
+        generate_latest(get_registry()), media_type=CONTENT_TYPE_LATEST
+    )
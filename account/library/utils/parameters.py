@@ -1,39 +1,243 @@
-import boto3
+"""
+This module handles application secrets and remote parameters.
 
-from config import TESTING
+Parameters are fetched in one call from a pluggable backend and cached
+in-process. A background task refreshes the cache before it expires,
+and a failed refresh keeps serving the last known values. While that
+task runs, reads never call the backend themselves.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
 
+from config import (
+    PARAMETER_BACKEND,
+    PARAMETER_FILE,
+    PARAMETER_TTL,
+    PARAMETER_REFRESH_INTERVAL,
+)
 
-def get_ssm_parameters():
-    """Get ssm parameters."""
+logger = logging.getLogger(__name__)
+
+# How long stale values are served after a failed fetch before retrying.
+ERROR_BACKOFF = 30.0
+
+PARAMETER_NAMES = (
+    "zoho_trans_mail",
+    "app_secret_key",
+    "pixabay_api_key",
+    "sentry_accounts",
+    "sentry_main",
+    "unsplash_access_key",
+    "unsplash_secret_key",
+)
+
+TEST_PARAMETERS = {
+    "zoho_trans_mail": "",
+    "app_secret_key": "secret",
+    "pixabay_api_key": "",
+    "sentry_accounts": "",
+    "sentry_main": "",
+    "unsplash_access_key": "",
+    "unsplash_secret_key": "",
+}
+
+
+class ParameterBackend:
+    """Source of parameter values."""
+
+    def fetch(self, names: Iterable[str]) -> Dict[str, str]:
+        raise NotImplementedError
+
+
+class SSMBackend(ParameterBackend):
+    """Read parameters from AWS SSM Parameter Store."""
+
+    # GetParameters accepts at most 10 names per call.
+    max_names = 10
+
+    def __init__(self) -> None:
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
 
-    if TESTING:
+            self._client = boto3.client("ssm")
+        return self._client
+
+    def fetch(self, names: Iterable[str]) -> Dict[str, str]:
+        names = list(dict.fromkeys(names))
+        data = {}
+        for i in range(0, len(names), self.max_names):
+            parameters = self.client.get_parameters(
+                Names=names[i : i + self.max_names],  # noqa
+                WithDecryption=True,
+            )
+            for item in parameters.get("Parameters"):
+                data.update({item.get("Name"): item.get("Value")})
+        return data
+
+
+class EnvBackend(ParameterBackend):
+    """Read parameters from upper-cased environment variables."""
+
+    def fetch(self, names: Iterable[str]) -> Dict[str, str]:
         return {
-            "zoho_trans_mail": "",
-            "app_secret_key": "secret",
-            "pixabay_api_key": "",
-            "sentry_accounts": "",
-            "sentry_main": "",
-            "unsplash_access_key": "",
-            "unsplash_secret_key": "",
-            "zoho_trans_mail": "",
+            name: os.environ[name.upper()]
+            for name in names
+            if name.upper() in os.environ
         }
 
-    ssm = boto3.client("ssm")
-    parameters = ssm.get_parameters(
-        Names=[
-            "zoho_trans_mail",
-            "app_secret_key",
-            "pixabay_api_key",
-            "sentry_accounts",
-            "sentry_main",
-            "unsplash_access_key",
-            "unsplash_secret_key",
-            "zoho_trans_mail",
-        ],
-        WithDecryption=True,
-    )
-
-    data = {}
-    for item in parameters.get("Parameters"):
-        data.update({item.get("Name"): item.get("Value")})
-    return data
+
+class FileBackend(ParameterBackend):
+    """Read parameters from a local JSON file."""
+
+    def __init__(self, path: str = PARAMETER_FILE) -> None:
+        self.path = path
+
+    def fetch(self, names: Iterable[str]) -> Dict[str, str]:
+        with open(self.path) as f:
+            values = json.load(f)
+        return {name: values[name] for name in names if name in values}
+
+
+class StaticBackend(ParameterBackend):
+    """Serve a fixed set of parameters."""
+
+    def __init__(self, values: Dict[str, str]) -> None:
+        self.values = values
+
+    def fetch(self, names: Iterable[str]) -> Dict[str, str]:
+        return {
+            name: self.values[name] for name in names if name in self.values
+        }
+
+
+def get_backend(name: str = PARAMETER_BACKEND) -> ParameterBackend:
+    """Build the configured parameter backend."""
+    if name == "ssm":
+        return SSMBackend()
+    if name == "env":
+        return EnvBackend()
+    if name == "file":
+        return FileBackend()
+    if name == "static":
+        return StaticBackend(TEST_PARAMETERS)
+    raise ValueError(f"Unknown parameter backend: {name}")
+
+
+class ParameterMetrics:
+    """Track parameter cache usage."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.stale_served = 0
+        self.last_refresh: Optional[float] = None
+
+    def snapshot(self) -> dict:
+        return dict(vars(self))
+
+
+class ParameterStore:
+    """TTL-cached parameters with background refresh."""
+
+    def __init__(
+        self,
+        backend: Optional[ParameterBackend] = None,
+        names: Iterable[str] = PARAMETER_NAMES,
+        ttl: float = PARAMETER_TTL,
+        refresh_interval: float = PARAMETER_REFRESH_INTERVAL,
+    ) -> None:
+        self._backend = backend
+        self.names = tuple(dict.fromkeys(names))
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.metrics = ParameterMetrics()
+        self._values: Optional[Dict[str, str]] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def backend(self) -> ParameterBackend:
+        if self._backend is None:
+            self._backend = get_backend()
+        return self._backend
+
+    def refresh(self) -> Dict[str, str]:
+        """Fetch every parameter from the backend in one call."""
+        with self._lock:
+            values = self.backend.fetch(self.names)
+            self._values = values
+            self._expires_at = time.monotonic() + self.ttl
+            self.metrics.refreshes += 1
+            self.metrics.last_refresh = time.time()
+            return values
+
+    def get_all(self) -> Dict[str, str]:
+        """Get all parameters, refreshing them when the cache expired."""
+        values = self._values
+        # The background refresh owns fetching once it runs, so reads on
+        # the event loop never block on the backend.
+        if values is not None and (
+            self._task is not None or time.monotonic() < self._expires_at
+        ):
+            self.metrics.hits += 1
+            return values
+
+        self.metrics.misses += 1
+        try:
+            return self.refresh()
+        except Exception as e:
+            if values is None:
+                raise
+            self.metrics.refresh_errors += 1
+            self.metrics.stale_served += 1
+            # Back off, so every caller does not retry the fetch.
+            self._expires_at = time.monotonic() + min(self.ttl, ERROR_BACKOFF)
+            logger.warning("Serving stale parameters: %r", e)
+            return values
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.get_all().get(name, default)
+
+    async def _refresh_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                self.metrics.refresh_errors += 1
+                logger.warning("Parameter refresh failed: %r", e)
+
+    async def start(self) -> None:
+        """Load parameters and keep them fresh in the background."""
+        await asyncio.to_thread(self.get_all)
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+parameter_store = ParameterStore()
+
+
+def get_ssm_parameters() -> Dict[str, str]:
+    """Get ssm parameters."""
+    return parameter_store.get_all()
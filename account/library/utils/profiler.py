@@ -0,0 +1,51 @@
+"""
+This module handles startup profiling.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    """Record how long each startup phase takes."""
+
+    def __init__(self) -> None:
+        self.phases: Dict[str, float] = {}
+        self.created = time.perf_counter()
+
+    def record_imports(self) -> None:
+        """Record the time since the profiler itself was imported."""
+        self.record("imports", time.perf_counter() - self.created)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def report(self) -> dict:
+        return {
+            "phases": {k: round(v, 6) for k, v in self.phases.items()},
+            "total": round(sum(self.phases.values()), 6),
+        }
+
+    def log(self) -> None:
+        report = self.report()
+        phases = " ".join(
+            f"{name}={seconds * 1000:.1f}ms"
+            for name, seconds in report["phases"].items()
+        )
+        logger.warning(
+            "--- STARTUP %.1fms %s ---", report["total"] * 1000, phases
+        )
+
+
+startup_profiler = StartupProfiler()
@@ -0,0 +1,35 @@
+"""
+This module handles the fast response path for user payloads.
+
+Handlers that return these responses skip FastAPI's response_model
+validation and stdlib json encoding. ORM rows are mapped to the public
+schema's fields once and encoded with orjson. The output is byte for
+byte what the response_model path produced.
+"""
+from typing import Any, Dict
+
+from fastapi import status
+from fastapi.responses import ORJSONResponse
+
+from library.schemas.shared import UserPublic
+
+# Same order as the schema, so the keys come out as before.
+USER_PUBLIC_FIELDS = tuple(UserPublic.__fields__)
+
+
+def user_public(user) -> Dict[str, Any]:
+    """Map a user row to the `UserPublic` payload."""
+    return {field: getattr(user, field) for field in USER_PUBLIC_FIELDS}
+
+
+def user_response(
+    user, status_code: int = status.HTTP_200_OK
+) -> ORJSONResponse:
+    return ORJSONResponse(user_public(user), status_code=status_code)
+
+
+def auth_response(user, access_token: str) -> ORJSONResponse:
+    """Encode an `AuthResponse` payload."""
+    return ORJSONResponse(
+        {"user": user_public(user), "access_token": access_token}
+    )
@@ -0,0 +1,109 @@
+"""
+This module handles email template rendering.
+
+Templates are minified when they are loaded, compiled once and kept in
+memory. Compiled bytecode is also written to a persistent cache, so a
+cold start loads it instead of parsing the templates again.
+"""
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, Iterable
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from config import TEMPLATE_CACHE_DIR
+from library.utils.metrics import track
+
+TEMPLATES_DIR = Path(__file__).resolve().parents[2] / "templates"
+EMAIL_TEMPLATES = ("email_verification.html", "password_reset.html")
+
+_comments = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+_between_tags = re.compile(r">\s+<")
+_whitespace = re.compile(r"\s+")
+_preformatted = re.compile(r"<(pre|textarea)\b", re.IGNORECASE)
+
+
+def minify_html(source: str) -> str:
+    """Strip comments and collapse whitespace in an HTML template."""
+    if _preformatted.search(source):
+        return source
+    source = _comments.sub("", source)
+    source = _between_tags.sub("><", source)
+    return _whitespace.sub(" ", source).strip()
+
+
+class MinifyingLoader(FileSystemLoader):
+    """Load templates with their static HTML already minified."""
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(
+            environment, template
+        )
+        if template.endswith(".html"):
+            source = minify_html(source)
+        return source, filename, uptodate
+
+
+class RenderMetrics:
+    """Track template render time."""
+
+    def __init__(self) -> None:
+        self.count: Dict[str, int] = {}
+        self.total: Dict[str, float] = {}
+        self.max: Dict[str, float] = {}
+
+    def observe(self, name: str, seconds: float) -> None:
+        self.count[name] = self.count.get(name, 0) + 1
+        self.total[name] = self.total.get(name, 0.0) + seconds
+        self.max[name] = max(self.max.get(name, 0.0), seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            name: {
+                "count": count,
+                "avg": self.total[name] / count,
+                "max": self.max[name],
+            }
+            for name, count in self.count.items()
+        }
+
+
+class TemplateService:
+    """Shared, precompiled template environment."""
+
+    def __init__(
+        self,
+        directory: Path = TEMPLATES_DIR,
+        cache_dir: str = TEMPLATE_CACHE_DIR,
+    ) -> None:
+        bytecode_cache = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        self.env = Environment(
+            loader=MinifyingLoader(str(directory)),
+            bytecode_cache=bytecode_cache,
+            enable_async=True,
+            auto_reload=False,
+            cache_size=-1,
+        )
+        self.metrics = RenderMetrics()
+
+    def precompile(self, names: Iterable[str] = EMAIL_TEMPLATES) -> None:
+        """Load and compile templates ahead of the first request."""
+        for name in names:
+            self.env.get_template(name)
+
+    async def render(self, name: str, **context) -> str:
+        """Render a template."""
+        started = time.perf_counter()
+        with track("template", name):
+            template = self.env.get_template(name)
+            html = await template.render_async(**context)
+        self.metrics.observe(name, time.perf_counter() - started)
+        return html
+
+
+template_service = TemplateService()
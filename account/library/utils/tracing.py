@@ -0,0 +1,388 @@
+"""
+This module handles request tracing.
+
+Every request collects its dependency spans (see `metrics.track`) in a
+plain list, and the decision to keep the trace is made once the
+response is sent:
+
+- failed requests (5xx or an exception) and requests slower than
+  `TRACE_SLOW_SECONDS` are always kept;
+- other requests are kept at their route's sample rate, scaled down
+  when traffic would exceed `TRACE_MAX_PER_SECOND` traces a second. A
+  token bucket enforces the cap over bursts.
+
+Kept traces go to a sink: Sentry, a JSON lines file or memory. The time
+spent tracing each request is exported as `tracing_overhead_seconds`.
+"""
+import logging
+import random
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional
+
+import orjson
+from prometheus_client import Counter as CounterMetric
+from prometheus_client import Histogram
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import (
+    TRACE_FILE,
+    TRACE_MAX_PER_SECOND,
+    TRACE_ROUTE_RATES,
+    TRACE_SAMPLE_RATE,
+    TRACE_SINK,
+    TRACE_SLOW_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_SPANS = 200
+
+TRACING_OVERHEAD = Histogram(
+    "tracing_overhead_seconds",
+    "Time spent tracing a request.",
+    buckets=(
+        0.000001,
+        0.000005,
+        0.00001,
+        0.000025,
+        0.00005,
+        0.0001,
+        0.00025,
+        0.0005,
+        0.001,
+        0.005,
+    ),
+)
+TRACES = CounterMetric(
+    "traces_total", "Request traces by sampling decision.", ["decision"]
+)
+
+
+class Trace:
+    __slots__ = ("method", "path", "started", "wall", "spans")
+
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.wall = time.time()
+        self.spans: List[tuple] = []
+
+    def as_dict(
+        self, route: str, status: int, duration: float, reason: str
+    ) -> Dict:
+        return {
+            "trace_id": uuid.uuid4().hex,
+            "route": route,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "start": self.wall,
+            "duration_ms": round(duration * 1000, 3),
+            "reason": reason,
+            "spans": [
+                {
+                    "op": op,
+                    "description": description,
+                    "offset_ms": round((started - self.started) * 1000, 3),
+                    "duration_ms": round(elapsed * 1000, 3),
+                }
+                for op, description, started, elapsed in self.spans
+            ],
+        }
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def record_span(
+    op: str, description: str, started: float, elapsed: float
+) -> None:
+    """Add a span to the request being traced, if any."""
+    trace = _current.get()
+    if trace is not None and len(trace.spans) < MAX_SPANS:
+        trace.spans.append((op, description, started, elapsed))
+
+
+def parse_rates(spec: str) -> Dict[str, float]:
+    """Parse `auth:login=0.5,metrics=0` into route sample rates."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, rate = item.rpartition("=")
+        rates[route] = float(rate)
+    return rates
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class TraceSampler:
+    """Decide which finished requests to keep."""
+
+    def __init__(
+        self,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        route_rates: Optional[Dict[str, float]] = None,
+        max_per_second: float = TRACE_MAX_PER_SECOND,
+        slow_seconds: float = TRACE_SLOW_SECONDS,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.route_rates = route_rates or {}
+        self.max_per_second = max_per_second
+        self.slow_seconds = slow_seconds
+        self.bucket = TokenBucket(max_per_second)
+        # Traces the route rates would keep, per second.
+        self.expected = 0.0
+        self.scale = 1.0
+        self._window_start = time.monotonic()
+        self._window_expected = 0.0
+
+    def _adapt(self, rate: float) -> None:
+        self._window_expected += rate
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < 1.0:
+            return
+        expected = self._window_expected / elapsed
+        self.expected = (self.expected + expected) / 2
+        self.scale = (
+            min(1.0, self.max_per_second / self.expected)
+            if self.expected
+            else 1.0
+        )
+        self._window_start = now
+        self._window_expected = 0.0
+
+    def decide(
+        self, route: str, status: int, duration: float
+    ) -> Optional[str]:
+        """Return why the trace is kept, or None to drop it."""
+        if status >= 500:
+            return "error"
+        if duration >= self.slow_seconds:
+            return "slow"
+        rate = self.route_rates.get(route, self.sample_rate)
+        if rate <= 0:
+            return None
+        self._adapt(rate)
+        if random.random() < rate * self.scale and self.bucket.take():
+            return "sampled"
+        return None
+
+
+class MemorySink:
+    def __init__(self, maxlen: int = 1000) -> None:
+        self.traces: Deque[Dict] = deque(maxlen=maxlen)
+
+    def emit(self, trace: Dict) -> None:
+        self.traces.append(trace)
+
+    def close(self) -> None:
+        pass
+
+
+class FileSink:
+    """Append traces to a JSON lines file."""
+
+    def __init__(self, path: str = TRACE_FILE) -> None:
+        self.path = path
+        self._file = None
+
+    def emit(self, trace: Dict) -> None:
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.write(orjson.dumps(trace) + b"\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _timestamp(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+class SentrySink:
+    """Send traces to Sentry as transactions."""
+
+    def emit(self, trace: Dict) -> None:
+        import sentry_sdk
+
+        start = trace["start"]
+        transaction = sentry_sdk.start_transaction(
+            name=trace["route"],
+            op="http.server",
+            source="route",
+            sampled=True,
+            start_timestamp=_timestamp(start),
+        )
+        transaction.set_tag("http.method", trace["method"])
+        transaction.set_tag("trace.reason", trace["reason"])
+        transaction.set_data("path", trace["path"])
+        transaction.set_http_status(trace["status"])
+        for span in trace["spans"]:
+            started = start + span["offset_ms"] / 1000
+            child = transaction.start_child(
+                op=span["op"],
+                description=span["description"],
+                start_timestamp=_timestamp(started),
+            )
+            child.finish(
+                end_timestamp=_timestamp(started + span["duration_ms"] / 1000)
+            )
+        transaction.finish(
+            end_timestamp=_timestamp(start + trace["duration_ms"] / 1000)
+        )
+
+    def close(self) -> None:
+        pass
+
+
+def traces_sampler(sampling_context: Dict) -> float:
+    """
+    Keep Sentry's own request instrumentation off.
+
+    Requests are sampled by `TracingMiddleware` once they finish, and the
+    transactions it sends are marked as sampled, so they skip this.
+    """
+    return 0.0
+
+
+def get_sink(name: str):
+    if name == "memory":
+        return MemorySink()
+    if name == "file":
+        return FileSink()
+    if name == "sentry":
+        import sentry_sdk
+
+        if sentry_sdk.Hub.current.client is None:
+            logger.info("Sentry is not configured, tracing is off.")
+            return None
+        return SentrySink()
+    if name == "off":
+        return None
+    raise ValueError(f"Unknown trace sink: {name}")
+
+
+class Tracer:
+    """Collect request traces and keep a sample of them."""
+
+    def __init__(self, sampler: Optional[TraceSampler] = None) -> None:
+        self.sampler = sampler or TraceSampler(
+            route_rates=parse_rates(TRACE_ROUTE_RATES)
+        )
+        self.sink = None
+        self.decisions: Counter = Counter()
+        self.overhead = 0.0
+        self.requests = 0
+
+    def start(self, sink: str = TRACE_SINK) -> None:
+        self.sink = get_sink(sink)
+
+    def stop(self) -> None:
+        if self.sink is not None:
+            self.sink.close()
+        self.sink = None
+
+    def begin(self, scope: Scope) -> Trace:
+        trace = Trace(scope["method"], scope["path"])
+        _current.set(trace)
+        return trace
+
+    def finish(
+        self, trace: Trace, route: str, status: int, duration: float
+    ) -> None:
+        reason = self.sampler.decide(route, status, duration)
+        self.decisions[reason or "dropped"] += 1
+        TRACES.labels(reason or "dropped").inc()
+        if reason is None:
+            return
+        try:
+            self.sink.emit(trace.as_dict(route, status, duration, reason))
+        except Exception as e:
+            logger.warning("Could not send trace: %r", e)
+
+    def record_overhead(self, seconds: float) -> None:
+        self.requests += 1
+        self.overhead += seconds
+        TRACING_OVERHEAD.observe(seconds)
+
+    def snapshot(self) -> Dict:
+        return {
+            "sink": type(self.sink).__name__ if self.sink else None,
+            "sample_rate": self.sampler.sample_rate,
+            "route_rates": self.sampler.route_rates,
+            "max_per_second": self.sampler.max_per_second,
+            "expected_per_second": round(self.sampler.expected, 3),
+            "scale": round(self.sampler.scale, 4),
+            "decisions": dict(self.decisions),
+            "overhead_avg_us": round(
+                self.overhead / self.requests * 1e6 if self.requests else 0,
+                3,
+            ),
+        }
+
+
+tracer = Tracer()
+
+
+class TracingMiddleware:
+    """Trace requests and hand finished ones to the tracer."""
+
+    def __init__(self, app: ASGIApp, tracer: Tracer = tracer) -> None:
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or self.tracer.sink is None:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        began = time.perf_counter()
+        trace = self.tracer.begin(scope)
+        overhead = time.perf_counter() - began
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            status_code = 500
+            raise
+        finally:
+            finished = time.perf_counter()
+            route = getattr(scope.get("route"), "name", None) or "unmatched"
+            self.tracer.finish(
+                trace, route, status_code, finished - trace.started
+            )
+            _current.set(None)
+            overhead += time.perf_counter() - finished
+            self.tracer.record_overhead(overhead)
@@ -0,0 +1,14 @@
+from tortoise import BaseDBAsyncClient
+
+
+# The unique index is built by `python -m services.backfill_email` with
+# CREATE INDEX CONCURRENTLY, which cannot run inside this migration's
+# transaction and would otherwise lock "users" while it builds.
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "users" ADD "email_normalized" VARCHAR(500);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "users" DROP COLUMN "email_normalized";"""
@@ -1,18 +1,162 @@
-from tortoise import fields
+import time
+from typing import Iterable, Optional
 
+from tortoise import fields, timezone
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.exceptions import IntegrityError
+
+from config import EMAIL_LOOKUP_FALLBACK
 from models.base import AbstractBaseModel
 
+# Created with the table, or by services.backfill_email.
+EMAIL_NORMALIZED_KEY = "users_email_normalized_key"
+
+
+def _violates(error: IntegrityError, constraint: str) -> bool:
+    cause = error.args[0] if error.args else None
+    return getattr(cause, "constraint_name", None) == constraint
+
 
 class Users(AbstractBaseModel):
     """Define users database model"""
 
     email = fields.CharField(max_length=500, null=True)
+    email_normalized = fields.CharField(max_length=500, null=True, unique=True)
     first_name = fields.CharField(max_length=500, null=True)
     last_name = fields.CharField(max_length=500, null=True)
     password_hash = fields.CharField(max_length=3000, null=True)
     user_class = fields.CharField(max_length=3000, default="base", null=True)
     is_verified = fields.BooleanField(default=False)
 
+    @staticmethod
+    def normalize_email(email: Optional[str]) -> Optional[str]:
+        """Canonical form of an email address used for lookups."""
+        return email.strip().lower() if email else None
+
+    @classmethod
+    async def get_by_email(cls, email: Optional[str]) -> Optional["Users"]:
+        """
+        Find a user by email. Until services.backfill_email has filled
+        email_normalized, rows without it are matched on email instead.
+        """
+        normalized = cls.normalize_email(email)
+        if not normalized:
+            return None
+        user = await cls.get_or_none(email_normalized=normalized)
+        if user is None and await legacy_rows.remain():
+            user = await cls.get_legacy_by_email(normalized)
+        return user
+
+    @classmethod
+    async def get_legacy_by_email(cls, normalized: str) -> Optional["Users"]:
+        """The oldest row the backfill has not reached for this email."""
+        return (
+            await cls.filter(email_normalized=None, email__iexact=normalized)
+            .order_by("created_at", "id")
+            .first()
+        )
+
+    @classmethod
+    async def create_unique(cls, **kwargs) -> Optional["Users"]:
+        """
+        Create a user, or return None if the email is already taken.
+        The unique index on email_normalized decides, and rows it does
+        not cover yet are checked first while the backfill runs.
+        """
+        normalized = cls.normalize_email(kwargs.get("email"))
+        if (
+            normalized
+            and await legacy_rows.remain()
+            and await cls.get_legacy_by_email(normalized) is not None
+        ):
+            return None
+        try:
+            return await cls.create(**kwargs)
+        except IntegrityError as e:
+            if not _violates(e, EMAIL_NORMALIZED_KEY):
+                raise
+            return None
+
+    @classmethod
+    async def update_returning(cls, pk, **changes) -> Optional["Users"]:
+        """
+        Update only the given fields and updated_at, so concurrent
+        changes to other columns survive, then read the row back.
+        Returns None if no row has that id.
+        """
+        changes["updated_at"] = timezone.now()
+        if "email" in changes:
+            changes["email_normalized"] = cls.normalize_email(changes["email"])
+
+        # The write pins this request's reads to the primary.
+        if not await cls.filter(id=pk).update(**changes):
+            return None
+        return await cls.get_or_none(id=pk)
+
+    @classmethod
+    async def replace_password_hash(
+        cls, pk, old_hash: str, new_hash: str
+    ) -> bool:
+        """
+        Swap the password hash only if it is still old_hash, so a
+        password changed in the meantime is never overwritten.
+        """
+        updated = await cls.filter(id=pk, password_hash=old_hash).update(
+            password_hash=new_hash, updated_at=timezone.now()
+        )
+        return bool(updated)
+
+    async def save(
+        self,
+        using_db: Optional[BaseDBAsyncClient] = None,
+        update_fields: Optional[Iterable[str]] = None,
+        force_create: bool = False,
+        force_update: bool = False,
+    ) -> None:
+        self.email_normalized = self.normalize_email(self.email)
+        if update_fields is not None and "email" in update_fields:
+            update_fields = {*update_fields, "email_normalized"}
+        await super().save(
+            using_db=using_db,
+            update_fields=update_fields,
+            force_create=force_create,
+            force_update=force_update,
+        )
+
+
+class LegacyRows:
+    """
+    Whether rows without email_normalized remain. New rows always have
+    it, so once the backfill is done the fallback queries stop.
+    """
+
+    def __init__(
+        self, enabled: bool = EMAIL_LOOKUP_FALLBACK, interval: float = 60.0
+    ) -> None:
+        self.enabled = enabled
+        self.interval = interval
+        self.reset()
+
+    def reset(self) -> None:
+        self._remain = True
+        self._checked_at: Optional[float] = None
+
+    async def remain(self) -> bool:
+        if not self.enabled:
+            return False
+        now = time.monotonic()
+        if self._remain and (
+            self._checked_at is None or now - self._checked_at >= self.interval
+        ):
+            self._checked_at = now
+            self._remain = await Users.filter(
+                email_normalized=None, email__isnull=False
+            ).exists()
+        return self._remain
+
+
+legacy_rows = LegacyRows()
+
 
 class UserFeedback(AbstractBaseModel):
     user = fields.ForeignKeyField(
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from library.schemas.campaign import CampaignIn, CampaignStatus
+from library.security.dependencies import require_scope
+from services.bcrypt_cost import cost_distribution
+from services.campaign import CampaignCheckpoint, launch_campaign
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_scope("admin"))],
+)
+
+
+@router.post(
+    "/campaigns/",
+    name="admin:start_campaign",
+    response_model=CampaignStatus,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def start_campaign(data: CampaignIn):
+    """Start or resume a bulk email campaign."""
+    checkpoint = CampaignCheckpoint(data.campaign_id)
+    progress = await checkpoint.load()
+    if progress.status == "completed":
+        return progress
+
+    # Another worker may be running it, so the guard lives in Redis.
+    if await launch_campaign(data) is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This campaign is already running.",
+        )
+    return progress
+
+
+@router.get(
+    "/campaigns/{campaign_id}/",
+    name="admin:campaign_status",
+    response_model=CampaignStatus,
+    status_code=status.HTTP_200_OK,
+)
+async def campaign_status(campaign_id: str):
+    """Get bulk email campaign progress."""
+    progress = await CampaignCheckpoint(campaign_id).load()
+    if progress.status == "new":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="This campaign does not exist.",
+        )
+    return progress
+
+
+@router.get(
+    "/password-hashes/",
+    name="admin:password_hash_costs",
+    status_code=status.HTTP_200_OK,
+)
+async def password_hash_costs():
+    """Report how many users have hashes at each bcrypt cost."""
+    return await cost_distribution()
@@ -1,12 +1,24 @@
 import re
 
-from fastapi import APIRouter, status, HTTPException, Body
-from jinja2 import Environment, FileSystemLoader
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Body,
+    Depends,
+    HTTPException,
+    status,
+)
 from pydantic import EmailStr
 
+from config import (
+    RATE_LIMIT_CONFIRM_PASSWORD_RESET,
+    RATE_LIMIT_LOGIN,
+    RATE_LIMIT_PASSWORD_RESET,
+)
 from library.security.jwt import jwt_manager
 from library.security.hash import hash_service
 from library.security.otp import otp_manager
+from library.security.ratelimit import rate_limit
 from models.user import Users
 from library.schemas.auth import (
     LoginSchema,
@@ -15,12 +27,13 @@ from library.schemas.auth import (
     ConfirmPasswordReset,
 )
 from library.schemas.shared import StatusResponse
-from library.utils.email import send_email
+from library.utils.responses import auth_response
+from library.utils.templates import template_service
+from services.bcrypt_cost import rehash_password
+from services.outbox import email_outbox
 
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
-file_loader = FileSystemLoader("./templates")
-env = Environment(loader=file_loader)
 
 
 @router.post(
@@ -28,15 +41,16 @@ env = Environment(loader=file_loader)
     name="auth:login",
     response_model=AuthResponse,
     status_code=status.HTTP_200_OK,
+    dependencies=[Depends(rate_limit("auth:login", RATE_LIMIT_LOGIN))],
 )
-async def login(data: LoginSchema):
+async def login(data: LoginSchema, background_tasks: BackgroundTasks):
     """Login user."""
     login_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Your email or password is incorrect.",
     )
 
-    user = await Users.get_or_none(email__iexact=data.email)
+    user = await Users.get_by_email(data.email)
     if not user:
         raise login_exception
 
@@ -52,9 +66,15 @@ async def login(data: LoginSchema):
             detail="Your account is unverified. Please verify to continue.",
         )
 
+    # Upgrade hashes made at an older cost once the response is sent.
+    if hash_service.needs_update(user.password_hash):
+        background_tasks.add_task(
+            rehash_password, user.id, data.password, user.password_hash
+        )
+
     data = TokenData(user_id=str(user.id), scopes=[user.user_class])
     access_token = await jwt_manager.create_access_token(token_data=data)
-    return AuthResponse(user=user, access_token=access_token)
+    return auth_response(user, access_token)
 
 
 @router.post(
@@ -62,21 +82,31 @@ async def login(data: LoginSchema):
     name="auth:request_password_reset",
     response_model=StatusResponse,
     status_code=status.HTTP_200_OK,
+    dependencies=[
+        Depends(
+            rate_limit(
+                "auth:request_password_reset", RATE_LIMIT_PASSWORD_RESET
+            )
+        )
+    ],
 )
 async def request_reset(email: EmailStr = Body(..., embed=True)):
     """Request password reset."""
-    user = await Users.get_or_none(email__iexact=email)
+    user = await Users.get_by_email(email)
     if not user:
         return StatusResponse(
             message="We will send you an email if you have an account with us."
         )
 
     # Send OTP.
-    otp = otp_manager.create_otp(user_id=str(user.id))
+    otp = await otp_manager.create_otp(
+        user_id=str(user.id), purpose="reset"
+    )
 
-    template = env.get_template("password_reset.html")
-    html = template.render(otp=otp, first_name=user.first_name)
-    await send_email(
+    html = await template_service.render(
+        "password_reset.html", otp=otp, first_name=user.first_name
+    )
+    await email_outbox.enqueue(
         to_address=[user.email],
         subject="Password Reset Notification",
         body=html,
@@ -92,13 +122,27 @@ async def request_reset(email: EmailStr = Body(..., embed=True)):
     name="auth:confirm_password_reset",
     response_model=AuthResponse,
     status_code=status.HTTP_200_OK,
+    dependencies=[
+        Depends(
+            rate_limit(
+                "auth:confirm_password_reset",
+                RATE_LIMIT_CONFIRM_PASSWORD_RESET,
+            )
+        )
+    ],
 )
 async def confirm_password_reset(data: ConfirmPasswordReset):
     """Confirm password reset."""
 
-    # Validate otp.
-    user_id = otp_manager.validate_user_otp(otp=data.otp)
-    if not user_id:
+    # Validate otp. Deprecated: older clients send the code alone.
+    if data.email is None:
+        user_id = await otp_manager.find_user(data.otp, purpose="reset")
+        user = await Users.get_or_none(id=user_id) if user_id else None
+    else:
+        user = await Users.get_by_email(data.email)
+    if not user or not await otp_manager.validate_user_otp(
+        user_id=str(user.id), otp=data.otp, purpose="reset"
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Your token is either expired or invalid.",
@@ -112,13 +156,22 @@ async def confirm_password_reset(data: ConfirmPasswordReset):
             detail="Your password should contain atleast 1 uppercase, 1 lowercase, 1 digit, and 1 special character.",  # noqa
         )
 
-    user = await Users.get(id=user_id)
-    user.password_hash = await hash_service.get_hash(string=data.new_password)
-    user.is_verified = True
-    await user.save()
+    user = await Users.update_returning(
+        user.id,
+        password_hash=await hash_service.get_hash(string=data.new_password),
+        is_verified=True,
+    )
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="This user does not exist.",
+        )
+
+    # Codes sent before the reset are no longer needed.
+    await otp_manager.invalidate_user(user_id=str(user.id))
 
     # Create access_token.
     data = TokenData(user_id=str(user.id), scopes=[user.user_class])
     access_token = await jwt_manager.create_access_token(token_data=data)
 
-    return AuthResponse(user=user, access_token=access_token)
+    return auth_response(user, access_token)
@@ -0,0 +1,70 @@
+import os
+
+from fastapi import APIRouter, Depends, status
+
+from database.pool import pool_metrics
+from database.router import replica_set
+from library.security.dependencies import require_scope
+from library.utils.memory import process_memory
+from library.utils.profiler import startup_profiler
+from library.utils.tracing import tracer
+
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+# Only the startup probe is public, the rest describe the deployment.
+admin_only = [Depends(require_scope("admin"))]
+
+
+@router.get(
+    "/startup/",
+    name="health:startup",
+    status_code=status.HTTP_200_OK,
+)
+async def startup_timing():
+    """Report how long each startup phase took."""
+    return startup_profiler.report()
+
+
+@router.get(
+    "/db-pool/",
+    name="health:db_pool",
+    status_code=status.HTTP_200_OK,
+    dependencies=admin_only,
+)
+async def db_pool():
+    """Report database pool usage and acquire waits."""
+    return {name: metrics.snapshot() for name, metrics in pool_metrics.items()}
+
+
+@router.get(
+    "/replicas/",
+    name="health:replicas",
+    status_code=status.HTTP_200_OK,
+    dependencies=admin_only,
+)
+async def replicas():
+    """Report replica lag and which replicas serve reads."""
+    return replica_set.snapshot()
+
+
+@router.get(
+    "/tracing/",
+    name="health:tracing",
+    status_code=status.HTTP_200_OK,
+    dependencies=admin_only,
+)
+async def tracing():
+    """Report trace sampling decisions and tracing overhead."""
+    return tracer.snapshot()
+
+
+@router.get(
+    "/memory/",
+    name="health:memory",
+    status_code=status.HTTP_200_OK,
+    dependencies=admin_only,
+)
+async def memory():
+    """Report the memory of the worker serving the request."""
+    return {"pid": os.getpid(), **process_memory(os.getpid())}
@@ -1,23 +1,25 @@
 import re
+from typing import Optional
 
-from fastapi import APIRouter, status, HTTPException, Body
-from jinja2 import Environment, FileSystemLoader
+from fastapi import APIRouter, status, HTTPException, Body, Depends
 from pydantic import EmailStr
 
+from config import RATE_LIMIT_RESEND_VERIFICATION, RATE_LIMIT_VERIFY_ACCOUNT
 from library.schemas.shared import UserPublic, StatusResponse
 from library.schemas.register import RegisterIn
 from library.security.otp import otp_manager
+from library.security.ratelimit import rate_limit
 from library.security.jwt import jwt_manager
 from library.security.hash import hash_service
 from models.user import Users
-from library.utils.email import send_email
+from library.utils.responses import auth_response, user_response
+from library.utils.templates import template_service
+from services.outbox import email_outbox
 from library.schemas.auth import AuthResponse
 from library.schemas.auth import TokenData
 
 
 router = APIRouter(prefix="/register", tags=["Register"])
-file_loader = FileSystemLoader("./templates")
-env = Environment(loader=file_loader)
 
 
 @router.post(
@@ -37,35 +39,35 @@ async def register(data: RegisterIn):
             detail="Your password should contain atleast 1 uppercase, 1 lowercase, 1 digit, and 1 special character.",  # noqa
         )
 
-    # Confirm that user does not exist.
-    user_exists = await Users.filter(email__iexact=data.email).exists()
-    if user_exists:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="This user already exists. Please login instead.",
-        )
-
-    # Create account.
-    user = await Users.create(
+    # Create account, unless the email is already taken.
+    user = await Users.create_unique(
         email=data.email,
         first_name=data.first_name,
         last_name=data.last_name,
         password_hash=await hash_service.get_hash(string=data.password),
     )
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This user already exists. Please login instead.",
+        )
 
     # Send OTP.
-    otp = otp_manager.create_otp(user_id=str(user.id))
+    otp = await otp_manager.create_otp(
+        user_id=str(user.id), purpose="verify"
+    )
 
-    template = env.get_template("email_verification.html")
-    html = template.render(otp=otp, first_name=data.first_name)
-    await send_email(
+    html = await template_service.render(
+        "email_verification.html", otp=otp, first_name=data.first_name
+    )
+    await email_outbox.enqueue(
         to_address=[data.email],
         subject="Verify Your Account",
         body=html,
         name=user.first_name,
     )
 
-    return user
+    return user_response(user, status_code=status.HTTP_201_CREATED)
 
 
 @router.post(
@@ -73,11 +75,19 @@ async def register(data: RegisterIn):
     name="register:resend_verification_link",
     response_model=StatusResponse,
     status_code=status.HTTP_200_OK,
+    dependencies=[
+        Depends(
+            rate_limit(
+                "register:resend_verification_link",
+                RATE_LIMIT_RESEND_VERIFICATION,
+            )
+        )
+    ],
 )
 async def resend_verification(email: EmailStr = Body(..., embed=True)):
     """Resend account verification link."""
     # Confirm that user does not exist.
-    user = await Users.get_or_none(email__iexact=email)
+    user = await Users.get_by_email(email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -90,11 +100,14 @@ async def resend_verification(email: EmailStr = Body(..., embed=True)):
         )
 
     # Send OTP.
-    otp = otp_manager.create_otp(user_id=str(user.id))
+    otp = await otp_manager.create_otp(
+        user_id=str(user.id), purpose="verify"
+    )
 
-    template = env.get_template("email_verification.html")
-    html = template.render(otp=otp, first_name=user.first_name)
-    await send_email(
+    html = await template_service.render(
+        "email_verification.html", otp=otp, first_name=user.first_name
+    )
+    await email_outbox.enqueue(
         to_address=[email],
         subject="Verify Account",
         body=html,
@@ -109,22 +122,38 @@ async def resend_verification(email: EmailStr = Body(..., embed=True)):
     name="register:verify_account",
     response_model=AuthResponse,
     status_code=status.HTTP_200_OK,
+    dependencies=[
+        Depends(
+            rate_limit("register:verify_account", RATE_LIMIT_VERIFY_ACCOUNT)
+        )
+    ],
 )
-async def verify_verification(otp: str = Body(..., embed=True)):
+async def verify_verification(
+    email: Optional[EmailStr] = Body(None), otp: str = Body(...)
+):
     """Verify account."""
-    # Validate token.
-    user_id = otp_manager.validate_user_otp(otp=otp)
-    if not user_id:
+    # Validate token. Deprecated: older clients send the code alone.
+    if email is None:
+        user_id = await otp_manager.find_user(otp, purpose="verify")
+        user = await Users.get_or_none(id=user_id) if user_id else None
+    else:
+        user = await Users.get_by_email(email)
+    if not user or not await otp_manager.validate_user_otp(
+        user_id=str(user.id), otp=otp, purpose="verify"
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Your token is either expired or invalid.",
         )
-    user = await Users.get(id=user_id)
-    user.is_verified = True
-    await user.save()
+    user = await Users.update_returning(user.id, is_verified=True)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="This user does not exist.",
+        )
 
     # Create access_token.
     data = TokenData(user_id=str(user.id), scopes=[user.user_class])
     access_token = await jwt_manager.create_access_token(token_data=data)
 
-    return AuthResponse(user=user, access_token=access_token)
+    return auth_response(user, access_token)
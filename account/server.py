@@ -1,11 +1,18 @@
-import sentry_sdk
+from library.utils.profiler import startup_profiler
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 import services.tasks as tasks
+from database.database import add_exception_handlers
+from library.utils.metrics import MetricsMiddleware, metrics_response
+from library.utils.tracing import TracingMiddleware
 from routers.register import router as register_router
 from routers.auth import router as auth_router
-from library.utils.parameters import get_ssm_parameters
+from routers.admin import router as admin_router
+from routers.health import router as health_router
+from services.resources import DrainMiddleware
+
+startup_profiler.record_imports()
 
 
 def get_application():
@@ -19,24 +26,29 @@ def get_application():
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # Metrics wraps tracing, so request latency includes its overhead.
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    # Outermost, so shutdown waits for whole requests.
+    app.add_middleware(DrainMiddleware)
 
     app.add_event_handler("startup", tasks.create_start_app_handler(app))
+    app.add_event_handler("shutdown", tasks.create_stop_app_handler(app))
+    add_exception_handlers(app)
     app.include_router(register_router)
     app.include_router(auth_router)
+    app.include_router(admin_router)
+    app.include_router(health_router)
 
-    parameters = get_ssm_parameters()
+    @app.get("/", name="root")
+    async def home():
+        return {"status": "Hello world"}
 
-    sentry_sdk.init(
-        dsn=parameters["sentry_accounts"],
-        traces_sample_rate=1.0,
-    )
+    @app.get("/metrics", name="metrics", include_in_schema=False)
+    async def metrics():
+        return metrics_response()
 
     return app
 
 
 app = get_application()
-
-
-@app.get("/", name="root")
-async def home():
-    return {"status": "Hello world"}
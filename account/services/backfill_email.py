@@ -0,0 +1,159 @@
+"""
+This module backfills `users.email_normalized` for existing rows.
+
+Rows are processed in small keyset-paginated batches with a pause in
+between, so the backfill can run against a live database. Addresses
+that differ only by case cannot share the unique normalized value; the
+oldest such row gets it and the rest are reported for manual review.
+Batches follow the random uuid order, so those duplicates are found in
+one pass over the table before the first batch.
+
+The unique index on the column is built first, without locking writes
+to the table. Once the backfill has finished, set
+EMAIL_LOOKUP_FALLBACK=false so lookups stop falling back to `email`.
+
+    python -m services.backfill_email --batch-size 1000 --sleep 0.1
+"""
+import asyncio
+import logging
+from typing import List, Optional
+
+from tortoise import Tortoise, connections
+from tortoise.exceptions import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+SELECT_BATCH = """
+SELECT "id" FROM "users"
+WHERE "id" > $1 AND "email_normalized" IS NULL AND "email" IS NOT NULL
+ORDER BY "id"
+LIMIT $2
+"""
+
+# Every row but the oldest for each address, as get_legacy_by_email
+# picks it.
+SELECT_DUPLICATES = """
+SELECT unnest(d."ids"[2:]) AS "id" FROM (
+    SELECT array_agg("id" ORDER BY "created_at", "id") AS "ids"
+    FROM "users"
+    WHERE "email" IS NOT NULL
+    GROUP BY lower(trim("email"))
+    HAVING count(*) > 1
+) AS d
+"""
+
+UPDATE_BATCH = """
+WITH candidates AS (
+    SELECT DISTINCT ON (lower(trim("email")))
+        "id", lower(trim("email")) AS normalized
+    FROM "users"
+    WHERE "id" = ANY($1::uuid[])
+    ORDER BY lower(trim("email")), "created_at", "id"
+)
+UPDATE "users" AS u
+SET "email_normalized" = c.normalized
+FROM candidates AS c
+WHERE u."id" = c."id"
+  AND NOT EXISTS (
+      SELECT 1 FROM "users" AS x WHERE x."email_normalized" = c.normalized
+  )
+RETURNING u."id"
+"""
+
+FIRST_ID = "00000000-0000-0000-0000-000000000000"
+
+# Same name as the constraint Tortoise creates with the table.
+CREATE_INDEX = """
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "users_email_normalized_key"
+ON "users" ("email_normalized")
+"""
+
+# A failed concurrent build leaves an invalid index behind.
+INVALID_INDEX = """
+SELECT 1 FROM "pg_index" i JOIN "pg_class" c ON c."oid" = i."indexrelid"
+WHERE c."relname" = 'users_email_normalized_key' AND NOT i."indisvalid"
+"""
+
+
+async def create_index() -> None:
+    """Build the unique index on email_normalized without locking writes."""
+    db = connections.get("default")
+    _, invalid = await db.execute_query(INVALID_INDEX)
+    if invalid:
+        await db.execute_script(
+            'DROP INDEX CONCURRENTLY "users_email_normalized_key"'
+        )
+    await db.execute_script(CREATE_INDEX)
+
+
+async def backfill(
+    batch_size: int = 1000, sleep: float = 0.1, retries: int = 3
+) -> dict:
+    """Fill email_normalized for every row that is missing it."""
+    db = connections.get("default")
+    after = FIRST_ID
+    stats = {"batches": 0, "updated": 0, "skipped": 0}
+    skipped: List[str] = []
+    _, rows = await db.execute_query(SELECT_DUPLICATES)
+    duplicates = {str(row["id"]) for row in rows}
+
+    while True:
+        _, rows = await db.execute_query(SELECT_BATCH, [after, batch_size])
+        ids = [str(row["id"]) for row in rows]
+        if not ids:
+            break
+
+        eligible = [i for i in ids if i not in duplicates]
+        updated = []
+        for attempt in range(retries):
+            if not eligible:
+                break
+            try:
+                _, updated = await db.execute_query(UPDATE_BATCH, [eligible])
+                break
+            except IntegrityError:
+                # A signup claimed one of these addresses mid-batch.
+                if attempt == retries - 1:
+                    raise
+        updated_ids = {str(row["id"]) for row in updated}
+        skipped.extend(i for i in ids if i not in updated_ids)
+
+        stats["batches"] += 1
+        stats["updated"] += len(updated_ids)
+        stats["skipped"] = len(skipped)
+        after = ids[-1]
+        logger.warning("Backfill progress: %s", stats)
+        await asyncio.sleep(sleep)
+
+    if skipped:
+        logger.warning(
+            "Rows left without email_normalized (duplicate addresses): %s",
+            ", ".join(skipped),
+        )
+    return stats
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+
+    from database.database import TORTOISE_ORM
+
+    parser = argparse.ArgumentParser(
+        description="Backfill users.email_normalized."
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--sleep", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        await create_index()
+        stats = await backfill(batch_size=args.batch_size, sleep=args.sleep)
+        logger.warning("Backfill finished: %s", stats)
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""
+This module handles the bcrypt work factor.
+
+`calibrate` times `verify` on this host at increasing costs and picks
+the highest one within the latency budget. Logins rehash passwords
+stored at a lower cost, and `cost_distribution` shows how far that
+upgrade has got.
+
+    python -m services.bcrypt_cost calibrate --budget-ms 250
+    python -m services.bcrypt_cost report
+"""
+import asyncio
+import logging
+import statistics
+import time
+from typing import Dict, Optional
+
+from passlib.context import CryptContext
+
+from config import BCRYPT_ROUNDS, BCRYPT_LATENCY_BUDGET_MS
+from library.security.hash import hash_service
+from models.user import Users
+
+logger = logging.getLogger(__name__)
+
+# Never recommend less than this, whatever the hardware.
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+PROBE_PASSWORD = "calibration-Password1!"
+
+COST_QUERY = r"""
+SELECT
+    CASE WHEN "password_hash" ~ '^\$2[abxy]?\$[0-9]{{2}}\$'
+        THEN substring("password_hash" from '^\$2[abxy]?\$([0-9]{{2}})\$')
+        ELSE 'other'
+    END AS "cost",
+    count(*) AS "users"
+FROM "{table}"
+WHERE "password_hash" IS NOT NULL
+GROUP BY 1
+ORDER BY 1
+"""
+
+
+def calibrate(
+    budget_ms: float = BCRYPT_LATENCY_BUDGET_MS,
+    min_rounds: int = MIN_ROUNDS,
+    max_rounds: int = MAX_ROUNDS,
+    samples: int = 5,
+) -> Dict:
+    """Pick the highest cost whose median verify fits the budget."""
+    timings = {}
+    for rounds in range(min_rounds, max_rounds + 1):
+        context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+        hashed = context.hash(PROBE_PASSWORD)
+        durations = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            context.verify(PROBE_PASSWORD, hashed)
+            durations.append(time.perf_counter() - started)
+        timings[rounds] = statistics.median(durations) * 1000
+        # Each extra round doubles the cost, so stop once over budget.
+        if timings[rounds] > budget_ms:
+            break
+
+    fitting = [r for r, ms in timings.items() if ms <= budget_ms]
+    return {
+        "budget_ms": budget_ms,
+        "current_rounds": BCRYPT_ROUNDS,
+        "recommended_rounds": max(fitting, default=min_rounds),
+        "verify_ms": {r: round(ms, 2) for r, ms in timings.items()},
+    }
+
+
+async def rehash_password(user_id, password: str, old_hash: str) -> bool:
+    """Store the password at the current cost, unless it has changed."""
+    new_hash = await hash_service.get_hash(string=password)
+    updated = await Users.replace_password_hash(user_id, old_hash, new_hash)
+    if updated:
+        logger.info("Upgraded password hash for user %s", user_id)
+    return updated
+
+
+async def cost_distribution() -> Dict:
+    """Count users by the bcrypt cost of their stored hash."""
+    db = Users._choose_db()
+    rows = await db.execute_query_dict(
+        COST_QUERY.format(table=Users._meta.db_table)
+    )
+    costs = {row["cost"]: row["users"] for row in rows}
+    below = sum(
+        count
+        for cost, count in costs.items()
+        if cost.isdigit() and int(cost) < BCRYPT_ROUNDS
+    )
+    return {
+        "target_rounds": BCRYPT_ROUNDS,
+        "total": sum(costs.values()),
+        "below_target": below,
+        "costs": costs,
+    }
+
+
+async def _report() -> Dict:
+    from tortoise import Tortoise
+
+    from database.database import TORTOISE_ORM
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        return await cost_distribution()
+    finally:
+        await Tortoise.close_connections()
+
+
+def main(argv: Optional[list] = None) -> None:
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Tune the bcrypt cost.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    calibrate_parser = commands.add_parser("calibrate")
+    calibrate_parser.add_argument(
+        "--budget-ms", type=float, default=BCRYPT_LATENCY_BUDGET_MS
+    )
+    calibrate_parser.add_argument("--samples", type=int, default=5)
+    commands.add_parser("report")
+    args = parser.parse_args(argv)
+
+    if args.command == "calibrate":
+        result = calibrate(budget_ms=args.budget_ms, samples=args.samples)
+        print(json.dumps(result, indent=2))
+        print(f"BCRYPT_ROUNDS={result['recommended_rounds']}")
+    else:
+        print(json.dumps(asyncio.run(_report()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""
+This module handles bulk email campaigns.
+
+A campaign streams the users table in keyset-paginated chunks and
+sends each chunk as one multi-recipient provider request. The body is
+rendered once per campaign; per-user fields such as `first_name` are
+left as provider merge tags and filled from each recipient's
+`merge_info`. Progress is checkpointed in Redis after every batch, so
+rerunning an interrupted campaign resumes after the last sent user.
+A Redis lock per campaign keeps two processes, e.g. two gunicorn
+workers, from sending the same campaign at once.
+
+Run from the command line with:
+
+    python -m services.campaign --campaign-id terms-2026 \
+        --template campaigns/notice.html --subject "Terms update" \
+        --context title="Terms update" --context message="..."
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from config import REDIS_OUTBOX_DB
+from database.redis import get_redis
+from library.schemas.campaign import CampaignIn, CampaignStatus
+from library.utils.email import send_batch_email
+from library.utils.templates import template_service
+from models.user import Users
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY = "campaign:{}"
+LOCK_KEY = "campaign-lock:{}"
+LOCK_TTL_MS = 60000
+MERGE_FIELDS = ("first_name", "last_name")
+SEND_ATTEMPTS = 3
+
+# Campaigns started through the admin API, run inside the app process.
+running_campaigns: Dict[str, asyncio.Task] = {}
+
+# Extend or release the lock only while this process still holds it.
+REFRESH_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RateLimiter:
+    """Token bucket that paces sends to `rate` emails per second."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate,
+                )
+                self.updated = now
+                # A batch larger than the bucket waits for a full bucket.
+                needed = min(tokens, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+
+
+class CampaignCheckpoint:
+    """Persist campaign progress in Redis."""
+
+    def __init__(self, campaign_id: str, db: int = REDIS_OUTBOX_DB) -> None:
+        self.campaign_id = campaign_id
+        self.key = CHECKPOINT_KEY.format(campaign_id)
+        self.db = db
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        return get_redis(self.db)
+
+    async def load(self) -> CampaignStatus:
+        data = await self.redis.hgetall(self.key)
+        if not data:
+            return CampaignStatus(campaign_id=self.campaign_id, status="new")
+        return CampaignStatus(campaign_id=self.campaign_id, **data)
+
+    async def save(self, **fields) -> None:
+        fields["updated_at"] = time.time()
+        await self.redis.hset(
+            self.key,
+            mapping={k: v for k, v in fields.items() if v is not None},
+        )
+
+    async def advance(self, last_id: str, sent: int, failed: int) -> None:
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(
+            self.key, mapping={"last_id": last_id, "updated_at": time.time()}
+        )
+        pipe.hincrby(self.key, "sent", sent)
+        pipe.hincrby(self.key, "failed", failed)
+        pipe.hincrby(self.key, "batches", 1)
+        await pipe.execute()
+
+
+class CampaignLock:
+    """Let one process at a time run a campaign."""
+
+    def __init__(
+        self,
+        campaign_id: str,
+        db: int = REDIS_OUTBOX_DB,
+        ttl_ms: int = LOCK_TTL_MS,
+    ) -> None:
+        self.campaign_id = campaign_id
+        self.key = LOCK_KEY.format(campaign_id)
+        self.db = db
+        self.ttl_ms = ttl_ms
+        self.token = uuid.uuid4().hex
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        return get_redis(self.db)
+
+    async def acquire(self) -> bool:
+        return bool(
+            await self.redis.set(self.key, self.token, px=self.ttl_ms, nx=True)
+        )
+
+    async def refresh(self) -> bool:
+        return bool(
+            await self.redis.eval(
+                REFRESH_LOCK, 1, self.key, self.token, self.ttl_ms
+            )
+        )
+
+    async def release(self) -> None:
+        try:
+            await self.redis.eval(RELEASE_LOCK, 1, self.key, self.token)
+        except RedisError as e:
+            # It expires on its own.
+            logger.warning("Could not release %s: %r", self.key, e)
+
+    async def keep_alive(self, task: asyncio.Task) -> None:
+        """Refresh the lock, cancelling `task` if another process took it."""
+        while True:
+            await asyncio.sleep(self.ttl_ms / 3000)
+            try:
+                held = await self.refresh()
+            except RedisError as e:
+                logger.warning("Could not refresh %s: %r", self.key, e)
+                continue
+            if not held:
+                logger.error(
+                    "Campaign %s lost its lock, stopping.", self.campaign_id
+                )
+                task.cancel()
+                return
+
+
+class CampaignRunner:
+    """Send a templated email to every user."""
+
+    def __init__(self, campaign: CampaignIn) -> None:
+        self.campaign = campaign
+        self.checkpoint = CampaignCheckpoint(campaign.campaign_id)
+        self.limiter = RateLimiter(campaign.rate_limit)
+        self._slots = asyncio.Semaphore(campaign.concurrency)
+
+    async def render(self) -> str:
+        """Render the campaign body, leaving merge tags for the provider."""
+        merge_tags = {field: "{{%s}}" % field for field in MERGE_FIELDS}
+        return await template_service.render(
+            self.campaign.template, **{**self.campaign.context, **merge_tags}
+        )
+
+    async def stream_users(self, after: Optional[str]):
+        """Yield users in id order, one page at a time."""
+        while True:
+            query = Users.filter(deleted=False, email__isnull=False)
+            if after:
+                query = query.filter(id__gt=after)
+            page = (
+                await query.order_by("id")
+                .limit(self.campaign.batch_size)
+                .values("id", *MERGE_FIELDS, "email")
+            )
+            if not page:
+                return
+            after = str(page[-1]["id"])
+            yield page
+
+    async def send(self, body: str, page: List[Dict]) -> int:
+        """Send one page and return the number of failed recipients."""
+        recipients = [
+            {
+                "address": user["email"],
+                "name": user["first_name"],
+                "merge_info": {f: user[f] or "" for f in MERGE_FIELDS},
+            }
+            for user in page
+        ]
+        async with self._slots:
+            for attempt in range(1, SEND_ATTEMPTS + 1):
+                await self.limiter.acquire(len(recipients))
+                result = await send_batch_email(
+                    recipients=recipients,
+                    subject=self.campaign.subject,
+                    body=body,
+                )
+                if result.ok:
+                    return 0
+                logger.warning(
+                    "Campaign %s batch failed (attempt %d): %s",
+                    self.campaign.campaign_id,
+                    attempt,
+                    result.message,
+                )
+                if attempt < SEND_ATTEMPTS:
+                    await asyncio.sleep(2**attempt)
+        return len(recipients)
+
+    async def run(self) -> CampaignStatus:
+        """Run or resume the campaign until every user is sent."""
+        progress = await self.checkpoint.load()
+        if progress.status == "completed":
+            return progress
+
+        body = await self.render()
+        await self.checkpoint.save(
+            status="running",
+            template=self.campaign.template,
+            subject=self.campaign.subject,
+            started_at=progress.started_at or time.time(),
+            error="",
+        )
+
+        # Checkpoints only advance in page order, so a resumed run never
+        # skips a page that was still in flight when it stopped.
+        in_flight = deque()
+        try:
+            async for page in self.stream_users(after=progress.last_id):
+                task = asyncio.create_task(self.send(body, page))
+                in_flight.append((task, str(page[-1]["id"]), len(page)))
+                while len(in_flight) >= self.campaign.concurrency:
+                    await self._settle(in_flight.popleft())
+            while in_flight:
+                await self._settle(in_flight.popleft())
+        except BaseException as e:
+            for task, _, _ in in_flight:
+                task.cancel()
+            await self.checkpoint.save(status="interrupted", error=repr(e))
+            raise
+
+        await self.checkpoint.save(status="completed")
+        return await self.checkpoint.load()
+
+    async def _settle(self, item: tuple) -> None:
+        task, last_id, size = item
+        failed = await task
+        await self.checkpoint.advance(
+            last_id=last_id, sent=size - failed, failed=failed
+        )
+
+
+async def run_locked(
+    campaign: CampaignIn, lock: CampaignLock
+) -> CampaignStatus:
+    """Run a campaign whose lock is held, releasing it when done."""
+    keeper = asyncio.create_task(lock.keep_alive(asyncio.current_task()))
+    try:
+        return await CampaignRunner(campaign).run()
+    finally:
+        keeper.cancel()
+        await asyncio.gather(keeper, return_exceptions=True)
+        await lock.release()
+
+
+async def _run_campaign(campaign: CampaignIn, lock: CampaignLock) -> None:
+    try:
+        await run_locked(campaign, lock)
+    except Exception:
+        logger.exception("Campaign %s failed", campaign.campaign_id)
+    finally:
+        running_campaigns.pop(campaign.campaign_id, None)
+
+
+async def launch_campaign(campaign: CampaignIn) -> Optional[asyncio.Task]:
+    """
+    Run a campaign in the background of the app process. Returns None
+    if a process, this one or another, is already running it.
+    """
+    lock = CampaignLock(campaign.campaign_id)
+    if not await lock.acquire():
+        return None
+    task = asyncio.create_task(_run_campaign(campaign, lock))
+    running_campaigns[campaign.campaign_id] = task
+    return task
+
+
+async def stop_campaigns() -> None:
+    """
+    Cancel running campaigns. Each one checkpoints itself as interrupted
+    and resumes after its last sent page when started again.
+    """
+    tasks = list(running_campaigns.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+
+    from tortoise import Tortoise
+
+    from database.database import TORTOISE_ORM
+    from database.redis import close_redis
+    from library.utils.email import email_transport
+    from library.utils.parameters import parameter_store
+
+    parser = argparse.ArgumentParser(description="Run an email campaign.")
+    parser.add_argument("--campaign-id", required=True)
+    parser.add_argument("--template", required=True)
+    parser.add_argument("--subject", required=True)
+    parser.add_argument(
+        "--context",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Template variable, may be repeated.",
+    )
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--concurrency", type=int)
+    parser.add_argument("--rate-limit", type=float)
+    args = parser.parse_args(argv)
+
+    options = {
+        "campaign_id": args.campaign_id,
+        "template": args.template,
+        "subject": args.subject,
+        "context": dict(item.split("=", 1) for item in args.context),
+        "batch_size": args.batch_size,
+        "concurrency": args.concurrency,
+        "rate_limit": args.rate_limit,
+    }
+    campaign = CampaignIn(
+        **{k: v for k, v in options.items() if v is not None}
+    )
+
+    await parameter_store.start()
+    await Tortoise.init(config=TORTOISE_ORM)
+    await email_transport.start()
+    try:
+        lock = CampaignLock(campaign.campaign_id)
+        if not await lock.acquire():
+            logger.error("Campaign %s is already running.", args.campaign_id)
+            return
+        status = await run_locked(campaign, lock)
+        logger.warning("Campaign finished: %s", status.dict())
+    finally:
+        await email_transport.close()
+        await close_redis()
+        await Tortoise.close_connections()
+        await parameter_store.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
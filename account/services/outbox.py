@@ -0,0 +1,404 @@
+"""
+This module handles the background email outbox.
+
+Request handlers enqueue emails onto a Redis stream and return right
+away. A separate worker process (`python -m services.outbox`) consumes
+the stream, retries failed deliveries with exponential backoff and
+moves jobs that keep failing to a dead-letter stream.
+"""
+import asyncio
+import json
+import logging
+import random
+import socket
+import time
+import uuid
+from typing import List, Optional
+
+from redis import asyncio as aioredis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import ResponseError
+
+from config import (
+    REDIS_OUTBOX_DB,
+    OUTBOX_CONCURRENCY,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_BACKOFF_BASE,
+    OUTBOX_BACKOFF_MAX,
+    OUTBOX_MAXLEN,
+    OUTBOX_DEAD_MAXLEN,
+)
+from database.redis import get_redis
+from library.utils.email import send_email
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "email:outbox"
+GROUP_NAME = "email-workers"
+RETRY_KEY = "email:outbox:retry"
+DEAD_KEY = "email:outbox:dead"
+SENT_KEY = "email:outbox:sent:{}"
+LOCK_KEY = "email:outbox:lock:{}"
+
+SENT_TTL = 7 * 24 * 3600
+LOCK_TTL = 120
+CLAIM_IDLE_MS = 5 * 60 * 1000
+
+# Move due retries back onto the stream in one atomic step.
+PROMOTE_RETRIES = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1],
+                       'LIMIT', 0, ARGV[2])
+for _, raw in ipairs(due) do
+    local job = cjson.decode(raw)
+    local fields = {}
+    for key, value in pairs(job) do
+        table.insert(fields, key)
+        table.insert(fields, tostring(value))
+    end
+    redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], '*', unpack(fields))
+    redis.call('ZREM', KEYS[1], raw)
+end
+return #due
+"""
+
+
+def _entry_age(entry_id: Optional[str], now: float) -> float:
+    """Seconds since a stream entry id was created."""
+    if not entry_id:
+        return 0.0
+    created_ms = int(entry_id.split("-")[0])
+    return max(0.0, now - created_ms / 1000)
+
+
+class EmailOutbox:
+    """Enqueue emails and inspect the outbox."""
+
+    def __init__(
+        self,
+        db: int = REDIS_OUTBOX_DB,
+        maxlen: int = OUTBOX_MAXLEN,
+        dead_maxlen: int = OUTBOX_DEAD_MAXLEN,
+    ) -> None:
+        self.db = db
+        self.maxlen = maxlen
+        self.dead_maxlen = dead_maxlen
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        return get_redis(self.db)
+
+    async def enqueue(
+        self,
+        to_address: List[str],
+        subject: str,
+        body: str,
+        name: str,
+        job_id: Optional[str] = None,
+    ) -> str:
+        """Add an email job to the outbox and return its id."""
+        job_id = job_id or uuid.uuid4().hex
+        await self.redis.xadd(
+            STREAM_KEY,
+            {
+                "id": job_id,
+                "to": json.dumps(to_address),
+                "subject": subject,
+                "body": body,
+                "name": name or "",
+                "attempts": "0",
+                "enqueued_at": str(time.time()),
+            },
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+        return job_id
+
+    async def ensure_group(self) -> None:
+        """Create the consumer group if it does not exist yet."""
+        try:
+            await self.redis.xgroup_create(
+                STREAM_KEY, GROUP_NAME, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def lag(self) -> dict:
+        """Report how far behind the workers are."""
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xlen(STREAM_KEY)
+        pipe.xinfo_groups(STREAM_KEY)
+        pipe.xpending(STREAM_KEY, GROUP_NAME)
+        pipe.zcard(RETRY_KEY)
+        pipe.xlen(DEAD_KEY)
+        pipe.xrange(STREAM_KEY, count=1)
+        length, groups, pending, retrying, dead, oldest = await pipe.execute(
+            raise_on_error=False
+        )
+
+        group = {}
+        if isinstance(groups, list):
+            group = next(
+                (g for g in groups if g.get("name") == GROUP_NAME), {}
+            )
+        if not isinstance(pending, dict):
+            pending = {}
+        oldest_id = None
+        if isinstance(oldest, list) and oldest:
+            oldest_id = oldest[0][0]
+
+        return {
+            "stream_length": length if isinstance(length, int) else 0,
+            "undelivered": group.get("lag") or 0,
+            "pending": pending.get("pending", 0),
+            "oldest_pending_age": _entry_age(pending.get("min"), now),
+            "oldest_entry_age": _entry_age(oldest_id, now),
+            "retrying": retrying if isinstance(retrying, int) else 0,
+            "dead": dead if isinstance(dead, int) else 0,
+        }
+
+
+email_outbox = EmailOutbox()
+
+
+class OutboxWorker:
+    """Consume the outbox stream and deliver emails."""
+
+    def __init__(
+        self,
+        outbox: EmailOutbox = email_outbox,
+        concurrency: int = OUTBOX_CONCURRENCY,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        backoff_base: float = OUTBOX_BACKOFF_BASE,
+        backoff_max: float = OUTBOX_BACKOFF_MAX,
+        consumer: Optional[str] = None,
+    ) -> None:
+        self.outbox = outbox
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.consumer = consumer or f"{socket.gethostname()}-{uuid.uuid4()}"
+        self.delivered = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self.duplicates = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks: set = set()
+        self._stopping = asyncio.Event()
+        self._promote = None
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        return self.outbox.redis
+
+    def backoff(self, attempts: int) -> float:
+        """Exponential backoff with jitter for the given attempt."""
+        delay = min(self.backoff_max, self.backoff_base**attempts)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def promote_retries(self, limit: int = 100) -> int:
+        """Requeue retries whose backoff has elapsed."""
+        if self._promote is None:
+            self._promote = self.redis.register_script(PROMOTE_RETRIES)
+        return await self._promote(
+            keys=[RETRY_KEY, STREAM_KEY],
+            args=[time.time(), limit, self.outbox.maxlen],
+        )
+
+    async def _read(self, count: int, block: Optional[int]) -> list:
+        # Pick up jobs abandoned by crashed workers first.
+        claimed = await self.redis.xautoclaim(
+            STREAM_KEY,
+            GROUP_NAME,
+            self.consumer,
+            min_idle_time=CLAIM_IDLE_MS,
+            count=count,
+        )
+        entries = [entry for entry in claimed[1] if entry[1]]
+        if entries:
+            return entries
+
+        response = await self.redis.xreadgroup(
+            GROUP_NAME,
+            self.consumer,
+            streams={STREAM_KEY: ">"},
+            count=count,
+            block=block,
+        )
+        return response[0][1] if response else []
+
+    async def handle(self, entry_id: str, job: dict) -> None:
+        """Deliver one job and settle it on the stream."""
+        job_id = job["id"]
+        sent_key = SENT_KEY.format(job_id)
+        lock_key = LOCK_KEY.format(job_id)
+
+        # Skip jobs that were already delivered or are being delivered.
+        if await self.redis.exists(sent_key) or not await self.redis.set(
+            lock_key, self.consumer, nx=True, ex=LOCK_TTL
+        ):
+            self.duplicates += 1
+            await self._settle(entry_id)
+            return
+
+        try:
+            result = await send_email(
+                to_address=json.loads(job["to"]),
+                subject=job["subject"],
+                body=job["body"],
+                name=job.get("name", ""),
+            )
+            ok, error = result.ok, result.message
+        except Exception as e:
+            logger.exception("Email job %s crashed", job_id)
+            ok, error = False, str(e)
+
+        pipe = self.redis.pipeline(transaction=True)
+        if ok:
+            self.delivered += 1
+            pipe.set(sent_key, entry_id, ex=SENT_TTL)
+        else:
+            self.failed += 1
+            attempts = int(job.get("attempts", 0)) + 1
+            job = {**job, "attempts": str(attempts), "error": error or ""}
+            if attempts >= self.max_attempts:
+                self.dead_lettered += 1
+                logger.warning(
+                    "Email job %s dead-lettered after %d attempts: %s",
+                    job_id,
+                    attempts,
+                    error,
+                )
+                pipe.xadd(
+                    DEAD_KEY,
+                    job,
+                    maxlen=self.outbox.dead_maxlen,
+                    approximate=True,
+                )
+            else:
+                due = time.time() + self.backoff(attempts)
+                pipe.zadd(RETRY_KEY, {json.dumps(job, sort_keys=True): due})
+        pipe.delete(lock_key)
+        pipe.xack(STREAM_KEY, GROUP_NAME, entry_id)
+        pipe.xdel(STREAM_KEY, entry_id)
+        await pipe.execute()
+
+    async def _settle(self, entry_id: str) -> None:
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.xack(STREAM_KEY, GROUP_NAME, entry_id)
+        pipe.xdel(STREAM_KEY, entry_id)
+        await pipe.execute()
+
+    async def _run_job(self, entry_id: str, job: dict) -> None:
+        try:
+            await self.handle(entry_id, job)
+        finally:
+            self._slots.release()
+
+    async def poll(self, block: Optional[int] = None) -> int:
+        """Read and dispatch as many jobs as there are free slots."""
+        await self.promote_retries()
+
+        await self._slots.acquire()
+        free = 1
+        while free < self.concurrency and not self._slots.locked():
+            await self._slots.acquire()
+            free += 1
+
+        try:
+            entries = await self._read(count=free, block=block)
+        except BaseException:
+            for _ in range(free):
+                self._slots.release()
+            raise
+
+        for _ in range(free - len(entries)):
+            self._slots.release()
+        for entry_id, job in entries:
+            task = asyncio.create_task(self._run_job(entry_id, job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return len(entries)
+
+    async def drain(self) -> None:
+        """Wait for in-flight jobs to finish."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def run_once(self) -> int:
+        """Process whatever is ready right now and wait for it."""
+        await self.outbox.ensure_group()
+        handled = await self.poll()
+        await self.drain()
+        return handled
+
+    def metrics(self) -> dict:
+        return {
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dead_lettered": self.dead_lettered,
+            "duplicates": self.duplicates,
+            "in_flight": len(self._tasks),
+        }
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def run(self, report_every: float = 30.0) -> None:
+        """Consume the outbox until stopped."""
+        await self.outbox.ensure_group()
+        logger.warning("--- OUTBOX WORKER %s STARTED ---", self.consumer)
+        last_report = time.monotonic()
+        while not self._stopping.is_set():
+            try:
+                await self.poll(block=1000)
+                if time.monotonic() - last_report >= report_every:
+                    last_report = time.monotonic()
+                    lag = await self.outbox.lag()
+                    logger.warning(
+                        "Outbox lag=%s metrics=%s", lag, self.metrics()
+                    )
+            except (RedisConnectionError, OSError) as e:
+                logger.warning("Outbox worker lost redis: %r", e)
+                await asyncio.sleep(1)
+        await self.drain()
+
+
+async def main() -> None:
+    import signal
+
+    from database.redis import close_redis
+    from library.utils.email import email_transport
+    from library.utils.parameters import parameter_store
+    from services.resources import ResourceRegistry
+
+    worker = OutboxWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    resources = ResourceRegistry()
+    # Keeps the email credentials fresh off the event loop.
+    resources.register(
+        "config", start=parameter_store.start, stop=parameter_store.stop
+    )
+    resources.register("redis", stop=close_redis)
+    resources.register(
+        "email",
+        start=email_transport.start,
+        stop=email_transport.close,
+        after=["config"],
+    )
+    await resources.start()
+    try:
+        await worker.run()
+    finally:
+        # The worker drains its own jobs before returning.
+        await resources.stop(drain=False)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
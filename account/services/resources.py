@@ -0,0 +1,199 @@
+"""
+This module handles the resources the app opens and closes.
+
+Pools, clients and background tasks register how to start and stop and
+which other resources they need. On startup the registry starts them in
+dependency order. On shutdown it first waits for in-flight requests to
+finish, up to a deadline, then stops the resources in reverse order.
+Every stage is timed.
+"""
+import asyncio
+import inspect
+import logging
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import RESOURCE_STOP_TIMEOUT, SHUTDOWN_DRAIN_TIMEOUT
+from library.utils.profiler import StartupProfiler, startup_profiler
+
+logger = logging.getLogger(__name__)
+
+
+class Resource(NamedTuple):
+    name: str
+    start: Optional[Callable]
+    stop: Optional[Callable]
+    after: Sequence[str]
+
+
+async def _call(func: Optional[Callable], in_thread: bool = False) -> None:
+    if func is None:
+        return
+    if in_thread and not inspect.iscoroutinefunction(func):
+        # Only a thread lets wait_for give up on a blocking call.
+        await asyncio.to_thread(func)
+        return
+    result = func()
+    if inspect.isawaitable(result):
+        await result
+
+
+class RequestDrain:
+    """Count in-flight requests so shutdown can wait for them."""
+
+    def __init__(self, poll_interval: float = 0.05) -> None:
+        self.poll_interval = poll_interval
+        self.in_flight = 0
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for in-flight requests, False if the deadline passed."""
+        deadline = time.monotonic() + timeout
+        while self.in_flight:
+            if time.monotonic() >= deadline:
+                logger.warning(
+                    "%s requests still running after %.1fs, shutting down.",
+                    self.in_flight,
+                    timeout,
+                )
+                return False
+            await asyncio.sleep(self.poll_interval)
+        return True
+
+
+request_drain = RequestDrain()
+
+
+class DrainMiddleware:
+    """Track requests, including the background tasks they run."""
+
+    def __init__(self, app: ASGIApp, drain: RequestDrain = request_drain):
+        self.app = app
+        self.drain = drain
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        self.drain.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.drain.in_flight -= 1
+
+
+class ResourceRegistry:
+    """Start resources in dependency order and stop them in reverse."""
+
+    def __init__(
+        self,
+        drain: RequestDrain = request_drain,
+        profiler: StartupProfiler = startup_profiler,
+        drain_timeout: float = SHUTDOWN_DRAIN_TIMEOUT,
+        stop_timeout: float = RESOURCE_STOP_TIMEOUT,
+    ) -> None:
+        self.drain = drain
+        self.profiler = profiler
+        self.drain_timeout = drain_timeout
+        self.stop_timeout = stop_timeout
+        self.resources: Dict[str, Resource] = {}
+        self.shutdown: Dict[str, float] = {}
+        self._started: List[Resource] = []
+
+    def register(
+        self,
+        name: str,
+        start: Optional[Callable] = None,
+        stop: Optional[Callable] = None,
+        after: Sequence[str] = (),
+    ) -> None:
+        """Register a resource, started after the ones it needs."""
+        if name in self.resources:
+            raise ValueError(f"Resource already registered: {name}")
+        self.resources[name] = Resource(name, start, stop, tuple(after))
+
+    def order(self) -> List[Resource]:
+        """Resources in start order, otherwise in registration order."""
+        ordered: List[Resource] = []
+        done = set()
+        pending = list(self.resources.values())
+        while pending:
+            for resource in pending:
+                missing = [n for n in resource.after if n not in done]
+                unknown = [n for n in missing if n not in self.resources]
+                if unknown:
+                    raise ValueError(
+                        f"{resource.name} needs unknown resources: {unknown}"
+                    )
+                if not missing:
+                    break
+            else:
+                names = [resource.name for resource in pending]
+                raise ValueError(f"Circular resource dependencies: {names}")
+            pending.remove(resource)
+            ordered.append(resource)
+            done.add(resource.name)
+        return ordered
+
+    async def start(self) -> None:
+        """Start every resource, stopping the started ones on failure."""
+        for resource in self.order():
+            try:
+                if resource.start is not None:
+                    with self.profiler.phase(resource.name):
+                        await _call(resource.start)
+            except BaseException:
+                logger.exception("Could not start %s", resource.name)
+                await self.stop(drain=False)
+                raise
+            self._started.append(resource)
+        self.profiler.log()
+
+    async def _stop(self, resource: Resource) -> None:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                _call(resource.stop, in_thread=True), self.stop_timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Stopping %s took over %.1fs",
+                resource.name,
+                self.stop_timeout,
+            )
+        except Exception as e:
+            logger.warning("Could not stop %s: %r", resource.name, e)
+        finally:
+            self.shutdown[resource.name] = time.perf_counter() - started
+
+    async def stop(self, drain: bool = True) -> None:
+        """Drain requests, then stop resources in reverse start order."""
+        self.shutdown = {}
+        if drain:
+            started = time.perf_counter()
+            await self.drain.wait(self.drain_timeout)
+            self.shutdown["drain"] = time.perf_counter() - started
+
+        while self._started:
+            resource = self._started.pop()
+            if resource.stop is not None:
+                await self._stop(resource)
+        self.log()
+
+    def report(self) -> dict:
+        return {
+            "stages": {k: round(v, 6) for k, v in self.shutdown.items()},
+            "total": round(sum(self.shutdown.values()), 6),
+        }
+
+    def log(self) -> None:
+        report = self.report()
+        stages = " ".join(
+            f"{name}={seconds * 1000:.1f}ms"
+            for name, seconds in report["stages"].items()
+        )
+        logger.warning(
+            "--- SHUTDOWN %.1fms %s ---", report["total"] * 1000, stages
+        )
@@ -1,14 +1,82 @@
 """
-This module handles app startup tasks
+This module handles app startup and shutdown tasks
 """
-
 from typing import Callable
+
 from fastapi import FastAPI
-from database.database import init_db
+
+from config import REDIS_OTP_DB, SENTRY_DSN
+from database.database import init_db, close_db
+from database.redis import close_redis, get_redis, server_version
+from database.router import replica_set
+from library.security.hash import hash_engine
+from library.security.otp import MIN_REDIS_VERSION
+from library.utils.email import email_transport
+from library.utils.parameters import parameter_store
+from library.utils.templates import template_service
+from library.utils.tracing import tracer, traces_sampler
+from services.campaign import stop_campaigns
+from services.resources import ResourceRegistry
+
+
+def init_sentry() -> None:
+    """Initialise error tracking when a DSN is configured."""
+    dsn = SENTRY_DSN or parameter_store.get("sentry_accounts")
+    if not dsn:
+        return
+
+    import sentry_sdk
+
+    sentry_sdk.init(dsn=dsn, traces_sampler=traces_sampler)
+
+
+async def ping_redis() -> None:
+    """Open the first pooled redis connection and check the version."""
+    version = await server_version(get_redis(REDIS_OTP_DB))
+    if version < MIN_REDIS_VERSION:
+        required = ".".join(map(str, MIN_REDIS_VERSION))
+        found = ".".join(map(str, version))
+        raise RuntimeError(
+            f"OTP codes need Redis {required} or later, found {found}."
+        )
+
+
+resources = ResourceRegistry()
+resources.register(
+    "config", start=parameter_store.start, stop=parameter_store.stop
+)
+resources.register("sentry", start=init_sentry, after=["config"])
+resources.register(
+    "tracing", start=tracer.start, stop=tracer.stop, after=["sentry"]
+)
+resources.register("templates", start=template_service.precompile)
+resources.register("db_pool", start=init_db, stop=close_db, after=["config"])
+resources.register(
+    "replicas",
+    start=replica_set.start,
+    stop=replica_set.stop,
+    after=["db_pool"],
+)
+resources.register("redis", start=ping_redis, stop=close_redis)
+resources.register(
+    "email", start=email_transport.start, stop=email_transport.close
+)
+resources.register("hash_engine", stop=hash_engine.shutdown)
+# Stopped first, while the pools it checkpoints and sends through are open.
+resources.register(
+    "campaigns", stop=stop_campaigns, after=["db_pool", "redis", "email"]
+)
 
 
 def create_start_app_handler(app: FastAPI) -> Callable:
     async def start_app() -> None:
-        await init_db(app)
+        await resources.start()
 
     return start_app
+
+
+def create_stop_app_handler(app: FastAPI) -> Callable:
+    async def stop_app() -> None:
+        await resources.stop()
+
+    return stop_app
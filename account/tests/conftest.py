@@ -4,17 +4,19 @@ import logging
 import asyncio
 
 import pytest
+import httpx
 import redis
-import requests
 import pytest_asyncio
 from fastapi import FastAPI
 from asgi_lifespan import LifespanManager
 from httpx import AsyncClient
 
 from server import get_application
-from models.user import Users
+from models.user import Users, legacy_rows
+from library.schemas.auth import TokenData
 from library.security.hash import hash_service
-from library.utils import email  # noqa
+from library.security.jwt import jwt_manager
+from library.utils.email import email_transport
 
 
 logger = logging.getLogger(__name__)
@@ -71,6 +73,21 @@ async def test_user():
     )
 
 
+@pytest_asyncio.fixture()
+async def admin_headers(test_user):
+    """Authorization headers carrying the admin scope."""
+    token = await jwt_manager.create_access_token(
+        token_data=TokenData(user_id=str(test_user.id), scopes=["admin"])
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(autouse=True)
+def reset_legacy_rows():
+    """Let each test create rows that are not backfilled yet."""
+    legacy_rows.reset()
+
+
 @pytest.fixture(autouse=True)
 def clean_all_db():
     """Clean the whole redis db before each test class"""
@@ -78,17 +95,19 @@ def clean_all_db():
     r.flushall()
 
 
-class MockNameSearchResponse:
-    status_code = 200
-
-    @staticmethod
-    def json():
-        return {"message": "mocked"}
-
-
-@pytest.fixture()
-def mock_email_sending(monkeypatch):
-    def mock_post(*args, **kwargs):
-        return MockNameSearchResponse()
-
-    monkeypatch.setattr(requests, "post", mock_post)
+@pytest_asyncio.fixture()
+async def mock_email_sending(monkeypatch):
+    """Point the email transport at a local stub provider."""
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        return httpx.Response(
+            201, json={"message": "OK", "request_id": "mocked"}
+        )
+
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(handler)
+    ) as stub_client:
+        monkeypatch.setattr(email_transport, "_client", stub_client)
+        yield sent
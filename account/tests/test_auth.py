@@ -2,12 +2,16 @@ import pytest
 import redis
 from fastapi import FastAPI, status
 from httpx import AsyncClient
+from passlib.context import CryptContext
 
+from config import BCRYPT_ROUNDS, RATE_LIMIT_LOGIN
 from models.user import Users
 from library.security.jwt import jwt_manager
 from library.security.otp import otp_manager
+from library.security.ratelimit import parse_quotas
 from library.security.hash import hash_service
-from library.schemas.auth import AuthResponse
+from library.schemas.auth import AuthResponse, TokenData
+from services.bcrypt_cost import rehash_password
 
 
 pytestmark = pytest.mark.asyncio
@@ -59,6 +63,18 @@ class TestLogin:
         assert token_data.user_id == str(test_user.id)
         assert token_data.scopes[0] == test_user.user_class
 
+    async def test_login_email_is_case_insensitive(
+        self, app: FastAPI, client: AsyncClient, test_user: Users
+    ) -> None:
+        """Test Login."""
+        password = "passWord23&"
+
+        res = await client.post(
+            app.url_path_for("auth:login"),
+            json=dict(email=test_user.email.upper(), password=password),
+        )
+        assert res.status_code == status.HTTP_200_OK
+
     async def test_login_wrong_password(
         self, app: FastAPI, client: AsyncClient, test_user: Users
     ) -> None:
@@ -109,7 +125,7 @@ class TestRequestReset:
             res.json().get("message")
             == "We will send you an email if you have an account with us."
         )
-        data_keys = self.redis_db.keys()
+        data_keys = self.redis_db.keys("otp:reset:*")
         assert len(data_keys) == 1
 
     async def test_request_reset_with_wrong_email(
@@ -139,11 +155,13 @@ class TestConfirmPasswordReset:
         self, app: FastAPI, client: AsyncClient, test_user: Users
     ) -> None:
         """Confirm password reset."""
-        otp = otp_manager.create_otp(user_id=str(test_user.id))
+        otp = await otp_manager.create_otp(
+            user_id=str(test_user.id), purpose="reset"
+        )
         password = "passWord123&@#"
         res = await client.post(
             app.url_path_for("auth:confirm_password_reset"),
-            json=dict(otp=otp, new_password=password),
+            json=dict(email=test_user.email, otp=otp, new_password=password),
         )
         assert res.status_code == status.HTTP_200_OK
         user = await Users.get(id=test_user.id)
@@ -168,15 +186,35 @@ class TestConfirmPasswordReset:
         data_keys = self.redis_db.keys()
         assert len(data_keys) == 0
 
+    async def test_confirm_reset_without_email(
+        self, app: FastAPI, client: AsyncClient, test_user: Users
+    ) -> None:
+        """Test that older clients can still confirm with the code alone."""
+        otp = await otp_manager.create_otp(
+            user_id=str(test_user.id), purpose="reset"
+        )
+        password = "passWord123&@#"
+        res = await client.post(
+            app.url_path_for("auth:confirm_password_reset"),
+            json=dict(otp=otp, new_password=password),
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert AuthResponse(**res.json()).user.id == test_user.id
+        assert len(self.redis_db.keys()) == 0
+
     async def test_confirm_reset_wrong_otp(
         self, app: FastAPI, client: AsyncClient, test_user: Users
     ) -> None:
         """Confirm password reset."""
-        otp_manager.create_otp(user_id=str(test_user.id))
+        await otp_manager.create_otp(
+            user_id=str(test_user.id), purpose="reset"
+        )
         password = "passWord123&@#"
         res = await client.post(
             app.url_path_for("auth:confirm_password_reset"),
-            json=dict(otp="fake_otp", new_password=password),
+            json=dict(
+                email=test_user.email, otp="fake_otp", new_password=password
+            ),
         )
         assert res.status_code == status.HTTP_401_UNAUTHORIZED
         assert (
@@ -188,14 +226,124 @@ class TestConfirmPasswordReset:
         self, app: FastAPI, client: AsyncClient, test_user: Users
     ) -> None:
         """Confirm password reset."""
-        otp = otp_manager.create_otp(user_id=str(test_user.id))
+        otp = await otp_manager.create_otp(
+            user_id=str(test_user.id), purpose="reset"
+        )
         password = "passWord123"
         res = await client.post(
             app.url_path_for("auth:confirm_password_reset"),
-            json=dict(otp=otp, new_password=password),
+            json=dict(email=test_user.email, otp=otp, new_password=password),
         )
         assert res.status_code == status.HTTP_400_BAD_REQUEST
         assert (
             res.json().get("detail")
             == "Your password should contain atleast 1 uppercase, 1 lowercase, 1 digit, and 1 special character."  # noqa
         )
+
+
+class TestRateLimit:
+    async def test_login_is_rate_limited(
+        self, app: FastAPI, client: AsyncClient, test_user: Users
+    ) -> None:
+        """Test that repeated logins for one email are rejected."""
+        quota = parse_quotas(RATE_LIMIT_LOGIN)
+        limit = next(q.limit for q in quota if q.scope == "email")
+
+        for _ in range(limit):
+            res = await client.post(
+                app.url_path_for("auth:login"),
+                json=dict(email=test_user.email, password="wrong"),
+            )
+            assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+        res = await client.post(
+            app.url_path_for("auth:login"),
+            json=dict(email=test_user.email.upper(), password="wrong"),
+        )
+        assert res.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert int(res.headers["Retry-After"]) > 0
+
+        # Other addresses are still served.
+        res = await client.post(
+            app.url_path_for("auth:login"),
+            json=dict(email="other@eelclip.com", password="wrong"),
+        )
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def test_ip_limit_uses_forwarded_client(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        """Test that clients behind the proxy are limited separately."""
+        quota = parse_quotas(RATE_LIMIT_LOGIN)
+        limit = next(q.limit for q in quota if q.scope == "ip")
+
+        async def login(n: int, client_ip: str):
+            return await client.post(
+                app.url_path_for("auth:login"),
+                json=dict(email=f"proxied{n}@eelclip.com", password="wrong"),
+                headers={"X-Forwarded-For": f"{client_ip}, 127.0.0.1"},
+            )
+
+        for n in range(limit):
+            res = await login(n, "203.0.113.1")
+            assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+        res = await login(limit, "203.0.113.1")
+        assert res.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+        # Another client behind the same proxy is still served.
+        res = await login(limit + 1, "203.0.113.2")
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestRehash:
+    async def test_login_upgrades_old_hash(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        """Test that a login rehashes a password stored at a low cost."""
+        password = "passWord23&"
+        old_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+        old_hash = old_context.hash(password)
+        user = await Users.create(
+            email="rehash@eelclip.com",
+            password_hash=old_hash,
+            is_verified=True,
+        )
+        assert hash_service.needs_update(old_hash)
+
+        res = await client.post(
+            app.url_path_for("auth:login"),
+            json=dict(email=user.email, password=password),
+        )
+        assert res.status_code == status.HTTP_200_OK
+
+        user = await Users.get(id=user.id)
+        assert user.password_hash != old_hash
+        assert not hash_service.needs_update(user.password_hash)
+        assert await hash_service.verify_hash(password, user.password_hash)
+
+    async def test_rehash_keeps_newer_password(self, app: FastAPI) -> None:
+        """Test that a rehash never overwrites a changed password."""
+        user = await Users.create(
+            email="changed@eelclip.com", password_hash="new-hash"
+        )
+        assert not await rehash_password(user.id, "password", "old-hash")
+
+        user = await Users.get(id=user.id)
+        assert user.password_hash == "new-hash"
+
+    async def test_cost_report(
+        self, app: FastAPI, client: AsyncClient, test_user: Users
+    ) -> None:
+        """Test that admins can see the cost distribution."""
+        token = await jwt_manager.create_access_token(
+            token_data=TokenData(user_id=str(test_user.id), scopes=["admin"])
+        )
+        res = await client.get(
+            app.url_path_for("admin:password_hash_costs"),
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        report = res.json()
+        assert report["target_rounds"] == BCRYPT_ROUNDS
+        assert report["costs"][f"{BCRYPT_ROUNDS:02d}"] >= 1
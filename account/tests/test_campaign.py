@@ -0,0 +1,175 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from library.schemas.auth import TokenData
+from library.schemas.campaign import CampaignIn
+from library.schemas.email import EmailResult
+from library.security.jwt import jwt_manager
+from models.user import Users
+from services import campaign as campaign_module
+from services.campaign import (
+    CampaignCheckpoint,
+    CampaignLock,
+    CampaignRunner,
+    launch_campaign,
+    running_campaigns,
+    stop_campaigns,
+)
+
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture()
+def sent_batches(monkeypatch):
+    batches = []
+
+    async def mock_send_batch_email(recipients, subject, body):
+        batches.append(recipients)
+        return EmailResult(ok=True, status_code=201)
+
+    monkeypatch.setattr(
+        campaign_module, "send_batch_email", mock_send_batch_email
+    )
+    return batches
+
+
+async def create_users(count: int) -> None:
+    for i in range(count):
+        await Users.create(
+            email=f"user{i}@eelclip.com",
+            first_name=f"User{i}",
+            last_name="Eelclip",
+        )
+
+
+class TestCampaign:
+    async def test_campaign_sends_every_user(
+        self, app: FastAPI, sent_batches
+    ) -> None:
+        """Test that a campaign sends to every user in batches."""
+        await create_users(7)
+        campaign = CampaignIn(
+            campaign_id="notice-1",
+            template="campaigns/notice.html",
+            subject="Notice",
+            context={"title": "Notice", "message": "Hello there"},
+            batch_size=3,
+            concurrency=2,
+        )
+        progress = await CampaignRunner(campaign).run()
+
+        assert progress.status == "completed"
+        assert progress.sent == 7
+        assert progress.batches == 3
+        assert [len(batch) for batch in sent_batches] == [3, 3, 1]
+        assert sent_batches[0][0]["merge_info"]["first_name"]
+
+    async def test_campaign_body_keeps_merge_tags(self, app: FastAPI) -> None:
+        """Test that per-user fields are left for the provider."""
+        campaign = CampaignIn(
+            campaign_id="notice-2",
+            template="campaigns/notice.html",
+            subject="Notice",
+            context={"title": "Notice", "message": "Hello there"},
+        )
+        body = await CampaignRunner(campaign).render()
+        assert "Hello {{first_name}}," in body
+        assert "Hello there" in body
+
+    async def test_campaign_resumes_from_checkpoint(
+        self, app: FastAPI, sent_batches
+    ) -> None:
+        """Test that a resumed campaign skips users already sent."""
+        await create_users(4)
+        users = await Users.all().order_by("id").values_list("id", flat=True)
+        checkpoint = CampaignCheckpoint("notice-3")
+        await checkpoint.save(status="interrupted")
+        await checkpoint.advance(last_id=str(users[1]), sent=2, failed=0)
+
+        campaign = CampaignIn(
+            campaign_id="notice-3",
+            template="campaigns/notice.html",
+            subject="Notice",
+            batch_size=10,
+        )
+        progress = await CampaignRunner(campaign).run()
+
+        sent = [r["address"] for batch in sent_batches for r in batch]
+        assert len(sent) == len(users) - 2
+        assert progress.sent == len(users)
+        assert progress.status == "completed"
+
+    async def test_stop_checkpoints_running_campaign(
+        self, app: FastAPI, monkeypatch
+    ) -> None:
+        """Test that stopping the app interrupts campaigns resumably."""
+        await create_users(2)
+        sending = asyncio.Event()
+
+        async def slow_send_batch_email(recipients, subject, body):
+            sending.set()
+            await asyncio.sleep(60)
+
+        monkeypatch.setattr(
+            campaign_module, "send_batch_email", slow_send_batch_email
+        )
+        await launch_campaign(
+            CampaignIn(
+                campaign_id="notice-4",
+                template="campaigns/notice.html",
+                subject="Notice",
+            )
+        )
+        await asyncio.wait_for(sending.wait(), 5)
+
+        await stop_campaigns()
+        assert "notice-4" not in running_campaigns
+        progress = await CampaignCheckpoint("notice-4").load()
+        assert progress.status == "interrupted"
+        # The lock is released, so the campaign can be resumed.
+        assert await CampaignLock("notice-4").acquire()
+
+    async def test_campaign_runs_once_across_workers(
+        self, app: FastAPI, client: AsyncClient, test_user: Users
+    ) -> None:
+        """Test that a campaign locked by another worker is refused."""
+        other_worker = CampaignLock("notice-5")
+        assert await other_worker.acquire()
+
+        token = await jwt_manager.create_access_token(
+            token_data=TokenData(user_id=str(test_user.id), scopes=["admin"])
+        )
+        res = await client.post(
+            app.url_path_for("admin:start_campaign"),
+            json=dict(
+                campaign_id="notice-5",
+                template="campaigns/notice.html",
+                subject="Notice",
+            ),
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert res.status_code == status.HTTP_409_CONFLICT
+        assert "notice-5" not in running_campaigns
+        await other_worker.release()
+
+    async def test_admin_scope_required(
+        self, app: FastAPI, client: AsyncClient, test_user: Users
+    ) -> None:
+        """Test that only admins can start campaigns."""
+        token = await jwt_manager.create_access_token(
+            token_data=TokenData(user_id=str(test_user.id), scopes=["base"])
+        )
+        res = await client.post(
+            app.url_path_for("admin:start_campaign"),
+            json=dict(
+                campaign_id="notice-4",
+                template="campaigns/notice.html",
+                subject="Notice",
+            ),
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert res.status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,82 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from library.utils.email import EmailTransport, send_email
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestEmailTransport:
+    async def test_send_email(
+        self, app: FastAPI, mock_email_sending
+    ) -> None:
+        """Test that emails are posted to the provider."""
+        result = await send_email(
+            to_address=["support@eelclip.com"],
+            subject="Hello",
+            body="<p>Hello</p>",
+            name="Eelclip",
+        )
+        assert result.ok
+        assert result.status_code == 201
+        assert result.request_id == "mocked"
+        assert len(mock_email_sending) == 1
+
+    async def test_provider_error(self, app: FastAPI) -> None:
+        """Test that provider errors are reported, not raised."""
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(
+                400,
+                json={
+                    "error": {
+                        "code": "TM_3201",
+                        "message": "Mandatory Field 'to' was not set.",
+                        "request_id": "failed",
+                    }
+                },
+            )
+
+        transport = EmailTransport(url="http://email.test/v1.1/email")
+        await transport.start(transport=httpx.MockTransport(handler))
+        result = await transport.post({})
+        await transport.close()
+
+        assert not result.ok
+        assert result.status_code == 400
+        assert result.request_id == "failed"
+        assert result.message == "Mandatory Field 'to' was not set."
+
+    async def test_unexpected_response_body(self, app: FastAPI) -> None:
+        """Test that bodies other than JSON objects are reported."""
+        bodies = iter([["bad gateway"], "bad gateway", {"error": "down"}])
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(502, json=next(bodies))
+
+        transport = EmailTransport(url="http://email.test/v1.1/email")
+        await transport.start(transport=httpx.MockTransport(handler))
+        results = [await transport.post({}) for _ in range(3)]
+        await transport.close()
+
+        for result in results:
+            assert not result.ok
+            assert result.status_code == 502
+            assert result.request_id is None
+
+    async def test_provider_unreachable(self, app: FastAPI) -> None:
+        """Test that connection errors are reported, not raised."""
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("connection refused")
+
+        transport = EmailTransport(url="http://email.test/v1.1/email")
+        await transport.start(transport=httpx.MockTransport(handler))
+        result = await transport.post({})
+        await transport.close()
+
+        assert not result.ok
+        assert result.status_code is None
+        assert result.message == "connection refused"
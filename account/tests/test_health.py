@@ -0,0 +1,103 @@
+import pytest
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from config import POSTGRES_POOL_MAX_SIZE
+from database.router import (
+    ReplicaRouter,
+    ReplicaSet,
+    replica_set,
+    use_primary,
+)
+from models.user import Users
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestHealth:
+    async def test_startup_timing(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        """Test that startup phases are reported."""
+        res = await client.get(app.url_path_for("health:startup"))
+        assert res.status_code == status.HTTP_200_OK
+
+        phases = res.json()["phases"]
+        for phase in ("imports", "config", "db_pool", "redis", "sentry"):
+            assert phase in phases
+        assert res.json()["total"] >= sum(phases.values()) - 0.001
+
+    async def test_reports_need_admin(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        """Test that only the startup probe is public."""
+        for name in ("db_pool", "replicas", "tracing", "memory"):
+            res = await client.get(app.url_path_for(f"health:{name}"))
+            assert res.status_code == status.HTTP_403_FORBIDDEN
+
+    async def test_db_pool(
+        self, app: FastAPI, client: AsyncClient, admin_headers: dict
+    ) -> None:
+        """Test that pool usage is reported after a query."""
+        await Users.filter(email="pool@eelclip.com").exists()
+
+        res = await client.get(
+            app.url_path_for("health:db_pool"), headers=admin_headers
+        )
+        assert res.status_code == status.HTTP_200_OK
+
+        pool = res.json()["default"]
+        assert pool["max_size"] == POSTGRES_POOL_MAX_SIZE
+        assert 0 <= pool["in_use"] <= pool["size"]
+        assert pool["wait"]["count"] >= 1
+        assert pool["wait"]["buckets"]["+Inf"] == pool["wait"]["count"]
+
+    async def test_memory(
+        self, app: FastAPI, client: AsyncClient, admin_headers: dict
+    ) -> None:
+        """Test that the worker reports its own memory."""
+        res = await client.get(
+            app.url_path_for("health:memory"), headers=admin_headers
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["pid"] > 0
+        assert 0 < res.json()["pss"] <= res.json()["rss"]
+
+
+class TestReplicas:
+    async def test_lagging_replica_is_dropped(self, app: FastAPI) -> None:
+        """Test that a replica failing its check serves no reads."""
+        replicas = ReplicaSet(names=["missing_replica"], max_lag=1)
+        replicas._set_healthy(["missing_replica"])
+        assert replicas.choose() == "missing_replica"
+
+        await replicas.check()
+        assert replicas.choose() is None
+        snapshot = replicas.snapshot()["replicas"]["missing_replica"]
+        assert snapshot["in_rotation"] is False
+        assert snapshot["error"]
+
+    async def test_reads_follow_writes(self, app: FastAPI) -> None:
+        """Test that reads after a write go to the primary."""
+        router = ReplicaRouter()
+        replica_set._set_healthy(["replica_0"])
+        try:
+            with use_primary():
+                assert router.db_for_read(Users) is None
+            assert router.db_for_read(Users) == "replica_0"
+
+            router.db_for_write(Users)
+            assert router.db_for_read(Users) is None
+        finally:
+            replica_set._set_healthy([])
+
+    async def test_replica_report(
+        self, app: FastAPI, client: AsyncClient, admin_headers: dict
+    ) -> None:
+        """Test that the replica report is served."""
+        res = await client.get(
+            app.url_path_for("health:replicas"), headers=admin_headers
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert "replicas" in res.json()
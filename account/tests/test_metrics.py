@@ -0,0 +1,42 @@
+import pytest
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestMetrics:
+    async def test_routes_and_dependencies(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        """Test that requests are labelled by route name."""
+        await client.get(app.url_path_for("root"))
+        await client.post(
+            app.url_path_for("auth:login"),
+            json={"email": "metrics@eelclip.com", "password": "password"},
+        )
+
+        res = await client.get(app.url_path_for("metrics"))
+        assert res.status_code == status.HTTP_200_OK
+        assert (
+            'http_requests_total{method="GET",route="root",status="200"}'
+            in res.text
+        )
+        assert (
+            'http_request_duration_seconds_count{method="POST",'
+            'route="auth:login"}' in res.text
+        )
+        assert (
+            'dependency_duration_seconds_count{dependency="postgres",'
+            'operation="select"}' in res.text
+        )
+
+    async def test_unmatched_route(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        """Test that unknown paths share one label."""
+        await client.get("/does-not-exist/")
+
+        res = await client.get(app.url_path_for("metrics"))
+        assert 'route="unmatched",status="404"' in res.text
@@ -0,0 +1,131 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from fastapi import FastAPI
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+
+from models.user import Users
+from services.backfill_email import backfill
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestNormalizedEmail:
+    async def test_email_is_normalized_on_save(self, app: FastAPI) -> None:
+        """Test that the lookup column follows the email."""
+        user = await Users.create(email=" Normal@EelClip.com ")
+        assert user.email_normalized == "normal@eelclip.com"
+
+        user.email = "Changed@EelClip.com"
+        await user.save(update_fields=["email"])
+        user = await Users.get(id=user.id)
+        assert user.email_normalized == "changed@eelclip.com"
+
+    async def test_normalized_email_is_unique(self, app: FastAPI) -> None:
+        """Test that addresses differing by case cannot both exist."""
+        await Users.create(email="unique@eelclip.com")
+        with pytest.raises(IntegrityError):
+            await Users.create(email="UNIQUE@eelclip.com")
+
+    async def test_lookup_before_backfill(self, app: FastAPI) -> None:
+        """Test that rows not yet backfilled are still found by email."""
+        user = await Users.create(email="Legacy@EelClip.com")
+        await Users.filter(id=user.id).update(email_normalized=None)
+
+        found = await Users.get_by_email("legacy@eelclip.com")
+        assert found is not None and found.id == user.id
+
+    async def test_no_duplicate_of_legacy_row(self, app: FastAPI) -> None:
+        """Test that a row not yet backfilled still blocks its email."""
+        user = await Users.create(email="Taken@EelClip.com")
+        await Users.filter(id=user.id).update(email_normalized=None)
+
+        assert await Users.create_unique(email="taken@eelclip.com") is None
+        taken = Users.filter(email__iexact="taken@eelclip.com")
+        assert await taken.count() == 1
+
+    async def test_create_unique_reraises_other_violations(
+        self, app: FastAPI
+    ) -> None:
+        """Test that only a taken email is reported as a duplicate."""
+        user = await Users.create(email="first@eelclip.com")
+        with pytest.raises(IntegrityError):
+            await Users.create_unique(id=user.id, email="second@eelclip.com")
+
+    async def test_backfill(self, app: FastAPI) -> None:
+        """Test that the backfill fills missing values in batches."""
+        first = await Users.create(email="Backfill1@eelclip.com")
+        second = await Users.create(email="Backfill2@eelclip.com")
+        await Users.filter(id__in=[first.id, second.id]).update(
+            email_normalized=None
+        )
+
+        stats = await backfill(batch_size=1, sleep=0)
+        assert stats["updated"] == 2
+        assert stats["skipped"] == 0
+
+        first = await Users.get(id=first.id)
+        assert first.email_normalized == "backfill1@eelclip.com"
+
+    async def test_backfill_duplicates_across_batches(
+        self, app: FastAPI
+    ) -> None:
+        """Test that the oldest duplicate wins even in a later batch."""
+        newer = await Users.create(
+            id=uuid.UUID(int=1), email="dup@eelclip.com"
+        )
+        older = await Users.create(
+            id=uuid.UUID(int=2), email="Dup@EelClip.com"
+        )
+        await Users.filter(id__in=[newer.id, older.id]).update(
+            email_normalized=None
+        )
+        await Users.filter(id=older.id).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        assert (await Users.get_by_email("dup@eelclip.com")).id == older.id
+
+        stats = await backfill(batch_size=1, sleep=0)
+        assert stats["updated"] == 1
+        assert stats["skipped"] == 1
+
+        assert (await Users.get_by_email("dup@eelclip.com")).id == older.id
+        newer = await Users.get(id=newer.id)
+        assert newer.email_normalized is None
+
+
+class TestUpdateReturning:
+    async def test_updates_only_given_fields(self, app: FastAPI) -> None:
+        """Test that a targeted update leaves other columns alone."""
+        user = await Users.create(email="targeted@eelclip.com")
+        stale = await Users.get(id=user.id)
+        await Users.filter(id=user.id).update(first_name="Concurrent")
+
+        updated = await Users.update_returning(stale.id, is_verified=True)
+        assert updated.is_verified is True
+        assert updated.first_name == "Concurrent"
+        assert updated.updated_at >= stale.updated_at
+
+        user = await Users.get(id=user.id)
+        assert user.is_verified is True
+        assert user.first_name == "Concurrent"
+
+    async def test_email_update_is_normalized(self, app: FastAPI) -> None:
+        """Test that an email change keeps the lookup column in step."""
+        user = await Users.create(email="before@eelclip.com")
+
+        updated = await Users.update_returning(
+            user.id, email=" After@EelClip.com "
+        )
+        assert updated.email_normalized == "after@eelclip.com"
+        found = await Users.get_by_email("after@eelclip.com")
+        assert found.id == user.id
+
+    async def test_missing_user(self, app: FastAPI) -> None:
+        """Test that updating a missing user returns None."""
+        user = await Users.create(email="missing@eelclip.com")
+        await user.delete()
+        assert await Users.update_returning(user.id, is_verified=True) is None
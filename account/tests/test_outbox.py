@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+import pytest
+import redis
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from library.schemas.email import EmailResult
+from services import outbox
+from services.outbox import (
+    OutboxWorker,
+    email_outbox,
+    STREAM_KEY,
+    RETRY_KEY,
+    DEAD_KEY,
+)
+
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture()
+def sent_emails(monkeypatch):
+    sent = []
+
+    async def mock_send_email(**kwargs):
+        sent.append(kwargs)
+        return EmailResult(ok=True, status_code=201)
+
+    monkeypatch.setattr(outbox, "send_email", mock_send_email)
+    return sent
+
+
+@pytest.fixture()
+def failing_emails(monkeypatch):
+    async def mock_send_email(**kwargs):
+        return EmailResult(ok=False, status_code=500, message="down")
+
+    monkeypatch.setattr(outbox, "send_email", mock_send_email)
+
+
+class TestOutbox:
+    redis_db = redis.Redis(host="redis", port=6379, db=2)
+
+    async def test_request_enqueues_email(
+        self, app: FastAPI, client: AsyncClient, sent_emails
+    ) -> None:
+        """Test that registration enqueues instead of sending."""
+        user = {
+            "first_name": "Unyime",
+            "last_name": "Etim",
+            "email": "outbox@eelclip.com",
+            "password": "passWord23&",
+        }
+        res = await client.post(
+            app.url_path_for("register:user_register"), json=user
+        )
+        assert res.status_code == status.HTTP_201_CREATED
+        assert self.redis_db.xlen(STREAM_KEY) == 1
+        assert sent_emails == []
+
+    async def test_worker_delivers(self, app: FastAPI, sent_emails) -> None:
+        """Test that the worker delivers and settles jobs."""
+        job_id = await email_outbox.enqueue(
+            to_address=["support@eelclip.com"],
+            subject="Hello",
+            body="<p>Hello</p>",
+            name="Eelclip",
+        )
+        worker = OutboxWorker()
+        assert await worker.run_once() == 1
+
+        assert sent_emails[0]["to_address"] == ["support@eelclip.com"]
+        assert self.redis_db.xlen(STREAM_KEY) == 0
+        assert self.redis_db.exists(f"email:outbox:sent:{job_id}")
+
+        lag = await email_outbox.lag()
+        assert lag["pending"] == 0
+        assert lag["stream_length"] == 0
+
+    async def test_worker_is_idempotent(
+        self, app: FastAPI, sent_emails
+    ) -> None:
+        """Test that a job id is only delivered once."""
+        for _ in range(2):
+            await email_outbox.enqueue(
+                to_address=["support@eelclip.com"],
+                subject="Hello",
+                body="<p>Hello</p>",
+                name="Eelclip",
+                job_id="same-job",
+            )
+        worker = OutboxWorker(concurrency=1)
+        await worker.run_once()
+        await worker.run_once()
+
+        assert len(sent_emails) == 1
+        assert worker.duplicates == 1
+
+    async def test_worker_retries_then_dead_letters(
+        self, app: FastAPI, failing_emails
+    ) -> None:
+        """Test that failing jobs back off and end in the DLQ."""
+        await email_outbox.enqueue(
+            to_address=["support@eelclip.com"],
+            subject="Hello",
+            body="<p>Hello</p>",
+            name="Eelclip",
+        )
+        worker = OutboxWorker(max_attempts=2, backoff_base=0.0)
+        await worker.run_once()
+
+        retries = self.redis_db.zrange(RETRY_KEY, 0, -1)
+        assert len(retries) == 1
+        assert json.loads(retries[0])["attempts"] == "1"
+
+        # The backoff has elapsed, so the retry is promoted and fails.
+        await worker.run_once()
+        assert self.redis_db.zcard(RETRY_KEY) == 0
+        assert self.redis_db.xlen(DEAD_KEY) == 1
+        assert worker.dead_lettered == 1
+
+    async def test_run_survives_lag_errors(
+        self, app: FastAPI, sent_emails, monkeypatch
+    ) -> None:
+        """Test that a failed lag report does not stop the worker."""
+
+        async def lost_redis():
+            raise RedisConnectionError("lost")
+
+        monkeypatch.setattr(email_outbox, "lag", lost_redis)
+        worker = OutboxWorker()
+        task = asyncio.create_task(worker.run(report_every=0))
+        await asyncio.sleep(0.1)
+        await email_outbox.enqueue(
+            to_address=["support@eelclip.com"],
+            subject="Hello",
+            body="<p>Hello</p>",
+            name="Eelclip",
+        )
+        for _ in range(50):
+            if sent_emails:
+                break
+            await asyncio.sleep(0.1)
+        worker.stop()
+        await asyncio.wait_for(task, 5)
+
+        assert len(sent_emails) == 1
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+
+from library.utils.parameters import (
+    FileBackend,
+    ParameterBackend,
+    ParameterStore,
+    StaticBackend,
+)
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class FlakyBackend(ParameterBackend):
+    def __init__(self) -> None:
+        self.calls = []
+        self.fail = False
+
+    def fetch(self, names):
+        self.calls.append(list(names))
+        if self.fail:
+            raise ConnectionError("ssm is down")
+        return {name: f"value-{len(self.calls)}" for name in names}
+
+
+class TestParameterStore:
+    async def test_cache_hits(self, app: FastAPI) -> None:
+        """Test that parameters are fetched once per TTL."""
+        backend = FlakyBackend()
+        store = ParameterStore(backend=backend, names=["a", "b", "a"])
+
+        assert store.get("a") == "value-1"
+        assert store.get("b") == "value-1"
+        assert backend.calls == [["a", "b"]]
+        assert store.metrics.hits == 1
+        assert store.metrics.misses == 1
+
+    async def test_serves_stale_values_on_error(self, app: FastAPI) -> None:
+        """Test that a failed refresh keeps the last known values."""
+        backend = FlakyBackend()
+        store = ParameterStore(backend=backend, names=["a"], ttl=0)
+
+        assert store.get("a") == "value-1"
+        backend.fail = True
+        assert store.get("a") == "value-1"
+        assert store.metrics.stale_served == 1
+
+    async def test_failed_refresh_backs_off(self, app: FastAPI) -> None:
+        """Test that a failed refresh is not retried by every caller."""
+        backend = FlakyBackend()
+        store = ParameterStore(backend=backend, names=["a"], ttl=60)
+
+        assert store.get("a") == "value-1"
+        store._expires_at = 0
+        backend.fail = True
+        assert store.get("a") == "value-1"
+        assert store.get("a") == "value-1"
+        assert len(backend.calls) == 2
+
+    async def test_reads_never_fetch_while_refreshing(
+        self, app: FastAPI
+    ) -> None:
+        """Test that reads leave fetching to the background refresh."""
+        backend = FlakyBackend()
+        store = ParameterStore(backend=backend, names=["a"], ttl=0)
+        await store.start()
+        try:
+            assert store.get("a") == "value-1"
+            assert store.get("a") == "value-1"
+            assert len(backend.calls) == 1
+        finally:
+            await store.stop()
+
+    async def test_first_load_error_is_raised(self, app: FastAPI) -> None:
+        """Test that there is nothing stale to serve on first load."""
+        backend = FlakyBackend()
+        backend.fail = True
+        store = ParameterStore(backend=backend, names=["a"])
+
+        with pytest.raises(ConnectionError):
+            store.get("a")
+
+    async def test_file_backend(self, app: FastAPI, tmp_path) -> None:
+        """Test reading parameters from a local file."""
+        path = tmp_path / "parameters.json"
+        path.write_text(json.dumps({"a": "1", "c": "3"}))
+        store = ParameterStore(backend=FileBackend(str(path)), names=["a"])
+        assert store.get_all() == {"a": "1"}
+
+    async def test_background_refresh(self, app: FastAPI) -> None:
+        """Test that start loads parameters and stop cancels refreshes."""
+        store = ParameterStore(
+            backend=StaticBackend({"a": "1"}), names=["a"]
+        )
+        await store.start()
+        assert store.metrics.refreshes == 1
+        await store.stop()
@@ -1,9 +1,13 @@
+import asyncio
+
 import pytest
 import redis
 from fastapi import FastAPI, status
 from httpx import AsyncClient
 
+from config import RATE_LIMIT_VERIFY_ACCOUNT
 from library.schemas.shared import UserPublic
+from library.security.ratelimit import parse_quotas
 from models.user import Users
 from library.security.jwt import jwt_manager
 from library.security.otp import otp_manager
@@ -33,11 +37,11 @@ class TestRegistration:
         assert res.status_code == status.HTTP_201_CREATED
         data = UserPublic(**res.json())
 
-        data_keys = redis_db.keys()
+        data_keys = redis_db.keys("otp:verify:*")
         assert len(data_keys) == 1
 
         for key in data_keys:
-            assert redis_db.get(key).decode("utf-8") == str(data.id)
+            assert redis_db.hexists(key, str(data.id))
 
         user = await Users.get_or_none(email=user.get("email"))
         assert user
@@ -100,6 +104,31 @@ class TestRegistration:
         detail = "This user already exists. Please login instead."
         assert res.json().get("detail") == detail
 
+    async def test_concurrent_registration_with_same_email(
+        self, app: FastAPI, client: AsyncClient, mock_email_sending
+    ) -> None:
+        """Test that only one of several concurrent signups succeeds."""
+        user = {
+            "first_name": "Unyime",
+            "last_name": "Etim",
+            "email": "concurrent@eelclip.com",
+            "password": "passWord23&",
+        }
+
+        responses = await asyncio.gather(
+            *[
+                client.post(
+                    app.url_path_for("register:user_register"), json=user
+                )
+                for _ in range(5)
+            ]
+        )
+        codes = sorted(res.status_code for res in responses)
+        assert codes == [status.HTTP_201_CREATED] + [
+            status.HTTP_400_BAD_REQUEST
+        ] * 4
+        assert await Users.filter(email="concurrent@eelclip.com").count() == 1
+
 
 class TestResendVerification:
     email = "support@eelclip.com"
@@ -159,7 +188,7 @@ class TestVerifyAccount:
         redis_db = redis.Redis(host="redis", port=6379, db=1)
         res = await client.post(
             app.url_path_for("register:verify_account"),
-            json=dict(otp="wrong_otp"),
+            json=dict(email=test_user.email, otp="wrong_otp"),
         )
         assert res.status_code == status.HTTP_401_UNAUTHORIZED
         assert (
@@ -177,10 +206,12 @@ class TestVerifyAccount:
         redis_db = redis.Redis(host="redis", port=6379, db=1)
         assert test_user.is_verified is False
 
-        otp = otp_manager.create_otp(user_id=str(test_user.id))
+        otp = await otp_manager.create_otp(
+            user_id=str(test_user.id), purpose="verify"
+        )
         res = await client.post(
             app.url_path_for("register:verify_account"),
-            json=dict(otp=otp),
+            json=dict(email=test_user.email, otp=otp),
         )
         assert res.status_code == status.HTTP_200_OK
         data = AuthResponse(**res.json())
@@ -205,3 +236,41 @@ class TestVerifyAccount:
         # Check that otp is deleted.
         data_keys = redis_db.keys()
         assert len(data_keys) == 0
+
+    async def test_verify_account_without_email(
+        self, app: FastAPI, client: AsyncClient, test_user: Users
+    ) -> None:
+        """Test that older clients can still verify with the code alone."""
+        otp = await otp_manager.create_otp(
+            user_id=str(test_user.id), purpose="verify"
+        )
+        res = await client.post(
+            app.url_path_for("register:verify_account"), json=dict(otp=otp)
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert AuthResponse(**res.json()).user.id == test_user.id
+
+        res = await client.post(
+            app.url_path_for("register:verify_account"), json=dict(otp=otp)
+        )
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def test_code_guessing_is_rate_limited(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        """Test that codes sent without an email are limited per IP."""
+        quota = parse_quotas(RATE_LIMIT_VERIFY_ACCOUNT)
+        limit = next(q.limit for q in quota if q.scope == "ip")
+
+        for n in range(limit):
+            res = await client.post(
+                app.url_path_for("register:verify_account"),
+                json=dict(otp=str(n).zfill(6)),
+            )
+            assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+        res = await client.post(
+            app.url_path_for("register:verify_account"),
+            json=dict(otp=str(limit).zfill(6)),
+        )
+        assert res.status_code == status.HTTP_429_TOO_MANY_REQUESTS
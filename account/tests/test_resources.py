@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+
+from database import database
+from library.utils.profiler import StartupProfiler
+from services import tasks
+from services.resources import RequestDrain, ResourceRegistry
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def registry(events: list, **kwargs) -> ResourceRegistry:
+    resources = ResourceRegistry(
+        drain=RequestDrain(poll_interval=0.01),
+        profiler=StartupProfiler(),
+        **kwargs,
+    )
+
+    def resource(name: str, after=()):
+        resources.register(
+            name,
+            start=lambda: events.append(f"start {name}"),
+            stop=lambda: events.append(f"stop {name}"),
+            after=after,
+        )
+
+    resource("client", after=["pool"])
+    resource("pool", after=["config"])
+    resource("config")
+    return resources
+
+
+class TestResources:
+    async def test_dependency_order(self, app: FastAPI) -> None:
+        """Test that resources start after their dependencies."""
+        events = []
+        resources = registry(events)
+        await resources.start()
+        await resources.stop()
+
+        assert events == [
+            "start config",
+            "start pool",
+            "start client",
+            "stop client",
+            "stop pool",
+            "stop config",
+        ]
+        stages = resources.report()["stages"]
+        assert list(stages) == ["drain", "client", "pool", "config"]
+
+    async def test_failed_start(self, app: FastAPI) -> None:
+        """Test that a failed start stops what was already started."""
+        events = []
+        resources = registry(events)
+        resources.register("broken", start=lambda: 1 / 0, after=["client"])
+
+        with pytest.raises(ZeroDivisionError):
+            await resources.start()
+        assert events[-3:] == ["stop client", "stop pool", "stop config"]
+
+    async def test_unreachable_stores_fail_startup(
+        self, app: FastAPI, monkeypatch
+    ) -> None:
+        """Test that database and redis errors are not swallowed."""
+
+        async def unreachable(*args, **kwargs):
+            raise ConnectionRefusedError("unreachable")
+
+        monkeypatch.setattr(database.Tortoise, "init", unreachable)
+        with pytest.raises(ConnectionRefusedError):
+            await database.init_db()
+
+        monkeypatch.setattr(tasks, "server_version", unreachable)
+        with pytest.raises(ConnectionRefusedError):
+            await tasks.ping_redis()
+
+    async def test_unknown_and_circular(self, app: FastAPI) -> None:
+        """Test that bad dependencies are reported."""
+        resources = registry([])
+        resources.register("a", after=["missing"])
+        with pytest.raises(ValueError):
+            resources.order()
+
+        resources = registry([])
+        resources.register("a", after=["b"])
+        resources.register("b", after=["a"])
+        with pytest.raises(ValueError):
+            resources.order()
+
+    async def test_drain(self, app: FastAPI) -> None:
+        """Test that shutdown waits for requests up to the deadline."""
+        events = []
+        resources = registry(events, drain_timeout=1.0)
+        await resources.start()
+
+        resources.drain.in_flight = 1
+
+        async def finish_request() -> None:
+            await asyncio.sleep(0.05)
+            events.append("request done")
+            resources.drain.in_flight = 0
+
+        task = asyncio.create_task(finish_request())
+        await resources.stop()
+        await task
+        assert events.index("request done") < events.index("stop client")
+
+    async def test_drain_deadline(self, app: FastAPI) -> None:
+        """Test that a stuck request does not block shutdown."""
+        resources = registry([], drain_timeout=0.05)
+        await resources.start()
+        resources.drain.in_flight = 1
+        assert not await resources.drain.wait(0.05)
+        await resources.stop()
+        assert resources.report()["stages"]["drain"] < 1
+
+    async def test_blocking_stop_is_bounded(self, app: FastAPI) -> None:
+        """Test that a blocking stop cannot hold up shutdown."""
+        resources = ResourceRegistry(
+            drain=RequestDrain(), profiler=StartupProfiler(), stop_timeout=0.05
+        )
+        resources.register("stuck", stop=lambda: time.sleep(0.5))
+        await resources.start()
+
+        started = time.perf_counter()
+        await resources.stop()
+        assert time.perf_counter() - started < 0.4
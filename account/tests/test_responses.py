@@ -0,0 +1,63 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from library.schemas.auth import AuthResponse
+from library.schemas.shared import UserPublic
+from library.utils.responses import auth_response, user_response
+from models.user import Users
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def reference_body(model, content) -> bytes:
+    """Encode content the way a `response_model` route does."""
+    field = create_response_field(name="Response", type_=model)
+    encoded = await serialize_response(
+        field=field, response_content=content, is_coroutine=True
+    )
+    return JSONResponse(encoded).body
+
+
+class TestResponses:
+    @pytest.mark.parametrize(
+        "created_at",
+        [
+            datetime(2023, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc),
+            datetime(2023, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            datetime(2023, 1, 2, 3, 4, 5, 6),
+            datetime(2023, 1, 2, tzinfo=timezone(timedelta(hours=1))),
+        ],
+    )
+    async def test_matches_response_model(
+        self, app: FastAPI, created_at: datetime
+    ) -> None:
+        """Test that the fast path encodes exactly like the old one."""
+        user = Users(
+            id=uuid.uuid4(),
+            created_at=created_at,
+            email="Zoë@eelclip.com",
+            first_name="Zoë",
+            last_name="O'Brien",
+            is_verified=True,
+        )
+
+        assert user_response(user).body == await reference_body(
+            UserPublic, user
+        )
+        assert auth_response(user, "token").body == await reference_body(
+            AuthResponse, AuthResponse(user=user, access_token="token")
+        )
+
+    async def test_saved_user(self, app: FastAPI, test_user) -> None:
+        """Test a row read back from the database."""
+        user = await Users.get(id=test_user.id)
+        assert user_response(user).body == await reference_body(
+            UserPublic, user
+        )
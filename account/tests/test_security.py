@@ -1,12 +1,16 @@
+import asyncio
 import pytest
 import time
 import redis
 from fastapi import FastAPI, HTTPException
+from jose.exceptions import ExpiredSignatureError, JWTError
 from passlib.context import CryptContext
 
-from library.security.hash import hash_service
-from library.security.jwt import jwt_manager
+from library.security.hash import HashEngine, HashService, hash_service
+from library.security.jwt import JWTManager, TokenCache, jwt_manager
+from library.security.jwt_backends import FastHMACBackend, JoseBackend
 from library.security.otp import otp_manager
+from library.security.ratelimit import MemoryWindow, Quota, parse_quotas
 from models.user import Users
 from library.schemas.auth import TokenData
 from library.utils.random import create_random_code
@@ -15,6 +19,14 @@ from library.utils.random import create_random_code
 pytestmark = pytest.mark.asyncio
 
 
+class FakeClock:
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
 class TestHash:
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -44,6 +56,25 @@ class TestHash:
         assert await hash_service.verify_hash(password, hash)
         assert not await hash_service.verify_hash("wrong password", hash)
 
+    async def test_hash_queue_backpressure(self, app: FastAPI) -> None:
+        """Test that hashing is rejected once the queue is full."""
+        engine = HashEngine(max_workers=1, max_queue=0)
+        service = HashService(engine=engine)
+
+        results = await asyncio.gather(
+            service.get_hash("I love eelclip!"),
+            service.get_hash("I love eelclip!"),
+            return_exceptions=True,
+        )
+        await engine.shutdown()
+
+        assert len(results[0]) == 60
+        assert isinstance(results[1], HTTPException)
+        assert results[1].status_code == 503
+        assert engine.metrics.rejected == 1
+        assert engine.metrics.completed == 1
+        assert engine.metrics.queue_depth == 0
+
 
 class TestJWT:
     async def test_create_access_token(
@@ -72,41 +103,167 @@ class TestJWT:
 
         # Encode
         token = await jwt_manager.create_access_token(
-            token_data=token_data, expires_in=1
+            token_data=token_data, expires_in=-1
         )
         assert token
         assert "ey" in token
-        time.sleep(2)
 
         # Decode.
         with pytest.raises(HTTPException):
             data = await jwt_manager.decode_access_token(access_token=token)
             print(data)
 
+    async def test_decoded_token_cache(
+        self, app: FastAPI, test_user: Users
+    ) -> None:
+        """Test that decoded tokens are served from the cache."""
+        manager = JWTManager(cache=TokenCache(maxsize=2))
+        token_data = TokenData(
+            user_id=str(test_user.id), scopes=[test_user.user_class]
+        )
+        token = await manager.create_access_token(token_data=token_data)
+
+        first = await manager.decode_access_token(access_token=token)
+        second = await manager.decode_access_token(access_token=token)
+        assert first == second == token_data
+        assert manager.cache.misses == 1
+        assert manager.cache.hits == 1
+
+        # Revoked tokens are verified again on the next decode.
+        assert manager.revoke_access_token(token)
+        await manager.decode_access_token(access_token=token)
+        assert manager.cache.misses == 2
+
+        # A different secret never reuses the cached entry.
+        with pytest.raises(HTTPException):
+            await manager.decode_access_token(
+                access_token=token, secret_key="other"
+            )
+
+    async def test_decoded_token_cache_expiry(
+        self, app: FastAPI, test_user: Users
+    ) -> None:
+        """Test that cached tokens stop working when they expire."""
+        clock = FakeClock()
+        manager = JWTManager(cache=TokenCache(maxsize=2, clock=clock))
+        token_data = TokenData(
+            user_id=str(test_user.id), scopes=[test_user.user_class]
+        )
+        token = await manager.create_access_token(
+            token_data=token_data, expires_in=-1
+        )
+        manager.cache.set(
+            token, manager.secret_key, token_data, clock.now + 1
+        )
+        assert await manager.decode_access_token(access_token=token)
+
+        clock.now += 2
+        with pytest.raises(HTTPException):
+            await manager.decode_access_token(access_token=token)
+        assert manager.cache.snapshot()["size"] == 0
+
+    async def test_decoded_token_cache_is_bounded(self, app: FastAPI) -> None:
+        """Test that the cache evicts entries beyond its size."""
+        cache = TokenCache(maxsize=2)
+        expires_at = time.time() + 60
+        for i in range(3):
+            cache.set(f"token-{i}", "secret", TokenData(user_id=i), expires_at)
+
+        assert cache.get("token-0", "secret") is None
+        assert cache.get("token-2", "secret").user_id == "2"
+        assert cache.evictions == 1
+
+    async def test_fast_backend_matches_jose(self, app: FastAPI) -> None:
+        """Test that both backends produce and accept the same tokens."""
+        jose_backend = JoseBackend("HS256")
+        fast_backend = FastHMACBackend("HS256")
+        claims = {
+            "user_id": "5b7a7c2e-4bb4-4d4e-9b8c-0c1f7d2f1a11",
+            "scopes": ["base"],
+            "exp": time.time() + 60,
+        }
+
+        token = fast_backend.encode(dict(claims), "secret")
+        assert token == jose_backend.encode(dict(claims), "secret")
+        assert fast_backend.decode(token, "secret") == claims
+        assert jose_backend.decode(token, "secret") == claims
+
+        unicode_claims = {**claims, "scopes": ["bàse"]}
+        assert fast_backend.encode(
+            dict(unicode_claims), "secret"
+        ) == jose_backend.encode(dict(unicode_claims), "secret")
+
+    async def test_fast_backend_rejects_bad_tokens(self, app: FastAPI) -> None:
+        """Test that the fast backend rejects invalid and expired tokens."""
+        backend = FastHMACBackend("HS256")
+        token = backend.encode({"user_id": "1", "exp": time.time() + 60}, "k")
+
+        with pytest.raises(JWTError):
+            backend.decode(token, "wrong")
+        with pytest.raises(JWTError):
+            backend.decode(token[:-2], "k")
+        with pytest.raises(JWTError):
+            backend.decode("not-a-token", "k")
+
+        expired = backend.encode({"user_id": "1", "exp": time.time() - 5}, "k")
+        with pytest.raises(ExpiredSignatureError):
+            backend.decode(expired, "k")
+
+    async def test_backends_accept_the_same_claims(
+        self, app: FastAPI
+    ) -> None:
+        """Test that the backend choice does not change which tokens pass."""
+        backends = [JoseBackend("HS256"), FastHMACBackend("HS256")]
+        exp = time.time() + 60
+        rejected = [
+            {"user_id": "1", "exp": exp, "aud": "other-service"},
+            {"user_id": "1", "exp": exp, "aud": ["a", "b"]},
+            {"user_id": "1", "exp": exp, "sub": 1},
+            {"user_id": "1", "exp": exp, "jti": 1},
+            {"user_id": "1", "exp": exp, "iat": "yesterday"},
+        ]
+        for claims in rejected:
+            token = backends[0].encode(claims, "k")
+            for backend in backends:
+                with pytest.raises(JWTError):
+                    backend.decode(token, "k")
+
+        claims = {"user_id": "1", "exp": exp, "sub": "1", "iat": time.time()}
+        token = backends[0].encode(claims, "k")
+        assert backends[0].decode(token, "k") == backends[1].decode(token, "k")
+
 
 class TestOTP:
     redis_db = redis.Redis(host="redis", port=6379, db=1)
 
+    def stored(self, user_id: str, purpose: str):
+        key = otp_manager.key(user_id, purpose)
+        return self.redis_db.hget(key, user_id)
+
     async def test_create_otp(
         self,
         app: FastAPI,
     ) -> None:
         """Test OTP creation."""
         user_id = "fake_code"
-        generated_otp = otp_manager.create_otp(user_id=user_id)
-        time.sleep(2)
-        assert self.redis_db.get(generated_otp) is not None
-        assert self.redis_db.get(generated_otp).decode("utf-8") == user_id
+        generated_otp = await otp_manager.create_otp(
+            user_id=user_id, purpose="verify"
+        )
+        assert self.stored(user_id, "verify").decode() == f"{generated_otp}:0"
+        assert self.stored(user_id, "reset") is None
 
     async def test_otp_expires(
         self,
         app: FastAPI,
     ) -> None:
-        """Test that OTP expires."""
+        """Test that OTP is stored with its expiry."""
         user_id = "fake_code"
-        generated_otp = otp_manager.create_otp(user_id=user_id, expires=1)
-        time.sleep(2)
-        assert self.redis_db.get(generated_otp) is None
+        await otp_manager.create_otp(
+            user_id=user_id, purpose="verify", expires=1
+        )
+        key = otp_manager.key(user_id, "verify")
+        ttl = self.redis_db.execute_command("HTTL", key, "FIELDS", 1, user_id)
+        assert 0 < ttl[0] <= 1
 
     async def test_delete_user_otp(
         self,
@@ -114,11 +271,125 @@ class TestOTP:
     ) -> None:
         """Test OTp deletion."""
         user_id = "fake_code"
-        generated_otp = otp_manager.create_otp(user_id=user_id)
+        await otp_manager.create_otp(user_id=user_id, purpose="verify")
+
+        assert self.stored(user_id, "verify") is not None
+        await otp_manager.delete_user_otp(user_id, purpose="verify")
+        assert self.stored(user_id, "verify") is None
+
+    async def test_validate_user_otp_is_single_use(
+        self,
+        app: FastAPI,
+    ) -> None:
+        """Test that concurrent redemptions only succeed once."""
+        user_id = "fake_code"
+        generated_otp = await otp_manager.create_otp(
+            user_id=user_id, purpose="verify"
+        )
+
+        results = await asyncio.gather(
+            *[
+                otp_manager.validate_user_otp(
+                    user_id=user_id, otp=generated_otp, purpose="verify"
+                )
+                for _ in range(5)
+            ]
+        )
+        assert results.count(True) == 1
+        assert results.count(False) == 4
+        assert self.stored(user_id, "verify") is None
+
+    async def test_codes_are_scoped(self, app: FastAPI) -> None:
+        """Test that a code only works for its user and purpose."""
+        otp = await otp_manager.create_otp(user_id="user-a", purpose="reset")
+
+        assert not await otp_manager.validate_user_otp(
+            user_id="user-b", otp=otp, purpose="reset"
+        )
+        assert not await otp_manager.validate_user_otp(
+            user_id="user-a", otp=otp, purpose="verify"
+        )
+        assert await otp_manager.validate_user_otp(
+            user_id="user-a", otp=otp, purpose="reset"
+        )
+
+    async def test_reissue_invalidates_previous_code(
+        self, app: FastAPI
+    ) -> None:
+        """Test that only the latest code is valid."""
+        first = await otp_manager.create_otp(user_id="user", purpose="verify")
+        second = first
+        while second == first:
+            second = await otp_manager.create_otp(
+                user_id="user", purpose="verify"
+            )
+
+        assert not await otp_manager.validate_user_otp(
+            user_id="user", otp=first, purpose="verify"
+        )
+        assert await otp_manager.validate_user_otp(
+            user_id="user", otp=second, purpose="verify"
+        )
+
+    async def test_invalidate_user(self, app: FastAPI) -> None:
+        """Test that every outstanding code of a user is dropped."""
+        await otp_manager.create_otp(user_id="user", purpose="verify")
+        await otp_manager.create_otp(user_id="user", purpose="reset")
+
+        await otp_manager.invalidate_user("user")
+        assert self.stored("user", "verify") is None
+        assert self.stored("user", "reset") is None
+
+    async def test_attempts_are_limited(self, app: FastAPI) -> None:
+        """Test that a code is burnt after too many wrong guesses."""
+        otp = await otp_manager.create_otp(
+            user_id="user", purpose="verify", expires=600
+        )
+        wrong = str((int(otp) + 1) % 10**6).zfill(6)
+
+        for attempt in range(1, otp_manager.max_attempts):
+            assert not await otp_manager.validate_user_otp(
+                user_id="user", otp=wrong, purpose="verify"
+            )
+            assert self.stored("user", "verify").decode() == f"{otp}:{attempt}"
+            key = otp_manager.key("user", "verify")
+            ttl = self.redis_db.execute_command(
+                "HTTL", key, "FIELDS", 1, "user"
+            )
+            assert 0 < ttl[0] <= 600
+
+        assert not await otp_manager.validate_user_otp(
+            user_id="user", otp=wrong, purpose="verify"
+        )
+        assert self.stored("user", "verify") is None
+        assert not await otp_manager.validate_user_otp(
+            user_id="user", otp=otp, purpose="verify"
+        )
+
+
+class TestRateLimit:
+    async def test_parse_quotas(self, app: FastAPI) -> None:
+        """Test that quota specs are parsed."""
+        assert parse_quotas("ip:20/60, email:5/300") == [
+            Quota("ip", 20, 60.0),
+            Quota("email", 5, 300.0),
+        ]
+        with pytest.raises(ValueError):
+            parse_quotas("user:5/60")
+
+    async def test_memory_window(self, app: FastAPI) -> None:
+        """Test the in-memory fallback window."""
+        clock = FakeClock()
+        window = MemoryWindow(clock=clock)
+        quotas = [Quota("ip", 2, 0.5), Quota("email", 10, 60)]
+        keys = ["ip-key", "email-key"]
+
+        assert window.hit(keys, quotas) == 0
+        assert window.hit(keys, quotas) == 0
+        assert 0 < window.hit(keys, quotas) <= 0.5
 
-        assert self.redis_db.get(generated_otp) is not None
-        otp_manager.delete_user_otp(generated_otp)
-        assert self.redis_db.get(generated_otp) is None
+        clock.now += 0.6
+        assert window.hit(keys, quotas) == 0
 
 
 class TestRandom:
@@ -0,0 +1,30 @@
+import pytest
+from fastapi import FastAPI
+
+from library.utils.templates import minify_html, template_service
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestTemplates:
+    async def test_minify_html(self, app: FastAPI) -> None:
+        """Test that static HTML is minified."""
+        source = "<p>\n    Hello {{first_name}},\n</p>\n<!-- x -->\n<b>Hi</b>"
+        minified = "<p> Hello {{first_name}}, </p><b>Hi</b>"
+        assert minify_html(source) == minified
+
+    async def test_render(self, app: FastAPI) -> None:
+        """Test that email templates render from the shared service."""
+        html = await template_service.render(
+            "email_verification.html", otp="123456", first_name="Eelclip"
+        )
+        assert "Hello Eelclip," in html
+        assert "<p>123456</p>" in html
+        assert "\n" not in html
+        assert template_service.metrics.count["email_verification.html"]
+
+    async def test_templates_are_precompiled(self, app: FastAPI) -> None:
+        """Test that startup compiles the email templates."""
+        cached = {name for _, name in template_service.env.cache.keys()}
+        assert {"email_verification.html", "password_reset.html"} <= cached
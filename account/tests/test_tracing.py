@@ -0,0 +1,87 @@
+import pytest
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from library.utils.tracing import (
+    MemorySink,
+    TraceSampler,
+    parse_rates,
+    tracer,
+)
+
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture()
+def memory_sink():
+    """Send traces to memory and trace every request."""
+    sampler = tracer.sampler
+    tracer.sampler = TraceSampler(sample_rate=1.0, max_per_second=1000)
+    tracer.sink = MemorySink()
+    yield tracer.sink
+    tracer.sink = None
+    tracer.sampler = sampler
+
+
+class TestSampler:
+    async def test_errors_and_slow_requests_are_kept(
+        self, app: FastAPI
+    ) -> None:
+        """Test that failures and slow requests ignore the rates."""
+        sampler = TraceSampler(sample_rate=0, slow_seconds=1.0)
+        assert sampler.decide("auth:login", 200, 0.01) is None
+        assert sampler.decide("auth:login", 503, 0.01) == "error"
+        assert sampler.decide("auth:login", 200, 2.0) == "slow"
+
+    async def test_route_rates(self, app: FastAPI) -> None:
+        """Test that route rates override the default rate."""
+        sampler = TraceSampler(
+            sample_rate=1.0,
+            route_rates=parse_rates("metrics=0,auth:login=1"),
+            max_per_second=1000,
+        )
+        assert sampler.decide("metrics", 200, 0.01) is None
+        assert sampler.decide("auth:login", 200, 0.01) == "sampled"
+        assert sampler.decide("root", 200, 0.01) == "sampled"
+
+    async def test_cap(self, app: FastAPI) -> None:
+        """Test that sampled traces are capped per second."""
+        sampler = TraceSampler(sample_rate=1.0, max_per_second=5)
+        kept = [sampler.decide("root", 200, 0.01) for _ in range(100)]
+        assert kept.count("sampled") == 5
+
+
+class TestTracing:
+    async def test_request_is_traced(
+        self, app: FastAPI, client: AsyncClient, memory_sink: MemorySink
+    ) -> None:
+        """Test that a kept trace has its route and dependency spans."""
+        await client.post(
+            app.url_path_for("auth:login"),
+            json={"email": "trace@eelclip.com", "password": "password"},
+        )
+
+        trace = memory_sink.traces[-1]
+        assert trace["route"] == "auth:login"
+        assert trace["status"] == status.HTTP_401_UNAUTHORIZED
+        assert trace["reason"] == "sampled"
+        assert any(span["op"] == "postgres" for span in trace["spans"])
+
+    async def test_report(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        memory_sink: MemorySink,
+        admin_headers: dict,
+    ) -> None:
+        """Test that decisions and overhead are reported."""
+        await client.get(app.url_path_for("health:startup"))
+
+        res = await client.get(
+            app.url_path_for("health:tracing"), headers=admin_headers
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["sink"] == "MemorySink"
+        assert res.json()["decisions"]["sampled"] >= 1
+        assert res.json()["overhead_avg_us"] > 0